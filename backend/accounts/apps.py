@@ -1,6 +1,18 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class AccountsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "accounts"
+
+    def ready(self):
+        if settings.ACCOUNTS_WRITE_BEHIND:
+            from django.contrib.auth.signals import user_logged_in
+
+            from .writebehind import queue_last_login
+
+            # Replace the synchronous UPDATE of last_login done inside every
+            # login request with a batched one.
+            user_logged_in.disconnect(dispatch_uid="update_last_login")
+            user_logged_in.connect(queue_last_login, dispatch_uid="queue_last_login")
@@ -2,14 +2,36 @@
 
 from __future__ import annotations
 
+import asyncio
+import http.client
 import json
+import logging
 import os
+import ssl
+import threading
+import weakref
 from dataclasses import dataclass
-from typing import Any, Dict, Optional
+from typing import Any, Awaitable, Callable, Dict, Optional
 
-from urllib import error, request
 from urllib.parse import urlencode
 
+from .breaker import CircuitBreaker, CircuitOpenError, DependencyGuard
+from .metrics import timed, upstream_call
+from .pool import AsyncPoolManager, PoolManager
+from .singleflight import AsyncSingleFlight, SingleFlight, credential_fingerprint
+from .tokens import (
+    TokenVerificationError,
+    averify_jwt,
+    get_jwks_cache,
+    verify_jwt,
+)
+
+logger = logging.getLogger(__name__)
+
+# Claims the login response needs. When a verified id_token carries them the
+# /userinfo round trip is skipped.
+_PROFILE_NAME_CLAIMS = ("given_name", "name", "nickname")
+
 
 class Auth0Error(Exception):
     """Base class for Auth0 related errors."""
@@ -28,7 +50,20 @@ class Auth0AuthenticationError(Auth0Error):
         self.message = message
 
 
-@dataclass
+class Auth0UnavailableError(Auth0AuthenticationError):
+    """Raised without calling Auth0 while its circuit breaker is open."""
+
+    def __init__(
+        self,
+        message: str = "Auth0 no está disponible en este momento.",
+        *,
+        fallback_to_local: bool = False,
+    ) -> None:
+        super().__init__(message, status_code=503)
+        self.fallback_to_local = fallback_to_local
+
+
+@dataclass(frozen=True)
 class Auth0Config:
     domain: str
     client_id: str
@@ -37,6 +72,46 @@ class Auth0Config:
     scope: Optional[str] = None
     realm: Optional[str] = None
     timeout: float = 10.0
+    pool_maxsize: int = 10
+    pool_idle_timeout: float = 60.0
+    dns_ttl: float = 300.0
+    verify_id_token: bool = False
+    jwks_ttl: float = 600.0
+    min_timeout: float = 1.0
+    breaker_failures: int = 5
+    breaker_reset: float = 30.0
+    hedge: bool = False
+    # What logins do while the circuit is open: "fail_fast" or "local".
+    open_circuit_policy: str = "fail_fast"
+    # PEM file trusted instead of the system store (e.g. a local stand-in).
+    ca_bundle: Optional[str] = None
+    # Management API audience; defaults to the tenant's /api/v2/.
+    management_audience: Optional[str] = None
+
+    @property
+    def base_url(self) -> str:
+        # The domain may carry its own scheme so tests and benchmarks can
+        # point it at a plain-HTTP server.
+        if self.domain.startswith(("http://", "https://")):
+            return self.domain.rstrip("/")
+        return f"https://{self.domain}"
+
+    def ssl_context(self) -> Optional[ssl.SSLContext]:
+        if not self.ca_bundle:
+            return None
+        return ssl.create_default_context(cafile=self.ca_bundle)
+
+    @property
+    def issuer(self) -> str:
+        return f"{self.base_url}/"
+
+    @property
+    def jwks_url(self) -> str:
+        return f"{self.base_url}/.well-known/jwks.json"
+
+    @property
+    def management_url(self) -> str:
+        return self.management_audience or f"{self.base_url}/api/v2/"
 
 
 @dataclass
@@ -53,9 +128,60 @@ def _get_env(name: str) -> Optional[str]:
     return value or None
 
 
+def _get_float(name: str, default: float) -> float:
+    raw = _get_env(name)
+    if not raw:
+        return default
+    try:
+        return float(raw)
+    except ValueError:
+        return default
+
+
+def _get_bool(name: str, default: bool = False) -> bool:
+    raw = _get_env(name)
+    if not raw:
+        return default
+    return raw.lower() in {"1", "true", "yes"}
+
+
+def _get_int(name: str, default: int) -> int:
+    raw = _get_env(name)
+    if not raw:
+        return default
+    try:
+        return int(raw)
+    except ValueError:
+        return default
+
+
+_UNSET = object()
+_frozen_config: Any = _UNSET
+
+
+def freeze_auth0_config() -> Optional[Auth0Config]:
+    """Parse the environment once; :func:`load_auth0_config` returns it from then on.
+
+    Called by the warm-up so requests stop re-reading a dozen variables.
+    """
+
+    global _frozen_config
+    _frozen_config = _UNSET
+    _frozen_config = load_auth0_config()
+    return _frozen_config
+
+
+def thaw_auth0_config() -> None:
+    global _frozen_config
+    _frozen_config = _UNSET
+
+
 def load_auth0_config() -> Optional[Auth0Config]:
     """Load Auth0 configuration from environment variables."""
 
+    if _frozen_config is not _UNSET:
+        return _frozen_config
+
     domain = _get_env("AUTH0_DOMAIN")
     client_id = _get_env("AUTH0_CLIENT_ID")
     client_secret = _get_env("AUTH0_CLIENT_SECRET")
@@ -67,14 +193,6 @@ def load_auth0_config() -> Optional[Auth0Config]:
     scope = _get_env("AUTH0_SCOPE") or "openid profile email"
     realm = _get_env("AUTH0_REALM")
 
-    timeout_raw = _get_env("AUTH0_TIMEOUT")
-    timeout = 10.0
-    if timeout_raw:
-        try:
-            timeout = float(timeout_raw)
-        except ValueError:
-            timeout = 10.0
-
     return Auth0Config(
         domain=domain,
         client_id=client_id,
@@ -82,7 +200,19 @@ def load_auth0_config() -> Optional[Auth0Config]:
         audience=audience,
         scope=scope,
         realm=realm,
-        timeout=timeout,
+        timeout=_get_float("AUTH0_TIMEOUT", 10.0),
+        pool_maxsize=_get_int("AUTH0_POOL_MAXSIZE", 10),
+        pool_idle_timeout=_get_float("AUTH0_POOL_IDLE_TIMEOUT", 60.0),
+        dns_ttl=_get_float("AUTH0_DNS_TTL", 300.0),
+        verify_id_token=_get_bool("AUTH0_VERIFY_ID_TOKEN"),
+        jwks_ttl=_get_float("AUTH0_JWKS_TTL", 600.0),
+        min_timeout=_get_float("AUTH0_MIN_TIMEOUT", 1.0),
+        breaker_failures=_get_int("AUTH0_BREAKER_FAILURES", 5),
+        breaker_reset=_get_float("AUTH0_BREAKER_RESET", 30.0),
+        hedge=_get_bool("AUTH0_HEDGE"),
+        open_circuit_policy=(_get_env("AUTH0_OPEN_CIRCUIT_POLICY") or "fail_fast").lower(),
+        ca_bundle=_get_env("AUTH0_CA_BUNDLE"),
+        management_audience=_get_env("AUTH0_MANAGEMENT_AUDIENCE"),
     )
 
 
@@ -93,19 +223,22 @@ def _send_request(
     headers: Dict[str, str],
     timeout: float,
     method: str,
+    pool: Optional[PoolManager] = None,
 ) -> tuple[int, Dict[str, Any]]:
-    req = request.Request(url, data=data, headers=headers, method=method)
+    if pool is None:
+        pool = get_auth0_client().pool
 
     try:
-        with request.urlopen(req, timeout=timeout) as response:  # type: ignore[no-untyped-call]
-            status_code = response.getcode()
-            raw_body = response.read()
-    except error.HTTPError as exc:
-        status_code = exc.code
-        raw_body = exc.read()
-    except error.URLError as exc:  # pragma: no cover - network errors
+        status_code, raw_body = pool.urlopen(
+            method, url, body=data, headers=headers, timeout=timeout
+        )
+    except (OSError, http.client.HTTPException) as exc:  # pragma: no cover - network errors
         raise Auth0AuthenticationError("No se pudo conectar con Auth0.", status_code=503) from exc
 
+    return status_code, _decode_json(raw_body)
+
+
+def _decode_json(raw_body: bytes) -> Dict[str, Any]:
     try:
         parsed = json.loads(raw_body.decode("utf-8")) if raw_body else {}
     except (ValueError, UnicodeDecodeError):
@@ -114,35 +247,91 @@ def _send_request(
     if not isinstance(parsed, dict):
         parsed = {}
 
-    return status_code, parsed
+    return parsed
 
 
-def _post_form_urlencoded(
-    url: str, payload: Dict[str, Any], timeout: float
-) -> tuple[int, Dict[str, Any]]:
+def _encode_form(payload: Dict[str, Any]) -> bytes:
     filtered_payload = {
         key: value
         for key, value in payload.items()
         if value is not None
     }
+    return urlencode(filtered_payload).encode("utf-8")
 
-    data = urlencode(filtered_payload).encode("utf-8")
+
+def _post_form_urlencoded(
+    url: str,
+    payload: Dict[str, Any],
+    timeout: float,
+    pool: Optional[PoolManager] = None,
+) -> tuple[int, Dict[str, Any]]:
+    data = _encode_form(payload)
     headers = {"Content-Type": "application/x-www-form-urlencoded"}
-    return _send_request(url, data=data, headers=headers, timeout=timeout, method="POST")
+    return _send_request(
+        url, data=data, headers=headers, timeout=timeout, method="POST", pool=pool
+    )
+
+
+def _get_json(
+    url: str,
+    headers: Dict[str, str],
+    timeout: float,
+    pool: Optional[PoolManager] = None,
+) -> tuple[int, Dict[str, Any]]:
+    return _send_request(
+        url, data=None, headers=headers, timeout=timeout, method="GET", pool=pool
+    )
 
 
-def _get_json(url: str, headers: Dict[str, str], timeout: float) -> tuple[int, Dict[str, Any]]:
-    return _send_request(url, data=None, headers=headers, timeout=timeout, method="GET")
+async def _asend_request(
+    url: str,
+    *,
+    data: Optional[bytes],
+    headers: Dict[str, str],
+    timeout: float,
+    method: str,
+    pool: Optional[AsyncPoolManager] = None,
+) -> tuple[int, Dict[str, Any]]:
+    if pool is None:
+        pool = get_async_auth0_client().pool
+
+    try:
+        status_code, raw_body = await pool.urlopen(
+            method, url, body=data, headers=headers, timeout=timeout
+        )
+    except (OSError, EOFError, ValueError) as exc:  # pragma: no cover - network errors
+        raise Auth0AuthenticationError("No se pudo conectar con Auth0.", status_code=503) from exc
 
+    return status_code, _decode_json(raw_body)
 
-def authenticate_with_auth0(username: str, password: str) -> Auth0Result:
-    """Authenticate a user with Auth0 using the Resource Owner Password flow."""
 
-    config = load_auth0_config()
-    if config is None:
-        raise Auth0ConfigurationError("Auth0 is not configured.")
+async def _apost_form_urlencoded(
+    url: str,
+    payload: Dict[str, Any],
+    timeout: float,
+    pool: Optional[AsyncPoolManager] = None,
+) -> tuple[int, Dict[str, Any]]:
+    data = _encode_form(payload)
+    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+    return await _asend_request(
+        url, data=data, headers=headers, timeout=timeout, method="POST", pool=pool
+    )
+
+
+async def _aget_json(
+    url: str,
+    headers: Dict[str, str],
+    timeout: float,
+    pool: Optional[AsyncPoolManager] = None,
+) -> tuple[int, Dict[str, Any]]:
+    return await _asend_request(
+        url, data=None, headers=headers, timeout=timeout, method="GET", pool=pool
+    )
 
-    token_url = f"https://{config.domain}/oauth/token"
+
+def _password_grant_payload(
+    config: Auth0Config, username: str, password: str
+) -> Dict[str, Any]:
     payload: Dict[str, Any] = {
         "grant_type": "password",
         "username": username,
@@ -158,28 +347,508 @@ def authenticate_with_auth0(username: str, password: str) -> Auth0Result:
         # Depending on the Auth0 tenant configuration this field can be required.
         payload["realm"] = config.realm
 
-    status_code, token_payload = _post_form_urlencoded(token_url, payload, config.timeout)
+    return payload
+
+
+def _refresh_grant_payload(config: Auth0Config, refresh_token: str) -> Dict[str, Any]:
+    return {
+        "grant_type": "refresh_token",
+        "refresh_token": refresh_token,
+        "client_id": config.client_id,
+        "client_secret": config.client_secret,
+    }
+
+
+def _raise_for_token_error(status_code: int, token_payload: Dict[str, Any]) -> None:
+    if status_code == 200:
+        return
+
+    error_message = "No pudimos validar tus credenciales."
+    if isinstance(token_payload, dict):
+        error_message = (
+            token_payload.get("error_description")
+            or token_payload.get("description")
+            or token_payload.get("error")
+            or error_message
+        )
+    raise Auth0AuthenticationError(error_message, status_code=status_code)
 
-    if status_code != 200:
-        error_message = "No pudimos validar tus credenciales."
-        if isinstance(token_payload, dict):
-            error_message = (
-                token_payload.get("error_description")
-                or token_payload.get("description")
-                or token_payload.get("error")
-                or error_message
-            )
-        raise Auth0AuthenticationError(error_message, status_code=status_code)
 
-    profile: Optional[Dict[str, Any]] = None
-    access_token = token_payload.get("access_token")
+def _is_upstream_failure(result: tuple[int, Dict[str, Any]]) -> bool:
+    # Not 429: Auth0 also sends it (too_many_attempts) for one locked-out
+    # user, which must not fail every other login.
+    return result[0] >= 500
 
-    if access_token:
-        userinfo_url = f"https://{config.domain}/userinfo"
+
+_guards: Dict[tuple, DependencyGuard] = {}
+_guards_lock = threading.Lock()
+
+
+def get_auth0_guard(config: Auth0Config) -> DependencyGuard:
+    """Return the breaker and latency tracker shared by every client of a tenant."""
+
+    key = (
+        config.domain,
+        config.timeout,
+        config.min_timeout,
+        config.breaker_failures,
+        config.breaker_reset,
+    )
+    with _guards_lock:
+        guard = _guards.get(key)
+        if guard is None:
+            guard = DependencyGuard(
+                max_timeout=config.timeout,
+                min_timeout=config.min_timeout,
+                breaker=CircuitBreaker(
+                    failure_threshold=config.breaker_failures,
+                    recovery_timeout=config.breaker_reset,
+                ),
+            )
+            _guards[key] = guard
+        return guard
+
+
+def _circuit_open(config: Auth0Config) -> Auth0UnavailableError:
+    return Auth0UnavailableError(fallback_to_local=config.open_circuit_policy == "local")
+
+
+def _profile_from_claims(claims: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Return the claims if they carry everything ``/userinfo`` would."""
+
+    if claims.get("email") and any(claims.get(name) for name in _PROFILE_NAME_CLAIMS):
+        return claims
+    return None
+
+
+class Auth0Client:
+    """Talk to one Auth0 tenant over a shared pool of keep-alive connections."""
+
+    def __init__(self, config: Auth0Config, *, pool: Optional[PoolManager] = None) -> None:
+        self.config = config
+        self.pool = pool or PoolManager(
+            maxsize=config.pool_maxsize,
+            idle_timeout=config.pool_idle_timeout,
+            dns_ttl=config.dns_ttl,
+            ssl_context=config.ssl_context(),
+        )
+
+    def url(self, path: str) -> str:
+        return f"{self.config.base_url}{path}"
+
+    def _call(
+        self,
+        endpoint: str,
+        send: Callable[[float], tuple[int, Dict[str, Any]]],
+        *,
+        hedge: bool = False,
+    ) -> tuple[int, Dict[str, Any]]:
+        with upstream_call(endpoint) as outcome:
+            try:
+                result = get_auth0_guard(self.config).call(
+                    send, is_failure=_is_upstream_failure, hedge=hedge
+                )
+            except CircuitOpenError as exc:
+                outcome["status"] = "circuit_open"
+                raise _circuit_open(self.config) from exc
+            outcome["status"] = result[0]
+            return result
+
+    def _post_form(
+        self, endpoint: str, path: str, payload: Dict[str, Any], *, hedge: bool = False
+    ) -> tuple[int, Dict[str, Any]]:
+        url = self.url(path)
+        return self._call(
+            endpoint,
+            lambda timeout: _post_form_urlencoded(url, payload, timeout, pool=self.pool),
+            hedge=hedge,
+        )
+
+    def _get(
+        self, endpoint: str, url: str, headers: Dict[str, str]
+    ) -> tuple[int, Dict[str, Any]]:
+        return self._call(
+            endpoint, lambda timeout: _get_json(url, headers, timeout, pool=self.pool)
+        )
+
+    def authenticate(self, username: str, password: str) -> Auth0Result:
+        """Authenticate a user with the Resource Owner Password flow."""
+
+        config = self.config
+        status_code, token_payload = self._post_form(
+            "oauth_token",
+            "/oauth/token",
+            _password_grant_payload(config, username, password),
+            hedge=config.hedge,
+        )
+        _raise_for_token_error(status_code, token_payload)
+        return Auth0Result(tokens=token_payload, profile=self._fetch_profile(token_payload))
+
+    def refresh(self, refresh_token: str, subject: Optional[str] = None) -> Auth0Result:
+        """Exchange a refresh token for new tokens.
+
+        When the verified id_token belongs to ``subject`` its claims are
+        returned as the profile and ``/userinfo`` is not called.
+        """
+
+        status_code, token_payload = self._post_form(
+            "oauth_token",
+            "/oauth/token",
+            _refresh_grant_payload(self.config, refresh_token),
+            # A hedged copy would replay the refresh token; with rotation
+            # enabled Auth0 treats that as reuse and revokes the family.
+            hedge=False,
+        )
+        _raise_for_token_error(status_code, token_payload)
+        return Auth0Result(
+            tokens=token_payload, profile=self._fetch_profile(token_payload, subject)
+        )
+
+    def _fetch_profile(
+        self, token_payload: Dict[str, Any], subject: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        claims = self._id_token_claims(token_payload.get("id_token"))
+        if claims is not None:
+            if subject is not None and claims.get("sub") == subject:
+                return claims
+            profile = _profile_from_claims(claims)
+            if profile is not None:
+                return profile
+
+        access_token = token_payload.get("access_token")
+        if not access_token:
+            return None
         headers = {"Authorization": f"Bearer {access_token}"}
-        status_info, profile_payload = _get_json(userinfo_url, headers, config.timeout)
+        status_info, profile_payload = self._get("userinfo", self.url("/userinfo"), headers)
+        if status_info == 200 and isinstance(profile_payload, dict):
+            return profile_payload
+        return None
+
+    def fetch_jwks(self) -> Dict[str, Any]:
+        status_code, jwks = self._get("jwks", self.config.jwks_url, {})
+        if status_code != 200:
+            raise TokenVerificationError("Could not fetch the Auth0 JWKS.")
+        return jwks
+
+    def verify_token(self, token: str, audience: str) -> Dict[str, Any]:
+        """Verify an Auth0-issued RS256 token and return its claims."""
 
+        return verify_jwt(
+            token,
+            jwks=get_jwks_cache(self.config.jwks_url, self.config.jwks_ttl),
+            fetch=self.fetch_jwks,
+            issuer=self.config.issuer,
+            audience=[audience],
+        )
+
+    def _id_token_claims(self, id_token: object) -> Optional[Dict[str, Any]]:
+        if not (self.config.verify_id_token and isinstance(id_token, str)):
+            return None
+
+        try:
+            with timed("id_token"):
+                return self.verify_token(id_token, self.config.client_id)
+        except (TokenVerificationError, Auth0AuthenticationError) as exc:
+            logger.warning("Falling back to /userinfo: %s", exc)
+            return None
+
+    def pool_stats(self) -> Dict[str, int]:
+        """Return connection reuse counters (hits, misses, evictions...)."""
+
+        return self.pool.stats()
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+class AsyncAuth0Client:
+    """The asyncio counterpart of :class:`Auth0Client`.
+
+    Its connections belong to the event loop they were opened on; use
+    :func:`get_async_auth0_client` to get the instance for the running loop.
+    """
+
+    def __init__(
+        self, config: Auth0Config, *, pool: Optional[AsyncPoolManager] = None
+    ) -> None:
+        self.config = config
+        self.pool = pool or AsyncPoolManager(
+            maxsize=config.pool_maxsize,
+            idle_timeout=config.pool_idle_timeout,
+            dns_ttl=config.dns_ttl,
+            ssl_context=config.ssl_context(),
+        )
+
+    def url(self, path: str) -> str:
+        return f"{self.config.base_url}{path}"
+
+    async def _call(
+        self,
+        endpoint: str,
+        send: Callable[[float], Awaitable[tuple[int, Dict[str, Any]]]],
+        *,
+        hedge: bool = False,
+    ) -> tuple[int, Dict[str, Any]]:
+        with upstream_call(endpoint) as outcome:
+            try:
+                result = await get_auth0_guard(self.config).acall(
+                    send, is_failure=_is_upstream_failure, hedge=hedge
+                )
+            except CircuitOpenError as exc:
+                outcome["status"] = "circuit_open"
+                raise _circuit_open(self.config) from exc
+            outcome["status"] = result[0]
+            return result
+
+    async def _post_form(
+        self, endpoint: str, path: str, payload: Dict[str, Any], *, hedge: bool = False
+    ) -> tuple[int, Dict[str, Any]]:
+        url = self.url(path)
+        return await self._call(
+            endpoint,
+            lambda timeout: _apost_form_urlencoded(url, payload, timeout, pool=self.pool),
+            hedge=hedge,
+        )
+
+    async def _get(
+        self, endpoint: str, url: str, headers: Dict[str, str]
+    ) -> tuple[int, Dict[str, Any]]:
+        return await self._call(
+            endpoint, lambda timeout: _aget_json(url, headers, timeout, pool=self.pool)
+        )
+
+    async def authenticate(self, username: str, password: str) -> Auth0Result:
+        """Authenticate a user with the Resource Owner Password flow."""
+
+        config = self.config
+        status_code, token_payload = await self._post_form(
+            "oauth_token",
+            "/oauth/token",
+            _password_grant_payload(config, username, password),
+            hedge=config.hedge,
+        )
+        _raise_for_token_error(status_code, token_payload)
+        return Auth0Result(
+            tokens=token_payload, profile=await self._fetch_profile(token_payload)
+        )
+
+    async def refresh(self, refresh_token: str, subject: Optional[str] = None) -> Auth0Result:
+        """Exchange a refresh token for new tokens (see :meth:`Auth0Client.refresh`)."""
+
+        status_code, token_payload = await self._post_form(
+            "oauth_token",
+            "/oauth/token",
+            _refresh_grant_payload(self.config, refresh_token),
+            # A hedged copy would replay the refresh token; with rotation
+            # enabled Auth0 treats that as reuse and revokes the family.
+            hedge=False,
+        )
+        _raise_for_token_error(status_code, token_payload)
+        return Auth0Result(
+            tokens=token_payload, profile=await self._fetch_profile(token_payload, subject)
+        )
+
+    async def _fetch_profile(
+        self, token_payload: Dict[str, Any], subject: Optional[str] = None
+    ) -> Optional[Dict[str, Any]]:
+        claims = await self._id_token_claims(token_payload.get("id_token"))
+        if claims is not None:
+            if subject is not None and claims.get("sub") == subject:
+                return claims
+            profile = _profile_from_claims(claims)
+            if profile is not None:
+                return profile
+
+        access_token = token_payload.get("access_token")
+        if not access_token:
+            return None
+        headers = {"Authorization": f"Bearer {access_token}"}
+        status_info, profile_payload = await self._get(
+            "userinfo", self.url("/userinfo"), headers
+        )
         if status_info == 200 and isinstance(profile_payload, dict):
-            profile = profile_payload
+            return profile_payload
+        return None
+
+    async def fetch_jwks(self) -> Dict[str, Any]:
+        status_code, jwks = await self._get("jwks", self.config.jwks_url, {})
+        if status_code != 200:
+            raise TokenVerificationError("Could not fetch the Auth0 JWKS.")
+        return jwks
+
+    async def verify_token(self, token: str, audience: str) -> Dict[str, Any]:
+        """Verify an Auth0-issued RS256 token and return its claims."""
+
+        return await averify_jwt(
+            token,
+            jwks=get_jwks_cache(self.config.jwks_url, self.config.jwks_ttl),
+            fetch=self.fetch_jwks,
+            issuer=self.config.issuer,
+            audience=[audience],
+        )
+
+    async def _id_token_claims(self, id_token: object) -> Optional[Dict[str, Any]]:
+        if not (self.config.verify_id_token and isinstance(id_token, str)):
+            return None
+
+        try:
+            with timed("id_token"):
+                return await self.verify_token(id_token, self.config.client_id)
+        except (TokenVerificationError, Auth0AuthenticationError) as exc:
+            logger.warning("Falling back to /userinfo: %s", exc)
+            return None
+
+    def pool_stats(self) -> Dict[str, int]:
+        """Return connection reuse counters (hits, misses, evictions...)."""
+
+        return self.pool.stats()
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+# Concurrent logins with the same credentials (retries, double clicks) share
+# one password grant, and concurrent refreshes of one token (several tabs)
+# one refresh grant: with rotation enabled only the first would succeed.
+_login_flight = SingleFlight()
+_async_login_flight = AsyncSingleFlight()
+
+_client: Optional[Auth0Client] = None
+_client_lock = threading.Lock()
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncAuth0Client]" = (
+    weakref.WeakKeyDictionary()
+)
+
+
+def get_auth0_client(config: Optional[Auth0Config] = None) -> Auth0Client:
+    """Return the process-wide client, rebuilding it if the config changed."""
+
+    global _client
+
+    if config is None:
+        config = load_auth0_config()
+        if config is None:
+            raise Auth0ConfigurationError("Auth0 is not configured.")
+
+    with _client_lock:
+        if _client is None or _client.config != config:
+            if _client is not None:
+                _client.close()
+            _client = Auth0Client(config)
+        return _client
+
+
+def _login_key(config: Auth0Config, username: str, password: str) -> str:
+    return credential_fingerprint(config.client_secret, config.domain, username, password)
+
+
+def authenticate_with_auth0(username: str, password: str) -> Auth0Result:
+    """Authenticate a user with Auth0 using the Resource Owner Password flow."""
+
+    config = load_auth0_config()
+    if config is None:
+        raise Auth0ConfigurationError("Auth0 is not configured.")
+
+    client = get_auth0_client(config)
+    with timed("auth0"):
+        return _login_flight.do(
+            _login_key(config, username, password),
+            lambda: client.authenticate(username, password),
+        )
+
+
+def get_async_auth0_client(config: Optional[Auth0Config] = None) -> AsyncAuth0Client:
+    """Return the client bound to the running event loop."""
+
+    if config is None:
+        config = load_auth0_config()
+        if config is None:
+            raise Auth0ConfigurationError("Auth0 is not configured.")
+
+    loop = asyncio.get_running_loop()
+    with _client_lock:
+        client = _async_clients.get(loop)
+        if client is None or client.config != config:
+            if client is not None:
+                client.close()
+            client = AsyncAuth0Client(config)
+            _async_clients[loop] = client
+        return client
+
+
+async def aauthenticate_with_auth0(username: str, password: str) -> Auth0Result:
+    """Async version of :func:`authenticate_with_auth0`."""
+
+    config = load_auth0_config()
+    if config is None:
+        raise Auth0ConfigurationError("Auth0 is not configured.")
+
+    client = get_async_auth0_client(config)
+    with timed("auth0"):
+        return await _async_login_flight.do(
+            _login_key(config, username, password),
+            lambda: client.authenticate(username, password),
+        )
+
+
+def _refresh_key(config: Auth0Config, refresh_token: str) -> str:
+    return credential_fingerprint(config.client_secret, config.domain, "refresh", refresh_token)
+
+
+def refresh_with_auth0(refresh_token: str, subject: Optional[str] = None) -> Auth0Result:
+    """Exchange a refresh token; ``subject`` is the ``sub`` the caller already knows."""
+
+    config = load_auth0_config()
+    if config is None:
+        raise Auth0ConfigurationError("Auth0 is not configured.")
+
+    client = get_auth0_client(config)
+    with timed("auth0"):
+        return _login_flight.do(
+            _refresh_key(config, refresh_token),
+            lambda: client.refresh(refresh_token, subject),
+        )
+
+
+async def arefresh_with_auth0(refresh_token: str, subject: Optional[str] = None) -> Auth0Result:
+    """Async version of :func:`refresh_with_auth0`."""
+
+    config = load_auth0_config()
+    if config is None:
+        raise Auth0ConfigurationError("Auth0 is not configured.")
+
+    client = get_async_auth0_client(config)
+    with timed("auth0"):
+        return await _async_login_flight.do(
+            _refresh_key(config, refresh_token),
+            lambda: client.refresh(refresh_token, subject),
+        )
+
+
+def login_flight_stats() -> Dict[str, int]:
+    """Return how many logins were coalesced onto an in-flight request."""
+
+    sync_stats = _login_flight.stats()
+    async_stats = _async_login_flight.stats()
+    return {key: sync_stats[key] + async_stats[key] for key in sync_stats}
+
+
+def pool_stats() -> Dict[str, int]:
+    """Return connection pool counters summed over the sync and async clients."""
+
+    with _client_lock:
+        clients = [_client, *_async_clients.values()]
+    totals: Dict[str, int] = {}
+    for client in clients:
+        if client is not None:
+            for key, value in client.pool_stats().items():
+                totals[key] = totals.get(key, 0) + value
+    return totals
+
+
+def guard_stats() -> list[Dict[str, Any]]:
+    """Return the circuit breaker state of every tenant guard."""
 
-    return Auth0Result(tokens=token_payload, profile=profile)
+    with _guards_lock:
+        guards = list(_guards.values())
+    return [guard.stats() for guard in guards]
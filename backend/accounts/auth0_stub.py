@@ -0,0 +1,150 @@
+"""A local stand-in for the Auth0 endpoints used by the login flow.
+
+Used by the load-test command to measure the login path end to end without
+reaching a real tenant. Responses are delayed by ``latency`` plus up to
+``jitter`` seconds, and ``error_rate`` of them fail with a 503.
+"""
+
+from __future__ import annotations
+
+import json
+import random
+import ssl
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qs
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "_StubHTTPServer"
+
+    def _reply(self, status: int, payload: Dict[str, Any]) -> None:
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _delay_or_fail(self) -> bool:
+        stub = self.server.stub
+        stub.count(self.path.split("?")[0])
+        time.sleep(stub.latency + random.uniform(0, stub.jitter))
+        if stub.error_rate and random.random() < stub.error_rate:
+            self._reply(503, {"error": "temporarily_unavailable"})
+            return False
+        return True
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length") or 0)
+        form = parse_qs(self.rfile.read(length).decode("utf-8"))
+        if self.path != "/oauth/token":
+            self._reply(404, {"error": "not_found"})
+            return
+        if not self._delay_or_fail():
+            return
+        username = form.get("username", [""])[0]
+        if form.get("password", [""])[0] != self.server.stub.password:
+            self._reply(
+                403,
+                {"error": "invalid_grant", "error_description": "Wrong email or password."},
+            )
+            return
+        self._reply(
+            200,
+            {
+                "access_token": f"stub-access-{username}",
+                "token_type": "Bearer",
+                "expires_in": 86400,
+            },
+        )
+
+    def do_GET(self) -> None:
+        if self.path != "/userinfo":
+            self._reply(404, {"error": "not_found"})
+            return
+        if not self._delay_or_fail():
+            return
+        token = self.headers.get("Authorization", "").partition("stub-access-")[2]
+        self._reply(
+            200,
+            {
+                "sub": f"auth0|{token}",
+                "given_name": token.title() or "Stub",
+                "family_name": "Bench",
+                "email": f"{token or 'stub'}@example.com",
+            },
+        )
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+class _StubHTTPServer(ThreadingHTTPServer):
+    daemon_threads = True
+    stub: "Auth0StubServer"
+
+
+class Auth0StubServer:
+    """Serve ``/oauth/token`` and ``/userinfo`` from a background thread.
+
+    Pass ``certfile``/``keyfile`` to serve HTTPS; clients then need the
+    certificate as their CA bundle (``AUTH0_CA_BUNDLE``).
+    """
+
+    def __init__(
+        self,
+        *,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        password: str = "bench-password",
+        certfile: Optional[str] = None,
+        keyfile: Optional[str] = None,
+    ) -> None:
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.password = password
+        self.requests: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._server = _StubHTTPServer((host, port), _StubHandler)
+        self._server.stub = self
+        self.scheme = "http"
+        if certfile:
+            context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            context.load_cert_chain(certfile, keyfile)
+            self._server.socket = context.wrap_socket(self._server.socket, server_side=True)
+            self.scheme = "https"
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"{self.scheme}://{host}:{port}"
+
+    def count(self, path: str) -> None:
+        with self._lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def start(self) -> "Auth0StubServer":
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="auth0-stub", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self) -> "Auth0StubServer":
+        return self.start()
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.stop()
@@ -0,0 +1,298 @@
+"""Circuit breaking, adaptive timeouts and hedging for upstream calls."""
+
+from __future__ import annotations
+
+import asyncio
+import math
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Any, Awaitable, Callable, Dict, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a dependency whose circuit is open."""
+
+
+class LatencyTracker:
+    """Keep the last ``size`` latencies in a ring buffer."""
+
+    def __init__(self, size: int = 256) -> None:
+        self.size = size
+        self._samples: List[float] = []
+        self._index = 0
+        self._sorted: Optional[List[float]] = None
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            if len(self._samples) < self.size:
+                self._samples.append(seconds)
+            else:
+                self._samples[self._index] = seconds
+            self._index = (self._index + 1) % self.size
+            self._sorted = None
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            if self._sorted is None:
+                self._sorted = sorted(self._samples)
+            ordered = self._sorted
+        rank = max(0, math.ceil(q / 100 * len(ordered)) - 1)
+        return ordered[rank]
+
+
+class CircuitBreaker:
+    """A closed / open / half-open circuit breaker.
+
+    ``failure_threshold`` consecutive failures open the circuit. After
+    ``recovery_timeout`` seconds it lets ``half_open_max_calls`` probes
+    through; a successful probe closes it again, a failed one re-opens it.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 30.0,
+        half_open_max_calls: int = 1,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = max(1, half_open_max_calls)
+        self.clock = clock
+
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+        self.rejected = 0
+        self.opened = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == OPEN and self.clock() - self._opened_at >= self.recovery_timeout:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                return True
+            if state == HALF_OPEN and self._probes < self.half_open_max_calls:
+                self._probes += 1
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probes = 0
+
+    def release(self) -> None:
+        """Give back a half-open probe whose call ended without an outcome."""
+
+        with self._lock:
+            if self._state == HALF_OPEN and self._probes:
+                self._probes -= 1
+
+    def record_failure(self) -> None:
+        with self._lock:
+            state = self._current_state()
+            self._failures += 1
+            if state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if state != OPEN:
+                    self.opened += 1
+                self._state = OPEN
+                self._opened_at = self.clock()
+                self._probes = 0
+
+
+class DependencyGuard:
+    """Wrap calls to one upstream dependency.
+
+    Each call gets a timeout derived from the observed latency
+    (``p99 * timeout_multiplier``, clamped to ``[min_timeout, max_timeout]``)
+    and is rejected outright while the circuit is open. When hedging is
+    requested, a second identical call is started if the first has not
+    answered within the observed p95, and whichever answers first wins.
+    """
+
+    min_samples = 20
+
+    def __init__(
+        self,
+        *,
+        max_timeout: float,
+        min_timeout: float = 1.0,
+        timeout_multiplier: float = 3.0,
+        breaker: Optional[CircuitBreaker] = None,
+        latency: Optional[LatencyTracker] = None,
+        hedge_workers: int = 8,
+    ) -> None:
+        self.max_timeout = max_timeout
+        self.min_timeout = min(min_timeout, max_timeout)
+        self.timeout_multiplier = timeout_multiplier
+        self.breaker = breaker or CircuitBreaker()
+        self.latency = latency or LatencyTracker()
+        self.hedge_workers = hedge_workers
+        self.hedged = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
+
+    def timeout(self) -> float:
+        if len(self.latency) < self.min_samples:
+            return self.max_timeout
+        p99 = self.latency.percentile(99) or self.max_timeout
+        return min(self.max_timeout, max(self.min_timeout, p99 * self.timeout_multiplier))
+
+    def hedge_delay(self) -> Optional[float]:
+        if len(self.latency) < self.min_samples:
+            return None
+        return self.latency.percentile(95)
+
+    def _start(self) -> float:
+        if not self.breaker.allow():
+            raise CircuitOpenError("Circuit is open.")
+        return time.monotonic()
+
+    def _finish(self, started: float, failed: bool) -> None:
+        if failed:
+            self.breaker.record_failure()
+            return
+        self.latency.record(time.monotonic() - started)
+        self.breaker.record_success()
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.hedge_workers, thread_name_prefix="hedge"
+                )
+            return self._executor
+
+    def _hedged(self, send: Callable[[float], T], timeout: float, delay: float) -> T:
+        executor = self._get_executor()
+        first: "Future[T]" = executor.submit(send, timeout)
+        done, _ = wait([first], timeout=delay)
+        if done:
+            return first.result()
+
+        self.hedged += 1
+        pending = {first, executor.submit(send, timeout)}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        assert error is not None
+        raise error
+
+    def call(
+        self,
+        send: Callable[[float], T],
+        *,
+        is_failure: Callable[[T], bool] = lambda result: False,
+        hedge: bool = False,
+    ) -> T:
+        """Run ``send(timeout)`` under the breaker and return its result."""
+
+        started = self._start()
+        timeout = self.timeout()
+        delay = self.hedge_delay() if hedge else None
+        try:
+            if delay is not None:
+                result = self._hedged(send, timeout, delay)
+            else:
+                result = send(timeout)
+        except Exception:
+            self._finish(started, failed=True)
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        self._finish(started, failed=is_failure(result))
+        return result
+
+    async def _ahedged(
+        self, send: Callable[[float], Awaitable[T]], timeout: float, delay: float
+    ) -> T:
+        first = asyncio.ensure_future(send(timeout))
+        done, _ = await asyncio.wait({first}, timeout=delay)
+        if done:
+            return first.result()
+
+        self.hedged += 1
+        pending = {first, asyncio.ensure_future(send(timeout))}
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+        assert error is not None
+        raise error
+
+    async def acall(
+        self,
+        send: Callable[[float], Awaitable[T]],
+        *,
+        is_failure: Callable[[T], bool] = lambda result: False,
+        hedge: bool = False,
+    ) -> T:
+        """Async version of :meth:`call`."""
+
+        started = self._start()
+        timeout = self.timeout()
+        delay = self.hedge_delay() if hedge else None
+        try:
+            if delay is not None:
+                result = await self._ahedged(send, timeout, delay)
+            else:
+                result = await send(timeout)
+        except Exception:
+            self._finish(started, failed=True)
+            raise
+        except BaseException:
+            # Cancelled by our caller: says nothing about Auth0's health.
+            self.breaker.release()
+            raise
+        self._finish(started, failed=is_failure(result))
+        return result
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.breaker.state,
+            "opened": self.breaker.opened,
+            "rejected": self.breaker.rejected,
+            "hedged": self.hedged,
+            "timeout": self.timeout(),
+            "p99": self.latency.percentile(99),
+        }
@@ -0,0 +1,60 @@
+"""Password hashers whose cost is read from settings.
+
+Django's hashers hard-code their work factors as class attributes. These
+subclasses keep the same algorithm names (so existing hashes still verify)
+but take their parameters from ``ACCOUNTS_*`` settings. Because
+``must_update`` compares the stored parameters with the configured ones,
+changing a setting rehashes each user's password on their next login.
+"""
+
+from __future__ import annotations
+
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+def _setting(name: str, default: int) -> int:
+    return getattr(settings, name, 0) or default
+
+
+class PBKDF2PasswordHasher(hashers.PBKDF2PasswordHasher):
+    @property
+    def iterations(self) -> int:
+        return _setting("ACCOUNTS_PBKDF2_ITERATIONS", hashers.PBKDF2PasswordHasher.iterations)
+
+
+class ScryptPasswordHasher(hashers.ScryptPasswordHasher):
+    @property
+    def work_factor(self) -> int:
+        return _setting("ACCOUNTS_SCRYPT_WORK_FACTOR", hashers.ScryptPasswordHasher.work_factor)
+
+    @property
+    def block_size(self) -> int:
+        return _setting("ACCOUNTS_SCRYPT_BLOCK_SIZE", hashers.ScryptPasswordHasher.block_size)
+
+    @property
+    def parallelism(self) -> int:
+        return _setting("ACCOUNTS_SCRYPT_PARALLELISM", hashers.ScryptPasswordHasher.parallelism)
+
+    @property
+    def maxmem(self) -> int:
+        # OpenSSL refuses more than 32 MiB unless told otherwise; scrypt needs
+        # about 128 * n * r bytes.
+        needed = 128 * self.work_factor * self.block_size
+        return 0 if needed < 16 * 1024 * 1024 else 2 * needed
+
+
+class Argon2PasswordHasher(hashers.Argon2PasswordHasher):
+    """Requires ``argon2-cffi``; only listed in ``PASSWORD_HASHERS`` when installed."""
+
+    @property
+    def time_cost(self) -> int:
+        return _setting("ACCOUNTS_ARGON2_TIME_COST", hashers.Argon2PasswordHasher.time_cost)
+
+    @property
+    def memory_cost(self) -> int:
+        return _setting("ACCOUNTS_ARGON2_MEMORY_COST", hashers.Argon2PasswordHasher.memory_cost)
+
+    @property
+    def parallelism(self) -> int:
+        return _setting("ACCOUNTS_ARGON2_PARALLELISM", hashers.Argon2PasswordHasher.parallelism)
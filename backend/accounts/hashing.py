@@ -0,0 +1,173 @@
+"""Check local passwords in a pool of worker processes.
+
+Password hashes are deliberately slow and hold the GIL while they run, so a
+check on the request thread stalls every other request in the process. The
+checks are sent to a bounded ``ProcessPoolExecutor`` instead; the request
+thread (or the event loop) only waits for the answer.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+
+MODEL_BACKEND = "django.contrib.auth.backends.ModelBackend"
+
+
+class PasswordCheckBusy(Exception):
+    """Raised when too many password checks are already waiting."""
+
+
+def _init_worker() -> None:
+    import django
+
+    django.setup()
+
+
+def verify_password(password: str, encoded: Optional[str]) -> Tuple[bool, Optional[str]]:
+    """Return whether ``password`` matches ``encoded`` and, if the stored hash
+    uses outdated parameters, a new hash to save.
+
+    ``encoded=None`` stands for an unknown user: a hash is still computed so
+    the response time does not reveal which usernames exist.
+    """
+
+    from django.contrib.auth import hashers
+
+    if encoded is None:
+        hashers.make_password(password)
+        return False, None
+
+    is_correct, must_update = hashers.verify_password(password, encoded)
+    if is_correct and must_update:
+        return True, hashers.make_password(password)
+    return is_correct, None
+
+
+class PasswordCheckPool:
+    """Run :func:`verify_password` in up to ``max_workers`` processes.
+
+    At most ``max_pending`` checks may be queued or running; beyond that
+    :class:`PasswordCheckBusy` is raised so a login burst is shed instead of
+    piling up requests that would time out anyway. Workers are spawned (not
+    forked) because the parent has threads, and are started lazily.
+    """
+
+    def __init__(self, max_workers: int, max_pending: Optional[int] = None) -> None:
+        self.max_workers = max(1, max_workers)
+        self.max_pending = max_pending or self.max_workers * 16
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.checks = 0
+        self.rejected = 0
+        self.restarts = 0
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return self._executor
+
+    def _reset(self, executor: ProcessPoolExecutor) -> None:
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+                self.restarts += 1
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    def _done(self, future: Future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    def _submit(self, password: str, encoded: Optional[str]):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordCheckBusy("Too many password checks in progress.")
+            self._pending += 1
+            self.checks += 1
+            executor = self._get_executor()
+        try:
+            future = executor.submit(verify_password, password, encoded)
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            raise
+        future.add_done_callback(self._done)
+        return executor, future
+
+    def submit(self, password: str, encoded: Optional[str]) -> "Future[Tuple[bool, Optional[str]]]":
+        return self._submit(password, encoded)[1]
+
+    def check(self, password: str, encoded: Optional[str]) -> Tuple[bool, Optional[str]]:
+        executor, future = self._submit(password, encoded)
+        try:
+            return future.result()
+        except BrokenProcessPool:
+            # A worker died (OOM killer, segfault): retry once on a fresh pool.
+            self._reset(executor)
+            return self.submit(password, encoded).result()
+
+    async def acheck(self, password: str, encoded: Optional[str]) -> Tuple[bool, Optional[str]]:
+        executor, future = self._submit(password, encoded)
+        try:
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            self._reset(executor)
+            return await asyncio.wrap_future(self.submit(password, encoded))
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "pending": self._pending,
+                "checks": self.checks,
+                "rejected": self.rejected,
+                "restarts": self.restarts,
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+_pool: Optional[PasswordCheckPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_password_check_pool() -> Optional[PasswordCheckPool]:
+    """Return the process-wide pool, or ``None`` when checks run inline.
+
+    Offloading is only possible when ``ModelBackend`` is the sole
+    authentication backend, since other backends may check passwords in
+    ways the worker cannot reproduce.
+    """
+
+    global _pool
+
+    workers = getattr(settings, "ACCOUNTS_HASHING_WORKERS", 0)
+    backends = getattr(settings, "AUTHENTICATION_BACKENDS", [MODEL_BACKEND])
+    if workers <= 0 or list(backends) != [MODEL_BACKEND]:
+        return None
+
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PasswordCheckPool(
+                    workers, getattr(settings, "ACCOUNTS_HASHING_MAX_PENDING", None)
+                )
+                atexit.register(_pool.shutdown)
+    return _pool
@@ -0,0 +1,120 @@
+"""Measure concurrent logins per second against the configured database."""
+
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model, login
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connection
+from django.test.client import RequestFactory
+
+from accounts import views
+from accounts.models import Auth0Identity
+from accounts.profiles import normalize_profile
+
+
+def _percentile(ordered, q):
+    if not ordered:
+        return 0.0
+    return ordered[max(0, int(round(q / 100 * len(ordered))) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Run Auth0-style logins (user sync, login() and session save) from "
+        "several threads against DATABASES['default'] and report logins per "
+        "second and latency percentiles. Run it once per DJANGO_DB_* / "
+        "DJANGO_SQLITE_* profile to compare them. Bench users are deleted "
+        "afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--threads", type=int, default=8)
+        parser.add_argument("--logins", type=int, default=200, help="Logins per thread.")
+        parser.add_argument("--users", type=int, default=50)
+        parser.add_argument("--prefix", default="bench-db-")
+
+    def _mode(self):
+        database = settings.DATABASES["default"]
+        parts = [connection.vendor, f"CONN_MAX_AGE={database.get('CONN_MAX_AGE', 0)}"]
+        if connection.vendor == "sqlite":
+            pragmas = getattr(settings, "SQLITE_PRAGMAS", {})
+            parts.extend(f"{name}={value}" for name, value in pragmas.items())
+        options = database.get("OPTIONS", {})
+        if options.get("transaction_mode"):
+            parts.append(f"transaction_mode={options['transaction_mode']}")
+        if options.get("pool"):
+            parts.append(f"pool={options['pool']}")
+        return " ".join(parts)
+
+    def _worker(self, index, options, latencies, errors, session_keys):
+        factory = RequestFactory()
+        middleware = SessionMiddleware(lambda request: None)
+        users, prefix = options["users"], options["prefix"]
+        for iteration in range(options["logins"]):
+            username = f"{prefix}{(index + iteration) % users}"
+            profile = normalize_profile(
+                username,
+                {
+                    "given_name": "Bench",
+                    "family_name": str(iteration % 3),
+                    "email": f"{username}@example.com",
+                },
+            )
+            started = time.perf_counter()
+            try:
+                request = factory.post("/api/login/")
+                middleware.process_request(request)
+                user = views._sync_user_with_profile(username, profile)
+                login(request, user, backend="django.contrib.auth.backends.ModelBackend")
+                request.session.save()
+            except Exception as exc:
+                errors.append(exc)
+            else:
+                session_keys.append(request.session.session_key)
+                latencies.append(time.perf_counter() - started)
+            # Mimic request_finished so CONN_MAX_AGE decides reuse.
+            close_old_connections()
+        connection.close()
+
+    def handle(self, *args, **options):
+        threads = max(1, options["threads"])
+        latencies = []
+        errors = []
+        session_keys = []
+        views._synced_profiles.clear()
+
+        workers = [
+            threading.Thread(
+                target=self._worker,
+                args=(index, options, latencies, errors, session_keys),
+            )
+            for index in range(threads)
+        ]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        user_model = get_user_model()
+        bench_users = user_model.objects.filter(username__startswith=options["prefix"])
+        Auth0Identity.objects.filter(user__in=bench_users).delete()
+        bench_users.delete()
+        Session.objects.filter(session_key__in=set(session_keys)).delete()
+        views._synced_profiles.clear()
+
+        ordered = sorted(latencies)
+        self.stdout.write(f"mode: {self._mode()}")
+        self.stdout.write(
+            f"threads={threads} logins={len(ordered)} errors={len(errors)} "
+            f"logins/s={len(ordered) / elapsed:.1f} "
+            f"p50={_percentile(ordered, 50) * 1000:.2f}ms "
+            f"p99={_percentile(ordered, 99) * 1000:.2f}ms"
+        )
+        if errors:
+            self.stderr.write(f"first error: {errors[0]!r}")
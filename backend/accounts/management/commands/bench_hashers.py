@@ -0,0 +1,61 @@
+"""Compare password hashers and inline vs. offloaded password checks."""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hashers, make_password
+from django.core.management.base import BaseCommand
+
+from accounts.hashing import PasswordCheckPool, verify_password
+
+
+class Command(BaseCommand):
+    help = (
+        "For each hasher in PASSWORD_HASHERS, report the cost of one check and "
+        "the checks per second reached by --concurrency threads checking "
+        "inline versus through a pool of --workers processes. Hasher "
+        "parameters come from the ACCOUNTS_PBKDF2_* / ACCOUNTS_SCRYPT_* / "
+        "ACCOUNTS_ARGON2_* settings."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--checks", type=int, default=20)
+        parser.add_argument("--concurrency", type=int, default=8)
+        parser.add_argument("--workers", type=int, default=settings.ACCOUNTS_HASHING_WORKERS or 4)
+
+    def _throughput(self, check, encoded, checks, concurrency):
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as threads:
+            list(threads.map(lambda _: check("bench-password", encoded), range(checks)))
+        return checks / (time.perf_counter() - started)
+
+    def handle(self, *args, **options):
+        checks = options["checks"]
+        concurrency = options["concurrency"]
+        pool = PasswordCheckPool(max_workers=options["workers"], max_pending=checks + concurrency)
+        # Pay the worker start-up cost before measuring.
+        pool.check("bench-password", None)
+
+        self.stdout.write(
+            f"{'hasher':<16} {'ms/check':>9} {'inline/s':>9} "
+            f"{'pool/s':>9}   (concurrency={concurrency}, workers={pool.max_workers})"
+        )
+        try:
+            for hasher in get_hashers():
+                if hasher.algorithm == "pbkdf2_sha1":
+                    continue
+                encoded = make_password("bench-password", hasher=hasher.algorithm)
+
+                started = time.perf_counter()
+                for _ in range(checks):
+                    hasher.verify("bench-password", encoded)
+                millis = (time.perf_counter() - started) * 1000 / checks
+
+                inline = self._throughput(verify_password, encoded, checks, concurrency)
+                offloaded = self._throughput(pool.check, encoded, checks, concurrency)
+                self.stdout.write(
+                    f"{hasher.algorithm:<16} {millis:>9.1f} {inline:>9.1f} {offloaded:>9.1f}"
+                )
+        finally:
+            pool.shutdown()
@@ -0,0 +1,416 @@
+"""Load-test POST /api/login/ against a local Auth0 stand-in."""
+
+import asyncio
+import contextlib
+import importlib
+import io
+import json
+import os
+import platform
+import subprocess
+import threading
+import time
+from http.client import HTTPConnection, HTTPSConnection
+from http.cookies import SimpleCookie
+from unittest import mock
+from urllib.parse import urlsplit
+
+import django
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.models import Session
+from django.core.asgi import get_asgi_application
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+from django.urls import clear_url_caches
+
+from accounts import auth0
+from accounts.auth0_stub import Auth0StubServer
+from accounts.writebehind import get_write_behind
+
+_PATH = "/api/login/"
+_HOST = "localhost"
+
+
+def _percentile(ordered, q):
+    if not ordered:
+        return 0.0
+    return ordered[max(0, int(round(q / 100 * len(ordered))) - 1)]
+
+
+def _session_key(set_cookie_headers):
+    for header in set_cookie_headers:
+        cookie = SimpleCookie(header)
+        if settings.SESSION_COOKIE_NAME in cookie:
+            return cookie[settings.SESSION_COOKIE_NAME].value
+    return None
+
+
+class _QueryCounter:
+    """Count SQL statements on every connection, whichever thread opens it."""
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def install(self, connection):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def on_connection_created(self, sender, connection, **kwargs):
+        self.install(connection)
+
+
+class _Run:
+    def __init__(self, total):
+        self.total = total
+        self.latencies = []
+        self.statuses = {}
+        self.session_keys = []
+        self._issued = 0
+        self._lock = threading.Lock()
+
+    def next_index(self):
+        with self._lock:
+            if self._issued >= self.total:
+                return None
+            self._issued += 1
+            return self._issued
+
+    def record(self, status, seconds, session_key):
+        with self._lock:
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            if status == 200:
+                self.latencies.append(seconds)
+            if session_key:
+                self.session_keys.append(session_key)
+
+
+def _reload_urls(async_views):
+    """Re-resolve login/ to the sync or async view, as the entry point would."""
+
+    with override_settings(ACCOUNTS_ASYNC_VIEWS=async_views):
+        importlib.reload(importlib.import_module("accounts.urls"))
+        importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+    clear_url_caches()
+
+
+class Command(BaseCommand):
+    help = (
+        "Start a local stand-in for Auth0 (/oauth/token and /userinfo) with "
+        "configurable latency, jitter and error rate, point AUTH0_DOMAIN at it "
+        "and drive POST /api/login/ at the requested concurrency through the "
+        "WSGI or ASGI application (in-process) or an external server (--url). "
+        "Prints requests/s, latency percentiles and DB queries per login as JSON. "
+        "Every request comes from one address, so login rate limiting and the "
+        "in-flight cap are turned off unless --with-limits is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--driver", choices=["wsgi", "asgi", "url"], default="wsgi")
+        parser.add_argument("--url", help="Base URL of a running server (with --driver url).")
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--warmup", type=int, default=20)
+        parser.add_argument("--concurrency", type=int, default=16)
+        parser.add_argument("--users", type=int, default=100)
+        parser.add_argument("--prefix", default="bench-load-")
+        parser.add_argument("--latency-ms", type=float, default=30.0)
+        parser.add_argument("--jitter-ms", type=float, default=10.0)
+        parser.add_argument("--error-rate", type=float, default=0.0)
+        parser.add_argument("--stub-port", type=int, default=0)
+        parser.add_argument("--tls-cert", help="Serve the stub over HTTPS with this PEM cert.")
+        parser.add_argument("--tls-key", help="Private key for --tls-cert.")
+        parser.add_argument("--label", default="", help="Free-form tag stored in the report.")
+        parser.add_argument("--output", help="Also write the JSON report to this file.")
+        parser.add_argument(
+            "--with-limits",
+            action="store_true",
+            help="Keep the login rate limits and in-flight cap (measures the throttle).",
+        )
+
+    # -- drivers ----------------------------------------------------------
+
+    def _body(self, index, options):
+        username = f"{options['prefix']}{index % options['users']}"
+        return json.dumps({"username": username, "password": "bench-password"}).encode()
+
+    def _drive_wsgi(self, run, options):
+        application = get_wsgi_application()
+
+        def worker():
+            while (index := run.next_index()) is not None:
+                body = self._body(index, options)
+                environ = {
+                    "REQUEST_METHOD": "POST",
+                    "PATH_INFO": _PATH,
+                    "SCRIPT_NAME": "",
+                    "QUERY_STRING": "",
+                    "CONTENT_TYPE": "application/json",
+                    "CONTENT_LENGTH": str(len(body)),
+                    "SERVER_NAME": _HOST,
+                    "SERVER_PORT": "80",
+                    "HTTP_HOST": _HOST,
+                    "REMOTE_ADDR": "127.0.0.1",
+                    "SERVER_PROTOCOL": "HTTP/1.1",
+                    "wsgi.input": io.BytesIO(body),
+                    "wsgi.errors": io.StringIO(),
+                    "wsgi.url_scheme": "http",
+                    "wsgi.version": (1, 0),
+                    "wsgi.multithread": True,
+                    "wsgi.multiprocess": False,
+                    "wsgi.run_once": False,
+                }
+                captured = {}
+
+                def start_response(status, headers, exc_info=None):
+                    captured["status"] = int(status.split()[0])
+                    captured["headers"] = headers
+
+                started = time.perf_counter()
+                response = application(environ, start_response)
+                b"".join(response)
+                response.close()
+                cookies = [value for name, value in captured["headers"] if name == "Set-Cookie"]
+                run.record(captured["status"], time.perf_counter() - started, _session_key(cookies))
+
+        threads = [threading.Thread(target=worker) for _ in range(options["concurrency"])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    def _drive_asgi(self, run, options):
+        application = get_asgi_application()
+
+        async def one(index):
+            body = self._body(index, options)
+            scope = {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": "POST",
+                "scheme": "http",
+                "path": _PATH,
+                "raw_path": _PATH.encode(),
+                "query_string": b"",
+                "root_path": "",
+                "headers": [
+                    (b"host", _HOST.encode()),
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(body)).encode()),
+                ],
+                "client": ("127.0.0.1", 50000),
+                "server": (_HOST, 80),
+            }
+            finished = asyncio.Event()
+            sent_body = False
+            captured = {"cookies": []}
+
+            async def receive():
+                nonlocal sent_body
+                if not sent_body:
+                    sent_body = True
+                    return {"type": "http.request", "body": body, "more_body": False}
+                await finished.wait()
+                return {"type": "http.disconnect"}
+
+            async def send(message):
+                if message["type"] == "http.response.start":
+                    captured["status"] = message["status"]
+                    captured["cookies"] = [
+                        value.decode("latin-1")
+                        for name, value in message["headers"]
+                        if name.lower() == b"set-cookie"
+                    ]
+                elif not message.get("more_body"):
+                    finished.set()
+
+            started = time.perf_counter()
+            await application(scope, receive, send)
+            finished.set()
+            run.record(
+                captured["status"], time.perf_counter() - started, _session_key(captured["cookies"])
+            )
+
+        async def worker():
+            while (index := run.next_index()) is not None:
+                await one(index)
+
+        async def main():
+            await asyncio.gather(*(worker() for _ in range(options["concurrency"])))
+
+        asyncio.run(main())
+
+    def _drive_url(self, run, options):
+        parts = urlsplit(options["url"])
+        connection_class = HTTPSConnection if parts.scheme == "https" else HTTPConnection
+
+        def worker():
+            connection = connection_class(parts.hostname, parts.port, timeout=60)
+            try:
+                while (index := run.next_index()) is not None:
+                    body = self._body(index, options)
+                    started = time.perf_counter()
+                    connection.request(
+                        "POST",
+                        f"{parts.path.rstrip('/')}{_PATH}",
+                        body=body,
+                        headers={"Content-Type": "application/json"},
+                    )
+                    response = connection.getresponse()
+                    response.read()
+                    run.record(
+                        response.status,
+                        time.perf_counter() - started,
+                        _session_key(response.headers.get_all("Set-Cookie") or []),
+                    )
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=worker) for _ in range(options["concurrency"])]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    # -- main -------------------------------------------------------------
+
+    def _git_revision(self):
+        try:
+            return subprocess.run(
+                ["git", "rev-parse", "--short", "HEAD"],
+                capture_output=True,
+                text=True,
+                check=True,
+                cwd=settings.BASE_DIR,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return ""
+
+    def _cleanup(self, options, session_keys):
+        if options["driver"] == "url":
+            return
+        get_write_behind().flush()
+        users = get_user_model().objects.filter(username__startswith=options["prefix"])
+        users.delete()
+        Session.objects.filter(session_key__in=set(session_keys)).delete()
+
+    def handle(self, *args, **options):
+        driver = options["driver"]
+        if driver == "url" and not options["url"]:
+            raise CommandError("--driver url needs --url.")
+        if bool(options["tls_cert"]) != bool(options["tls_key"]):
+            raise CommandError("--tls-cert and --tls-key go together.")
+
+        stub = Auth0StubServer(
+            port=options["stub_port"],
+            latency=options["latency_ms"] / 1000,
+            jitter=options["jitter_ms"] / 1000,
+            error_rate=options["error_rate"],
+            certfile=options["tls_cert"],
+            keyfile=options["tls_key"],
+        )
+        env = {
+            "AUTH0_DOMAIN": stub.url,
+            "AUTH0_CLIENT_ID": "bench-client",
+            "AUTH0_CLIENT_SECRET": "bench-secret",
+        }
+        if options["tls_cert"]:
+            env["AUTH0_CA_BUNDLE"] = options["tls_cert"]
+        limits_off = {"ACCOUNTS_LOGIN_RATE_LIMITING": False, "ACCOUNTS_LOGIN_MAX_IN_FLIGHT": 0}
+        if driver == "url":
+            server_env = dict(env)
+            if not options["with_limits"]:
+                server_env.update(
+                    ACCOUNTS_LOGIN_RATE_LIMITING="False", ACCOUNTS_LOGIN_MAX_IN_FLIGHT="0"
+                )
+            self.stderr.write(
+                "Start the server with: "
+                + " ".join(f"{name}={value}" for name, value in server_env.items())
+            )
+        limits = (
+            contextlib.nullcontext()
+            if options["with_limits"] or driver == "url"
+            else override_settings(**limits_off)
+        )
+
+        counter = _QueryCounter()
+        session_keys = []
+        with stub, mock.patch.dict(os.environ, env), limits:
+            if driver != "url":
+                _reload_urls(async_views=driver == "asgi")
+                connection_created.connect(counter.on_connection_created)
+                for connection in connections.all():
+                    counter.install(connection)
+
+            drive = getattr(self, f"_drive_{driver}")
+            try:
+                warmup = _Run(options["warmup"])
+                drive(warmup, options)
+                session_keys.extend(warmup.session_keys)
+
+                if driver != "url":
+                    get_write_behind().flush()
+                queries_before = counter.count
+                stub_before = sum(stub.requests.values())
+                run = _Run(options["requests"])
+                started = time.perf_counter()
+                drive(run, options)
+                elapsed = time.perf_counter() - started
+                if driver != "url":
+                    # Batched last_login/audit writes belong to these logins too.
+                    get_write_behind().flush()
+                queries = counter.count - queries_before
+                session_keys.extend(run.session_keys)
+            finally:
+                connection_created.disconnect(counter.on_connection_created)
+                if driver != "url":
+                    _reload_urls(async_views=settings.ACCOUNTS_ASYNC_VIEWS)
+                self._cleanup(options, session_keys)
+
+        ordered = sorted(run.latencies)
+        successes = len(ordered)
+        report = {
+            "label": options["label"],
+            "revision": self._git_revision(),
+            "driver": driver,
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": connections["default"].vendor,
+            "concurrency": options["concurrency"],
+            "requests": run.total,
+            "status_codes": {str(status): count for status, count in sorted(run.statuses.items())},
+            "seconds": round(elapsed, 3),
+            "rps": round(run.total / elapsed, 1) if elapsed else 0.0,
+            "latency_ms": {
+                "p50": round(_percentile(ordered, 50) * 1000, 2),
+                "p95": round(_percentile(ordered, 95) * 1000, 2),
+                "p99": round(_percentile(ordered, 99) * 1000, 2),
+                "max": round(ordered[-1] * 1000, 2) if ordered else 0.0,
+            },
+            "queries_per_login": (
+                round(queries / successes, 2) if successes and driver != "url" else None
+            ),
+            "auth0_requests": sum(stub.requests.values()) - stub_before,
+            "stub": {
+                "latency_ms": options["latency_ms"],
+                "jitter_ms": options["jitter_ms"],
+                "error_rate": options["error_rate"],
+                "tls": bool(options["tls_cert"]),
+            },
+            "login_flight": auth0.login_flight_stats(),
+        }
+
+        output = json.dumps(report, indent=2)
+        self.stdout.write(output)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as handle:
+                handle.write(output + "\n")
@@ -0,0 +1,123 @@
+"""Count the SQL writes issued per Auth0 login, before and after fingerprints."""
+
+import time
+
+from django.contrib.auth import get_user_model, login
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.client import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from accounts import views
+from accounts.profiles import normalize_profile
+
+_WRITE_PREFIXES = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+_CONTROL_PREFIXES = ("BEGIN", "COMMIT", "ROLLBACK", "SAVEPOINT", "RELEASE")
+
+
+def _count(queries):
+    reads = writes = 0
+    for query in queries.captured_queries:
+        sql = query["sql"].lstrip().upper()
+        if sql.startswith(_CONTROL_PREFIXES):
+            continue
+        if sql.startswith(_WRITE_PREFIXES):
+            writes += 1
+        else:
+            reads += 1
+    return reads, writes
+
+
+def _legacy_sync(username, profile):
+    """The user sync as it was before profile fingerprints, for comparison."""
+
+    user, created = get_user_model().objects.get_or_create(username=username)
+    update_fields = []
+    if created:
+        user.set_unusable_password()
+        update_fields.append("password")
+    for field in ("first_name", "last_name", "email"):
+        value = profile.get(field, "")
+        if value and getattr(user, field) != value:
+            setattr(user, field, value)
+            update_fields.append(field)
+    if update_fields:
+        user.save(update_fields=list(dict.fromkeys(update_fields)))
+    return user
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Simulate repeated Auth0 logins with an unchanged profile and report "
+        "SQL reads/writes per login for the legacy and fingerprinted sync, "
+        "separately from the last_login and session writes done by login(). "
+        "Everything runs inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--logins", type=int, default=200)
+        parser.add_argument("--username", default="bench-login-writes")
+
+    def _run(self, sync, logins, username, profile):
+        factory = RequestFactory()
+        middleware = SessionMiddleware(lambda request: None)
+        sync_reads = sync_writes = login_writes = 0
+        started = time.perf_counter()
+
+        # The first login creates the user; measure the steady state after it.
+        for iteration in range(logins + 1):
+            connection.queries_log.clear()
+            request = factory.post("/api/login/")
+            middleware.process_request(request)
+            with CaptureQueriesContext(connection) as sync_queries:
+                user = sync(username, profile)
+            with CaptureQueriesContext(connection) as login_queries:
+                login(request, user)
+                request.session.save()
+            if iteration == 0:
+                started = time.perf_counter()
+                continue
+            reads, writes = _count(sync_queries)
+            sync_reads += reads
+            sync_writes += writes
+            login_writes += _count(login_queries)[1]
+
+        elapsed = time.perf_counter() - started
+        return (
+            sync_reads / logins,
+            sync_writes / logins,
+            login_writes / logins,
+            elapsed * 1000 / logins,
+        )
+
+    def handle(self, *args, **options):
+        logins = options["logins"]
+        profile = normalize_profile(
+            options["username"],
+            {"given_name": "Bench", "family_name": "User", "email": "bench@example.com"},
+        )
+
+        rows = []
+        for label, sync in (("legacy", _legacy_sync), ("fingerprint", views._sync_user_with_profile)):
+            views._synced_profiles.clear()
+            try:
+                with transaction.atomic():
+                    rows.append((label, *self._run(sync, logins, options["username"], profile)))
+                    raise _Rollback
+            except _Rollback:
+                pass
+
+        self.stdout.write(
+            f"{'strategy':<12} {'sync reads':>11} {'sync writes':>12} "
+            f"{'login+session writes':>21} {'ms/login':>9}"
+        )
+        for label, reads, writes, other_writes, millis in rows:
+            self.stdout.write(
+                f"{label:<12} {reads:>11.2f} {writes:>12.2f} "
+                f"{other_writes:>21.2f} {millis:>9.3f}"
+            )
@@ -0,0 +1,285 @@
+"""Create and update Django users from an Auth0 user export."""
+
+import gzip
+import io
+import json
+import os
+import re
+import sys
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.dateparse import parse_datetime
+
+from accounts.profiles import ProfileBatch, normalize_profile
+
+_CHUNK_SIZE = 1 << 16
+_SEPARATORS = re.compile(r"[\s,]*")
+
+
+def _open_text(path):
+    raw = sys.stdin.buffer if path == "-" else open(path, "rb")
+    buffered = io.BufferedReader(raw) if not hasattr(raw, "peek") else raw
+    if buffered.peek(2)[:2] == b"\x1f\x8b":
+        buffered = gzip.GzipFile(fileobj=buffered)
+    return io.TextIOWrapper(buffered, encoding="utf-8")
+
+
+def _iter_json_lines(stream):
+    for line_number, line in enumerate(stream, 1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except json.JSONDecodeError as exc:
+            raise CommandError(f"Line {line_number}: {exc}")
+
+
+def _iter_json_array(stream):
+    """Yield the elements of a top-level JSON array, one chunk in memory at a time."""
+
+    decoder = json.JSONDecoder()
+    buffer = stream.read(_CHUNK_SIZE).lstrip()
+    if not buffer.startswith("["):
+        raise CommandError("Expected a JSON array.")
+    pos, eof = 1, False
+
+    while True:
+        pos = _SEPARATORS.match(buffer, pos).end()
+        if buffer.startswith("]", pos):
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+            # A number at the end of the buffer may continue in the next chunk.
+            complete = end < len(buffer) or eof
+        except json.JSONDecodeError:
+            if eof:
+                raise CommandError("Invalid or unterminated JSON array.")
+            complete = False
+        if not complete:
+            chunk = stream.read(_CHUNK_SIZE)
+            eof = not chunk
+            buffer, pos = buffer[pos:] + chunk, 0
+            continue
+        yield item
+        pos = end
+
+
+def iter_export(stream, fmt="auto"):
+    """Yield the user records of an Auth0 export (JSON array or JSON lines)."""
+
+    if fmt == "auto":
+        head = stream.read(1)
+        while head.isspace():
+            head = stream.read(1)
+        fmt = "json" if head == "[" else "jsonl"
+        stream = _Prefixed(head, stream)
+    records = _iter_json_array(stream) if fmt == "json" else _iter_json_lines(stream)
+    for record in records:
+        if isinstance(record, dict):
+            yield record
+
+
+def _subject(record):
+    user_id = record.get("user_id")
+    return user_id if isinstance(user_id, str) else ""
+
+
+class _Prefixed:
+    """A text stream with ``prefix`` pushed back in front of it."""
+
+    def __init__(self, prefix, stream):
+        self._prefix = prefix
+        self._stream = stream
+
+    def read(self, size=-1):
+        prefix, self._prefix = self._prefix, ""
+        if size is not None and size >= 0:
+            return prefix + self._stream.read(max(0, size - len(prefix)))
+        return prefix + self._stream.read()
+
+    def __iter__(self):
+        prefix, self._prefix = self._prefix, ""
+        first = True
+        for line in self._stream:
+            if first:
+                line, first = prefix + line, False
+            yield line
+        if first and prefix:
+            yield prefix
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream an Auth0 user export (JSON array or JSON lines, optionally "
+        "gzipped; '-' reads stdin) into the user table. Users are upserted "
+        "in batches, each in its own transaction, with the same field "
+        "mapping as the login. --resume continues after the last committed "
+        "batch recorded in the checkpoint file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path")
+        parser.add_argument("--format", choices=["auto", "json", "jsonl"], default="auto")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--username-field",
+            action="append",
+            dest="username_fields",
+            help="Export field holding the login username; repeat for fallbacks "
+            "(default: username, then email).",
+        )
+        parser.add_argument("--checkpoint", help="Default: <path>.checkpoint.")
+        parser.add_argument("--resume", action="store_true")
+        parser.add_argument("--dry-run", action="store_true")
+        parser.add_argument(
+            "--progress-every", type=int, default=10, help="Report every N batches."
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        checkpoint = options["checkpoint"] or (None if path == "-" else f"{path}.checkpoint")
+        if options["resume"] and checkpoint is None:
+            raise CommandError("--resume needs --checkpoint when reading stdin.")
+
+        self.username_fields = options["username_fields"] or ["username", "email"]
+        self.dry_run = options["dry_run"]
+        self.counts = dict.fromkeys(("created", "updated", "unchanged", "skipped"), 0)
+        # One unusable password for the whole run: hashing a fresh random one
+        # per user would dominate the import.
+        self.unusable_password = make_password(None)
+
+        skip = self._read_checkpoint(checkpoint) if options["resume"] else 0
+        batch_size = max(1, options["batch_size"])
+        processed, batches, batch = 0, 0, []
+        started = time.perf_counter()
+
+        with _open_text(path) as stream:
+            for record in iter_export(stream, options["format"]):
+                processed += 1
+                if processed <= skip:
+                    continue
+                batch.append(record)
+                if len(batch) >= batch_size:
+                    self._import_batch(batch)
+                    batches += 1
+                    batch = []
+                    self._write_checkpoint(checkpoint, processed)
+                    if batches % max(1, options["progress_every"]) == 0:
+                        self._report(processed, skip, started)
+            if batch:
+                self._import_batch(batch)
+                self._write_checkpoint(checkpoint, processed)
+
+        self._report(processed, skip, started)
+        if checkpoint and not self.dry_run and os.path.exists(checkpoint):
+            os.remove(checkpoint)
+
+    def _read_checkpoint(self, checkpoint):
+        try:
+            with open(checkpoint, encoding="utf-8") as handle:
+                return int(json.load(handle)["records"])
+        except FileNotFoundError:
+            return 0
+        except (ValueError, KeyError, TypeError):
+            raise CommandError(f"Unreadable checkpoint file {checkpoint}.")
+
+    def _write_checkpoint(self, checkpoint, records):
+        if checkpoint is None or self.dry_run:
+            return
+        partial = f"{checkpoint}.tmp"
+        with open(partial, "w", encoding="utf-8") as handle:
+            json.dump({"records": records}, handle)
+        os.replace(partial, checkpoint)
+
+    def _report(self, processed, skipped_on_resume, started):
+        elapsed = time.perf_counter() - started
+        imported = processed - skipped_on_resume
+        rate = imported / elapsed if elapsed else 0.0
+        counts = " ".join(f"{name}={value}" for name, value in self.counts.items())
+        prefix = "dry-run " if self.dry_run else ""
+        self.stdout.write(
+            f"{prefix}processed={processed} {counts} rows/s={rate:.0f} elapsed={elapsed:.1f}s"
+        )
+
+    def _username(self, record):
+        for field in self.username_fields:
+            value = record.get(field)
+            if isinstance(value, str) and value.strip():
+                return value.strip()
+        return ""
+
+    def _profiles(self, records):
+        """Map records to normalized profiles keyed by username (last one wins)."""
+
+        max_length = get_user_model()._meta.get_field("username").max_length
+        profiles = {}
+        for record in records:
+            username = self._username(record)
+            if not username or len(username) > max_length:
+                self.counts["skipped"] += 1
+                continue
+            profiles[username] = (normalize_profile(username, record), record)
+        return profiles
+
+    def _import_batch(self, records):
+        profiles = self._profiles(records)
+        if not profiles:
+            return
+
+        user_model = get_user_model()
+        with transaction.atomic():
+            existing = {
+                user.username: user
+                for user in user_model.objects.select_related("auth0_identity").filter(
+                    username__in=list(profiles)
+                )
+            }
+
+            new_users, changes = [], ProfileBatch()
+            for username, (profile, record) in profiles.items():
+                user = existing.get(username)
+                if user is None:
+                    new_users.append(self._new_user(user_model, profile, record))
+                elif changes.add(user, profile, _subject(record)):
+                    self.counts["updated"] += 1
+                else:
+                    self.counts["unchanged"] += 1
+            self.counts["created"] += len(new_users)
+
+            if self.dry_run:
+                return
+
+            user_model.objects.bulk_create(new_users)
+            if any(user.pk is None for user in new_users):
+                # Backends that do not return ids from a bulk insert.
+                ids = dict(
+                    user_model.objects.filter(
+                        username__in=[user.username for user in new_users]
+                    ).values_list("username", "pk")
+                )
+                for user in new_users:
+                    user.pk = ids[user.username]
+            for user in new_users:
+                profile, record = profiles[user.username]
+                changes.add_new(user, profile, _subject(record))
+            changes.save()
+
+    def _new_user(self, user_model, profile, record):
+        user = user_model(
+            username=profile["username"],
+            first_name=profile["first_name"],
+            last_name=profile["last_name"],
+            email=profile["email"],
+            password=self.unusable_password,
+        )
+        created_at = record.get("created_at")
+        if isinstance(created_at, str):
+            date_joined = parse_datetime(created_at)
+            if date_joined is not None:
+                user.date_joined = date_joined
+        return user
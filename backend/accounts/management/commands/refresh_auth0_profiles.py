@@ -0,0 +1,101 @@
+"""Refresh names and emails of Auth0 users from the Management API."""
+
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from accounts.auth0 import Auth0AuthenticationError, Auth0ConfigurationError
+from accounts.management_api import (
+    DEFAULT_IDS_PER_QUERY,
+    ManagementAPIError,
+    get_management_client,
+)
+from accounts.models import Auth0Identity
+from accounts.profiles import ProfileBatch, normalize_profile
+
+
+class Command(BaseCommand):
+    help = (
+        "Look up every user with a known Auth0 subject through the Management "
+        "API, many users per request, and write changed names and emails the "
+        "way a login would. Meant to run periodically (cron, a scheduler) so "
+        "profiles stay current for users who do not log in."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=DEFAULT_IDS_PER_QUERY,
+            help="Users looked up per Management API search (at most 100).",
+        )
+        parser.add_argument("--limit", type=int, help="Stop after this many users.")
+        parser.add_argument("--username", action="append", dest="usernames")
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        try:
+            client = get_management_client()
+        except Auth0ConfigurationError as exc:
+            raise CommandError(str(exc))
+
+        identities = (
+            Auth0Identity.objects.exclude(subject="").select_related("user").order_by("pk")
+        )
+        if options["usernames"]:
+            identities = identities.filter(user__username__in=options["usernames"])
+
+        batch_size = max(1, min(options["batch_size"], 100))
+        limit = options["limit"]
+        self.dry_run = options["dry_run"]
+        self.counts = dict.fromkeys(("updated", "unchanged", "missing"), 0)
+        requests_before = client.requests
+        processed, last_pk = 0, 0
+        started = time.perf_counter()
+
+        while limit is None or processed < limit:
+            size = batch_size if limit is None else min(batch_size, limit - processed)
+            # Keyset pagination: each batch is an indexed range read.
+            batch = list(identities.filter(pk__gt=last_pk)[:size])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            processed += len(batch)
+            try:
+                profiles = client.users_by_id(
+                    [identity.subject for identity in batch], ids_per_query=batch_size
+                )
+            except (ManagementAPIError, Auth0AuthenticationError) as exc:
+                # Auth0AuthenticationError: Auth0 could not be reached at all.
+                raise CommandError(f"Management API error ({exc.status_code}): {exc.message}")
+            self._apply(batch, profiles)
+
+        elapsed = time.perf_counter() - started
+        counts = " ".join(f"{name}={value}" for name, value in self.counts.items())
+        prefix = "dry-run " if self.dry_run else ""
+        self.stdout.write(
+            f"{prefix}processed={processed} {counts} "
+            f"requests={client.requests - requests_before} elapsed={elapsed:.1f}s"
+        )
+
+    def _apply(self, identities, profiles):
+        changes = ProfileBatch()
+        for identity in identities:
+            record = profiles.get(identity.subject)
+            if record is None:
+                # Deleted in Auth0, or a subject from another tenant.
+                self.counts["missing"] += 1
+                continue
+            user = identity.user
+            # Reuse the identity already loaded instead of a query per user.
+            user.auth0_identity = identity
+            profile = normalize_profile(user.get_username(), record)
+            if changes.add(user, profile, identity.subject):
+                self.counts["updated"] += 1
+            else:
+                self.counts["unchanged"] += 1
+
+        if not self.dry_run:
+            with transaction.atomic():
+                changes.save()
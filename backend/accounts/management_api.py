@@ -0,0 +1,279 @@
+"""A small Auth0 Management API client for profile work outside a login.
+
+Reading a profile through ``/userinfo`` needs that user's own access token,
+so it can only happen while they log in. The Management API answers for
+any user with one machine-to-machine token: :class:`ManagementClient`
+obtains it with the client-credentials grant of the same application
+(``AUTH0_CLIENT_ID``/``AUTH0_CLIENT_SECRET``, which must be authorised for
+the Management API with the ``read:users`` scope), caches it until shortly
+before it expires and looks users up by the hundred with
+``q=user_id:(... OR ...)`` searches.
+
+The client has its own connection pool and no circuit breaker: background
+jobs hitting the Management API rate limits must not open the circuit that
+protects logins.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+from urllib.parse import urlencode
+
+from .auth0 import (
+    Auth0AuthenticationError,
+    Auth0Config,
+    Auth0ConfigurationError,
+    Auth0Error,
+    _get_json,
+    _post_form_urlencoded,
+    load_auth0_config,
+)
+from .metrics import upstream_call
+from .pool import PoolManager
+
+# Profile attributes requested from /api/v2/users; what normalize_profile reads.
+PROFILE_FIELDS = ("user_id", "email", "given_name", "family_name", "name", "nickname")
+
+# Auth0 caps per_page at 100; 50 ids per query keeps the URL short.
+MAX_PER_PAGE = 100
+DEFAULT_IDS_PER_QUERY = 50
+
+
+class ManagementAPIError(Auth0Error):
+    """Raised when the Management API or its token request fails."""
+
+    def __init__(self, message: str, status_code: int = 502) -> None:
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+class ManagementToken:
+    """A client-credentials token shared by the threads of one process.
+
+    The token is fetched again once ``refresh_margin`` seconds (at most half
+    its lifetime) remain before ``expires_in``, so a request never goes out
+    with a token about to expire. Concurrent callers wait for a single
+    fetch instead of each starting one.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[], Dict[str, Any]],
+        *,
+        refresh_margin: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self._fetch = fetch
+        self._refresh_margin = refresh_margin
+        self._clock = clock
+        self._token: Optional[str] = None
+        self._refresh_at = 0.0
+        self._lock = threading.Lock()
+        self.fetches = 0
+
+    def get(self) -> str:
+        token = self._token
+        if token is not None and self._clock() < self._refresh_at:
+            return token
+        with self._lock:
+            if self._token is not None and self._clock() < self._refresh_at:
+                return self._token
+            started = self._clock()
+            payload = self._fetch()
+            self.fetches += 1
+            access_token = payload.get("access_token")
+            if not isinstance(access_token, str) or not access_token:
+                raise ManagementAPIError("Auth0 no devolvió un token de la Management API.")
+            try:
+                lifetime = float(payload.get("expires_in") or 0)
+            except (TypeError, ValueError):
+                lifetime = 0.0
+            self._token = access_token
+            self._refresh_at = started + max(0.0, lifetime - min(self._refresh_margin, lifetime / 2))
+            return access_token
+
+    def invalidate(self, token: Optional[str] = None) -> None:
+        """Forget the cached token (only if it is still ``token``, when given)."""
+
+        with self._lock:
+            if token is None or self._token == token:
+                self._token = None
+                self._refresh_at = 0.0
+
+
+def _quote(value: str) -> str:
+    escaped = value.replace("\\", "\\\\").replace('"', '\\"')
+    return f'"{escaped}"'
+
+
+def user_id_query(user_ids: Iterable[str]) -> str:
+    """Build a Lucene query matching any of ``user_ids``."""
+
+    return "user_id:(" + " OR ".join(_quote(user_id) for user_id in user_ids) + ")"
+
+
+class ManagementClient:
+    """Read users through the Management API of one Auth0 tenant."""
+
+    def __init__(
+        self,
+        config: Auth0Config,
+        *,
+        pool: Optional[PoolManager] = None,
+        max_retries: int = 3,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        self.config = config
+        self.pool = pool or PoolManager(
+            maxsize=2,
+            idle_timeout=config.pool_idle_timeout,
+            dns_ttl=config.dns_ttl,
+            ssl_context=config.ssl_context(),
+        )
+        self.token = ManagementToken(self._fetch_token)
+        self.max_retries = max(0, max_retries)
+        self._sleep = sleep
+        self.requests = 0
+
+    def _fetch_token(self) -> Dict[str, Any]:
+        config = self.config
+        payload = {
+            "grant_type": "client_credentials",
+            "client_id": config.client_id,
+            "client_secret": config.client_secret,
+            "audience": config.management_url,
+        }
+        with upstream_call("management_token") as outcome:
+            status_code, token_payload = _post_form_urlencoded(
+                f"{config.base_url}/oauth/token", payload, config.timeout, pool=self.pool
+            )
+            outcome["status"] = status_code
+        if status_code != 200:
+            raise ManagementAPIError(
+                token_payload.get("error_description")
+                or "No se pudo obtener un token de la Management API.",
+                status_code=status_code,
+            )
+        return token_payload
+
+    def get(self, path: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """GET ``path`` under the API, renewing a rejected token and backing off on 429.
+
+        Network failures (``Auth0AuthenticationError`` with status 503) back
+        off like a 503 answer and are re-raised once the retries run out.
+        """
+
+        url = f"{self.config.management_url.rstrip('/')}/{path.lstrip('/')}?{urlencode(params)}"
+        retried_token = False
+        attempt = 0
+        while True:
+            try:
+                token = self.token.get()
+                headers = {"Authorization": f"Bearer {token}", "Accept": "application/json"}
+                with upstream_call("management_users") as outcome:
+                    status_code, body = _get_json(
+                        url, headers, self.config.timeout, pool=self.pool
+                    )
+                    outcome["status"] = status_code
+            except Auth0AuthenticationError:
+                if attempt >= self.max_retries:
+                    raise
+                self._sleep(min(2.0**attempt, 10.0))
+                attempt += 1
+                continue
+            self.requests += 1
+
+            if status_code == 200:
+                return body
+            if status_code == 401 and not retried_token:
+                # Revoked or rotated signing keys: one retry with a fresh token.
+                self.token.invalidate(token)
+                retried_token = True
+                continue
+            if (status_code == 429 or status_code >= 500) and attempt < self.max_retries:
+                self._sleep(min(2.0**attempt, 10.0))
+                attempt += 1
+                continue
+            message = body.get("message")
+            raise ManagementAPIError(
+                message or f"La Management API respondió {status_code}.", status_code=status_code
+            )
+
+    def search_users(
+        self,
+        user_ids: Sequence[str],
+        *,
+        ids_per_query: int = DEFAULT_IDS_PER_QUERY,
+        fields: Sequence[str] = PROFILE_FIELDS,
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield the users among ``user_ids`` that exist in the tenant.
+
+        The ids are searched ``ids_per_query`` at a time, each query paged
+        ``MAX_PER_PAGE`` users at a time, so ``n`` users cost about
+        ``n / ids_per_query`` requests.
+        """
+
+        ids_per_query = max(1, min(ids_per_query, MAX_PER_PAGE))
+        unique = list(dict.fromkeys(user_id for user_id in user_ids if user_id))
+        for start in range(0, len(unique), ids_per_query):
+            chunk = unique[start : start + ids_per_query]
+            yield from self._search(user_id_query(chunk), fields, len(chunk))
+
+    def _search(self, query: str, fields: Sequence[str], expected: int) -> Iterator[Dict[str, Any]]:
+        page = 0
+        seen = 0
+        while True:
+            body = self.get(
+                "users",
+                {
+                    "q": query,
+                    "search_engine": "v3",
+                    "fields": ",".join(fields),
+                    "include_fields": "true",
+                    "include_totals": "true",
+                    "per_page": MAX_PER_PAGE,
+                    "page": page,
+                },
+            )
+            # include_totals wraps the user list in an object, the only
+            # response shape _get_json keeps.
+            users: List[Dict[str, Any]] = [
+                user for user in body.get("users") or [] if isinstance(user, dict)
+            ]
+            yield from users
+            seen += len(users)
+            total = body.get("total")
+            if len(users) < MAX_PER_PAGE or seen >= (total if isinstance(total, int) else expected):
+                return
+            page += 1
+
+    def users_by_id(self, user_ids: Sequence[str], **kwargs: Any) -> Dict[str, Dict[str, Any]]:
+        return {user["user_id"]: user for user in self.search_users(user_ids, **kwargs)}
+
+    def close(self) -> None:
+        self.pool.close()
+
+
+_client: Optional[ManagementClient] = None
+_client_lock = threading.Lock()
+
+
+def get_management_client(config: Optional[Auth0Config] = None) -> ManagementClient:
+    """Return the process-wide client (and its token), rebuilt if the config changed."""
+
+    global _client
+
+    if config is None:
+        config = load_auth0_config()
+        if config is None:
+            raise Auth0ConfigurationError("Auth0 is not configured.")
+
+    with _client_lock:
+        if _client is None or _client.config != config:
+            if _client is not None:
+                _client.close()
+            _client = ManagementClient(config)
+        return _client
@@ -0,0 +1,523 @@
+"""Login instrumentation: per-phase timings and Prometheus metrics.
+
+:func:`timed` measures one phase of a request. The duration goes to the
+``login_phase_seconds`` histogram and, while :class:`ServerTimingMiddleware`
+is handling a request, to that request's ``Server-Timing`` header.
+
+Metrics live in process memory. With ``ACCOUNTS_METRICS_DIR`` set, every
+process periodically writes a snapshot there and ``/api/metrics/`` merges
+all of them: counters and histograms are summed over every snapshot (so
+they never go backwards when a worker is recycled), gauges only over the
+processes that are still alive.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+
+logger = logging.getLogger(__name__)
+
+COUNTER = "counter"
+GAUGE = "gauge"
+HISTOGRAM = "histogram"
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelKey = Tuple[str, ...]
+
+
+class Metric:
+    """A metric family: one value (or histogram) per combination of labels."""
+
+    kind = GAUGE
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelKey, Any] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> LabelKey:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def set(self, value: float, **labels: Any) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: Any) -> Any:
+        with self._lock:
+            return self._values.get(self._key(labels), 0)
+
+    def samples(self) -> Dict[LabelKey, Any]:
+        with self._lock:
+            return dict(self._values)
+
+
+class Counter(Metric):
+    kind = COUNTER
+
+
+class Gauge(Metric):
+    kind = GAUGE
+
+    def dec(self, amount: float = 1, **labels: Any) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    kind = HISTOGRAM
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> None:
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (non-cumulative) counts, then sum and count.
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            counts = state[0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[-1] += 1
+            state[1] += value
+            state[2] += 1
+
+    def samples(self) -> Dict[LabelKey, Any]:
+        with self._lock:
+            return {key: [list(state[0]), state[1], state[2]] for key, state in self._values.items()}
+
+
+class Registry:
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+        self._collectors: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric: Metric) -> Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help, labelnames))  # type: ignore[return-value]
+
+    def gauge(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge(name, help, labelnames))  # type: ignore[return-value]
+
+    def histogram(
+        self, name: str, help: str, labelnames: Sequence[str] = (), buckets=DEFAULT_BUCKETS
+    ) -> Histogram:
+        return self._register(Histogram(name, help, labelnames, buckets))  # type: ignore[return-value]
+
+    def add_collector(self, collector: Callable[[], None]) -> None:
+        """Register a callback that refreshes metrics right before a snapshot."""
+
+        self._collectors.append(collector)
+
+    def snapshot(self) -> Dict[str, Any]:
+        for collector in self._collectors:
+            try:
+                collector()
+            except Exception:
+                logger.exception("Metrics collector %r failed.", collector)
+
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return {
+            "pid": os.getpid(),
+            "metrics": {
+                metric.name: {
+                    "kind": metric.kind,
+                    "help": metric.help,
+                    "labelnames": list(metric.labelnames),
+                    "buckets": list(getattr(metric, "buckets", ())),
+                    "samples": [[list(key), value] for key, value in metric.samples().items()],
+                }
+                for metric in metrics
+            },
+        }
+
+
+REGISTRY = Registry()
+
+PHASE_SECONDS = REGISTRY.histogram(
+    "login_phase_seconds", "Time spent in each phase of a login.", ["phase"]
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    "http_request_duration_seconds", "Request latency by view.", ["view", "status"]
+)
+REQUESTS_IN_FLIGHT = REGISTRY.gauge("http_requests_in_flight", "Requests being handled.")
+AUTH0_RESPONSES = REGISTRY.counter(
+    "auth0_responses_total",
+    "Responses from Auth0 by endpoint and status code ('error' for network failures).",
+    ["endpoint", "status"],
+)
+AUTH0_IN_FLIGHT = REGISTRY.gauge(
+    "auth0_requests_in_flight", "Requests to Auth0 awaiting a response.", ["endpoint"]
+)
+LOGINS_THROTTLED = REGISTRY.counter(
+    "accounts_logins_throttled_total",
+    "Login attempts rejected before authentication, by limit.",
+    ["limit"],
+)
+
+# --------------------------------------------------------------------------
+# Phase timing
+
+
+_timings: ContextVar[Optional[List[Tuple[str, float]]]] = ContextVar(
+    "accounts_timings", default=None
+)
+
+
+@contextmanager
+def timed(phase: str) -> Iterator[None]:
+    """Time a block as ``phase`` (works around ``await`` as well)."""
+
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        PHASE_SECONDS.observe(elapsed, phase=phase)
+        timings = _timings.get()
+        if timings is not None:
+            timings.append((phase, elapsed))
+
+
+@contextmanager
+def upstream_call(endpoint: str) -> Iterator[Dict[str, Any]]:
+    """Track one Auth0 request; set ``outcome["status"]`` inside the block."""
+
+    outcome: Dict[str, Any] = {"status": "error"}
+    AUTH0_IN_FLIGHT.inc(endpoint=endpoint)
+    try:
+        with timed(endpoint):
+            yield outcome
+    finally:
+        AUTH0_IN_FLIGHT.dec(endpoint=endpoint)
+        AUTH0_RESPONSES.inc(endpoint=endpoint, status=outcome["status"])
+
+
+def server_timing(timings: List[Tuple[str, float]], total: float) -> str:
+    merged: Dict[str, float] = {}
+    for phase, seconds in timings:
+        merged[phase] = merged.get(phase, 0.0) + seconds
+    merged["total"] = total
+    return ", ".join(f"{phase};dur={seconds * 1000:.1f}" for phase, seconds in merged.items())
+
+
+class ServerTimingMiddleware:
+    """Add a ``Server-Timing`` header and record request metrics.
+
+    Put it first in ``MIDDLEWARE`` so the total covers the other middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response) -> None:
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _start(self):
+        ensure_snapshot_writer()
+        REQUESTS_IN_FLIGHT.inc()
+        return _timings.set([]), time.perf_counter()
+
+    def _finish(self, request, response, token, started):
+        total = time.perf_counter() - started
+        timings = _timings.get() or []
+        _timings.reset(token)
+        REQUESTS_IN_FLIGHT.dec()
+
+        match = getattr(request, "resolver_match", None)
+        view = match.view_name if match is not None else "unmatched"
+        REQUEST_SECONDS.observe(total, view=view, status=response.status_code)
+        response["Server-Timing"] = server_timing(timings, total)
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        token, started = self._start()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            _timings.reset(token)
+            REQUESTS_IN_FLIGHT.dec()
+            raise
+        return self._finish(request, response, token, started)
+
+    async def __acall__(self, request):
+        token, started = self._start()
+        try:
+            response = await self.get_response(request)
+        except BaseException:
+            _timings.reset(token)
+            REQUESTS_IN_FLIGHT.dec()
+            raise
+        return self._finish(request, response, token, started)
+
+
+class TimedSessionMiddleware(SessionMiddleware):
+    """``SessionMiddleware`` that reports the session save as a phase."""
+
+    def process_response(self, request, response):
+        with timed("session_save"):
+            return super().process_response(request, response)
+
+
+# --------------------------------------------------------------------------
+# Collectors for state kept by other modules
+
+
+def _collect_auth0() -> None:
+    from . import auth0
+
+    pool_events = REGISTRY.counter(
+        "auth0_pool_connections_total", "Auth0 connection pool events.", ["event"]
+    )
+    for event, value in auth0.pool_stats().items():
+        pool_events.set(value, event=event)
+
+    flights = auth0.login_flight_stats()
+    coalesced = REGISTRY.counter(
+        "auth0_login_flight_total", "Auth0 logins started and coalesced.", ["kind"]
+    )
+    coalesced.set(flights["calls"], kind="calls")
+    coalesced.set(flights["coalesced"], kind="coalesced")
+    REGISTRY.gauge(
+        "auth0_login_flight_in_flight", "Auth0 password grants in progress."
+    ).set(flights["in_flight"])
+
+    state = REGISTRY.gauge(
+        "auth0_circuit_state", "1 for the current state of the Auth0 circuit breaker.", ["state"]
+    )
+    guards = auth0.guard_stats()
+    for name in ("closed", "open", "half_open"):
+        state.set(int(any(stats["state"] == name for stats in guards)), state=name)
+    for name in ("opened", "rejected", "hedged"):
+        REGISTRY.counter(
+            f"auth0_circuit_{name}_total", f"Auth0 circuit breaker: calls {name}."
+        ).set(sum(stats[name] for stats in guards))
+
+
+def _collect_accounts() -> None:
+    from .hashing import _pool
+    from .ratelimit import _concurrency
+    from .writebehind import _queue
+
+    if _queue is not None:
+        REGISTRY.gauge(
+            "accounts_write_behind_queued", "Records waiting in the write-behind queue."
+        ).set(len(_queue))
+        REGISTRY.counter(
+            "accounts_write_behind_flushed_total", "Records written by the write-behind queue."
+        ).set(_queue.flushed)
+        REGISTRY.counter(
+            "accounts_write_behind_dropped_total",
+            "Records dropped because the write-behind queue was full on an event loop.",
+        ).set(_queue.dropped)
+    if _pool is not None:
+        stats = _pool.stats()
+        REGISTRY.gauge(
+            "accounts_password_checks_pending", "Password checks queued or running."
+        ).set(stats["pending"])
+        REGISTRY.counter(
+            "accounts_password_checks_rejected_total", "Password checks shed under load."
+        ).set(stats["rejected"])
+    if _concurrency is not None:
+        REGISTRY.gauge("accounts_logins_in_flight", "Logins being authenticated.").set(
+            _concurrency.stats()["in_flight"]
+        )
+
+
+REGISTRY.add_collector(_collect_auth0)
+REGISTRY.add_collector(_collect_accounts)
+
+# --------------------------------------------------------------------------
+# Multi-process snapshots
+
+_writer_pid: Optional[int] = None
+_writer_lock = threading.Lock()
+_snapshot_name = ""
+
+
+def _metrics_dir() -> Optional[Path]:
+    directory = getattr(settings, "ACCOUNTS_METRICS_DIR", "")
+    return Path(directory) if directory else None
+
+
+def write_snapshot(directory: Optional[Path] = None) -> None:
+    """Write this process's metrics to ``ACCOUNTS_METRICS_DIR``."""
+
+    directory = directory or _metrics_dir()
+    if directory is None:
+        return
+    global _snapshot_name
+    if not _snapshot_name or not _snapshot_name.startswith(f"{os.getpid()}-"):
+        # The start time keeps a recycled PID from overwriting a dead
+        # worker's counters.
+        _snapshot_name = f"{os.getpid()}-{time.time_ns()}.json"
+
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / _snapshot_name
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(REGISTRY.snapshot()))
+    os.replace(tmp, path)
+
+
+def _write_snapshots_forever(interval: float) -> None:
+    while True:
+        time.sleep(interval)
+        try:
+            write_snapshot()
+        except OSError:
+            logger.exception("Could not write the metrics snapshot.")
+
+
+def ensure_snapshot_writer() -> None:
+    """Start the snapshot thread once per process (again after a fork)."""
+
+    global _writer_pid
+    pid = os.getpid()
+    if _writer_pid == pid or _metrics_dir() is None:
+        return
+    with _writer_lock:
+        if _writer_pid == pid:
+            return
+        _writer_pid = pid
+        interval = getattr(settings, "ACCOUNTS_METRICS_FLUSH_INTERVAL", 5.0)
+        threading.Thread(
+            target=_write_snapshots_forever, args=(interval,), name="metrics", daemon=True
+        ).start()
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _load_snapshots(directory: Path) -> List[Dict[str, Any]]:
+    snapshots = []
+    for path in directory.glob("*.json"):
+        try:
+            snapshots.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+    return snapshots
+
+
+def merge_snapshots(snapshots: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    merged: Dict[str, Dict[str, Any]] = {}
+    for snapshot in snapshots:
+        alive = snapshot["pid"] == os.getpid() or _pid_alive(snapshot["pid"])
+        for name, metric in snapshot["metrics"].items():
+            if metric["kind"] == GAUGE and not alive:
+                continue
+            target = merged.setdefault(name, {**metric, "samples": {}})
+            samples = target["samples"]
+            for key, value in metric["samples"]:
+                key = tuple(key)
+                if metric["kind"] == HISTOGRAM:
+                    current = samples.setdefault(key, [[0] * len(value[0]), 0.0, 0])
+                    current[0] = [a + b for a, b in zip(current[0], value[0])]
+                    current[1] += value[1]
+                    current[2] += value[2]
+                else:
+                    samples[key] = samples.get(key, 0) + value
+    return merged
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render(merged: Dict[str, Dict[str, Any]]) -> str:
+    """Render merged metrics in the Prometheus text exposition format."""
+
+    lines = []
+    for name in sorted(merged):
+        metric = merged[name]
+        names = metric["labelnames"]
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        for key, value in sorted(metric["samples"].items()):
+            if metric["kind"] != HISTOGRAM:
+                lines.append(f"{name}{_labels(names, key)} {_number(value)}")
+                continue
+            counts, total, count = value
+            cumulative = 0
+            for bound, bucket_count in zip([*metric["buckets"], math.inf], counts):
+                cumulative += bucket_count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{name}_bucket{_labels(names, key, le)} {cumulative}")
+            lines.append(f"{name}_sum{_labels(names, key)} {_number(total)}")
+            lines.append(f"{name}_count{_labels(names, key)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def render_metrics() -> str:
+    """Return this process's metrics, merged with the other workers' if enabled."""
+
+    directory = _metrics_dir()
+    if directory is None:
+        return render(merge_snapshots([REGISTRY.snapshot()]))
+
+    write_snapshot(directory)
+    return render(merge_snapshots(_load_snapshots(directory)))
@@ -0,0 +1,146 @@
+"""Stateless authentication of API requests with Auth0 access tokens."""
+
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.http import JsonResponse
+
+from .auth0 import (
+    Auth0Error,
+    get_async_auth0_client,
+    get_auth0_client,
+    load_auth0_config,
+)
+from .tokens import TokenVerificationError, VerifiedTokenCache
+
+
+class TokenUser:
+    """A user built from verified token claims, never backed by the database.
+
+    It quacks enough like ``django.contrib.auth`` users for views that only
+    check ``is_authenticated`` and read the identity fields.
+    """
+
+    pk = None
+    id = None
+    is_active = True
+    is_staff = False
+    is_superuser = False
+    is_anonymous = False
+    is_authenticated = True
+
+    def __init__(self, claims: Dict[str, Any]) -> None:
+        self.claims = claims
+        self.subject = str(claims.get("sub", ""))
+        self.username = str(claims.get("username") or claims.get("nickname") or self.subject)
+        self.first_name = str(claims.get("given_name") or "")
+        self.last_name = str(claims.get("family_name") or "")
+        self.email = str(claims.get("email") or "")
+
+    def __str__(self) -> str:
+        return self.username
+
+    def get_username(self) -> str:
+        return self.username
+
+    @property
+    def scopes(self) -> frozenset[str]:
+        return frozenset(str(self.claims.get("scope") or "").split())
+
+    def has_perm(self, perm: str, obj: Any = None) -> bool:
+        return False
+
+    def has_perms(self, perm_list: Any, obj: Any = None) -> bool:
+        return False
+
+    def has_module_perms(self, app_label: str) -> bool:
+        return False
+
+
+def _bearer_token(request) -> Optional[str]:
+    header = request.META.get("HTTP_AUTHORIZATION", "")
+    scheme, _, token = header.partition(" ")
+    if scheme.lower() != "bearer":
+        return None
+    return token.strip() or None
+
+
+def _unauthorized() -> JsonResponse:
+    response = JsonResponse({"error": "Invalid token."}, status=401)
+    response["WWW-Authenticate"] = 'Bearer error="invalid_token"'
+    return response
+
+
+class BearerTokenMiddleware:
+    """Authenticate ``Authorization: Bearer`` requests without touching the DB.
+
+    Access tokens are verified locally against the tenant JWKS and the result
+    is remembered in a :class:`VerifiedTokenCache`, so repeated requests with
+    the same token cost a hash and a dict lookup. Must come after
+    ``AuthenticationMiddleware``, whose lazy ``request.user`` it replaces
+    before anything evaluates it.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response) -> None:
+        self.get_response = get_response
+        self.verified = VerifiedTokenCache(
+            maxsize=getattr(settings, "ACCOUNTS_VERIFIED_TOKEN_CACHE_SIZE", 10000)
+        )
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def _authenticate(self, request, claims: Dict[str, Any]) -> None:
+        user = TokenUser(claims)
+
+        async def auser():
+            return user
+
+        request.user = user
+        request.auser = auser
+        request.auth = claims
+        # Bearer credentials are not sent automatically by browsers.
+        request._dont_enforce_csrf_checks = True
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        token = _bearer_token(request)
+        config = load_auth0_config() if token else None
+        if token is None or config is None or not config.audience:
+            return self.get_response(request)
+
+        claims = self.verified.get(token)
+        if claims is None:
+            try:
+                claims = get_auth0_client(config).verify_token(token, config.audience)
+            except (TokenVerificationError, Auth0Error):
+                return _unauthorized()
+            self.verified.put(token, claims)
+
+        self._authenticate(request, claims)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        token = _bearer_token(request)
+        config = load_auth0_config() if token else None
+        if token is None or config is None or not config.audience:
+            return await self.get_response(request)
+
+        claims = self.verified.get(token)
+        if claims is None:
+            try:
+                client = get_async_auth0_client(config)
+                claims = await client.verify_token(token, config.audience)
+            except (TokenVerificationError, Auth0Error):
+                return _unauthorized()
+            self.verified.put(token, claims)
+
+        self._authenticate(request, claims)
+        return await self.get_response(request)
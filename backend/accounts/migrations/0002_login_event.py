@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 15:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoginEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('username', models.CharField(max_length=150)),
+                ('source', models.CharField(choices=[('auth0', 'Auth0'), ('local', 'Local')], max_length=16)),
+                ('outcome', models.CharField(choices=[('success', 'Success'), ('failure', 'Failure')], max_length=16)),
+                ('status_code', models.PositiveSmallIntegerField()),
+                ('latency_ms', models.FloatField()),
+                ('created_at', models.DateTimeField(db_index=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['username', 'created_at'], name='accounts_lo_usernam_a1b6e1_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_login_event'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auth0identity',
+            name='subject',
+            field=models.CharField(blank=True, db_index=True, max_length=255),
+        ),
+    ]
@@ -1,3 +1,47 @@
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+
+class Auth0Identity(models.Model):
+    """Auth0-side state kept next to a Django user."""
+
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="auth0_identity",
+    )
+    # Digest of the normalized Auth0 profile last written to the user row.
+    profile_fingerprint = models.CharField(max_length=32, blank=True)
+    # Auth0 ``user_id`` (the ``sub`` claim); the key for Management API lookups.
+    subject = models.CharField(max_length=255, blank=True, db_index=True)
+
+    def __str__(self) -> str:
+        return f"Auth0 identity for {self.user}"
+
+
+class LoginEvent(models.Model):
+    """Audit record of a login attempt, written in batches by the write-behind queue."""
+
+    SOURCE_AUTH0 = "auth0"
+    SOURCE_LOCAL = "local"
+    SOURCE_CHOICES = [(SOURCE_AUTH0, "Auth0"), (SOURCE_LOCAL, "Local")]
+
+    OUTCOME_SUCCESS = "success"
+    OUTCOME_FAILURE = "failure"
+    OUTCOME_CHOICES = [(OUTCOME_SUCCESS, "Success"), (OUTCOME_FAILURE, "Failure")]
+
+    # Plain ids rather than a foreign key: audit rows must outlive the user
+    # and must not make a batch insert fail.
+    user_id = models.PositiveBigIntegerField(null=True, blank=True)
+    username = models.CharField(max_length=150)
+    source = models.CharField(max_length=16, choices=SOURCE_CHOICES)
+    outcome = models.CharField(max_length=16, choices=OUTCOME_CHOICES)
+    status_code = models.PositiveSmallIntegerField()
+    latency_ms = models.FloatField()
+    created_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["username", "created_at"])]
+
+    def __str__(self) -> str:
+        return f"{self.username} {self.source} {self.outcome}"
@@ -0,0 +1,649 @@
+"""Keep-alive HTTPS connection pooling.
+
+The synchronous pool is built on ``http.client``; the asynchronous one speaks
+just enough HTTP/1.1 over ``asyncio`` streams to talk to Auth0.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import http.client
+import os
+import socket
+import ssl
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+# Errors raised when a kept-alive connection was closed by the server while it
+# sat idle in the pool. Idempotent requests that hit them on a reused
+# connection are retried once on a fresh one; anything else (a POST refresh
+# grant, say) may already have been processed upstream and is only replayed
+# when the caller passes ``retry_non_idempotent=True``.
+_STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    http.client.BadStatusLine,
+    BrokenPipeError,
+    ConnectionResetError,
+    ConnectionAbortedError,
+)
+
+_IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE", "TRACE"})
+
+
+def _may_retry(method: str, retry_non_idempotent: bool) -> bool:
+    return retry_non_idempotent or method.upper() in _IDEMPOTENT_METHODS
+
+_AddrInfo = Tuple[int, int, int, str, tuple]
+
+
+class DNSCache:
+    """Cache ``getaddrinfo`` results for a bounded amount of time."""
+
+    def __init__(self, ttl: float = 300.0) -> None:
+        self.ttl = ttl
+        self._entries: Dict[Tuple[str, int], Tuple[float, List[_AddrInfo]]] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, host: str, port: int) -> List[_AddrInfo]:
+        key = (host, port)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+
+        addresses = socket.getaddrinfo(host, port, 0, socket.SOCK_STREAM)
+
+        with self._lock:
+            self._entries[key] = (now + self.ttl, addresses)
+        return addresses
+
+    async def aresolve(self, host: str, port: int) -> List[_AddrInfo]:
+        key = (host, port)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                return entry[1]
+
+        loop = asyncio.get_running_loop()
+        addresses = await loop.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+
+        with self._lock:
+            self._entries[key] = (now + self.ttl, addresses)
+        return addresses
+
+    def invalidate(self, host: str, port: int) -> None:
+        with self._lock:
+            self._entries.pop((host, port), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+@dataclass
+class PoolStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    discarded: int = 0
+    retries: int = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "discarded": self.discarded,
+            "retries": self.retries,
+        }
+
+
+class ConnectionPool:
+    """A bounded pool of persistent connections to a single origin.
+
+    At most ``maxsize`` connections are open at any time; callers beyond that
+    wait for a connection to be released. Idle connections older than
+    ``idle_timeout`` seconds are closed instead of being reused.
+    """
+
+    def __init__(
+        self,
+        scheme: str,
+        host: str,
+        port: int,
+        *,
+        maxsize: int = 10,
+        idle_timeout: float = 60.0,
+        dns_cache: Optional[DNSCache] = None,
+        ssl_context: Optional[ssl.SSLContext] = None,
+    ) -> None:
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.maxsize = max(1, maxsize)
+        self.idle_timeout = idle_timeout
+        self.dns_cache = dns_cache or DNSCache()
+        self.ssl_context = ssl_context
+        self.stats = PoolStats()
+
+        self._idle: Deque[Tuple[http.client.HTTPConnection, float]] = deque()
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.maxsize)
+        self._closed = False
+        self._pid = os.getpid()
+
+    def _forget_inherited(self) -> None:
+        # Called with the lock held. Connections opened before a fork (by a
+        # preloading master) share their socket with the parent: drop them
+        # without closing, the parent still owns them.
+        if self._pid != os.getpid():
+            self._idle.clear()
+            self._pid = os.getpid()
+
+    def _create_socket(
+        self,
+        address: Tuple[str, int],
+        timeout: Optional[float] = None,
+        source_address: Optional[tuple] = None,
+    ) -> socket.socket:
+        host, port = address
+        last_error: Optional[OSError] = None
+
+        for family, socktype, proto, _, sockaddr in self.dns_cache.resolve(host, port):
+            sock = socket.socket(family, socktype, proto)
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                if timeout is not None:
+                    sock.settimeout(timeout)
+                if source_address:
+                    sock.bind(source_address)
+                sock.connect(sockaddr)
+                return sock
+            except OSError as exc:
+                last_error = exc
+                sock.close()
+
+        # Every cached address failed: forget them so the next attempt
+        # resolves the name again.
+        self.dns_cache.invalidate(host, port)
+        raise last_error or OSError(f"Could not resolve {host}:{port}")
+
+    def _new_connection(self, timeout: float) -> http.client.HTTPConnection:
+        connection: http.client.HTTPConnection
+        if self.scheme == "https":
+            connection = http.client.HTTPSConnection(
+                self.host,
+                self.port,
+                timeout=timeout,
+                context=self.ssl_context or ssl.create_default_context(),
+            )
+        else:
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+        connection._create_connection = self._create_socket  # type: ignore[attr-defined]
+        return connection
+
+    def _acquire(self, timeout: float) -> Tuple[http.client.HTTPConnection, bool]:
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"No free connection to {self.host} within {timeout}s")
+
+        now = time.monotonic()
+        stale: List[http.client.HTTPConnection] = []
+        connection: Optional[http.client.HTTPConnection] = None
+
+        with self._lock:
+            self._forget_inherited()
+            while self._idle:
+                candidate, released_at = self._idle.pop()
+                if now - released_at > self.idle_timeout:
+                    stale.append(candidate)
+                    self.stats.evictions += 1
+                    continue
+                connection = candidate
+                self.stats.hits += 1
+                break
+            else:
+                self.stats.misses += 1
+            # Anything left at the bottom of the stack is older than what we
+            # just popped, so it can be evicted in the same pass.
+            while self._idle and now - self._idle[0][1] > self.idle_timeout:
+                stale.append(self._idle.popleft()[0])
+                self.stats.evictions += 1
+
+        for candidate in stale:
+            candidate.close()
+
+        if connection is None:
+            return self._new_connection(timeout), False
+
+        if connection.sock is not None:
+            connection.sock.settimeout(timeout)
+        connection.timeout = timeout
+        return connection, True
+
+    def _release(self, connection: http.client.HTTPConnection, reusable: bool) -> None:
+        try:
+            if reusable and not self._closed and connection.sock is not None:
+                with self._lock:
+                    self._idle.append((connection, time.monotonic()))
+                return
+            with self._lock:
+                self.stats.discarded += 1
+            connection.close()
+        finally:
+            self._slots.release()
+
+    def prewarm(self, count: int = 1, timeout: float = 10.0) -> int:
+        """Open up to ``count`` idle connections (TCP and TLS) ahead of use."""
+
+        with self._lock:
+            self._forget_inherited()
+            missing = min(count, self.maxsize) - len(self._idle)
+        opened = 0
+        for _ in range(max(0, missing)):
+            connection = self._new_connection(timeout)
+            connection.connect()
+            with self._lock:
+                self._idle.append((connection, time.monotonic()))
+            opened += 1
+        return opened
+
+    def urlopen(
+        self,
+        method: str,
+        path: str,
+        *,
+        body: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: float = 10.0,
+        retry_non_idempotent: bool = False,
+    ) -> Tuple[int, bytes]:
+        """Send a request and return ``(status, body)`` once fully read.
+
+        A request that fails on a stale kept-alive connection is retried once
+        on a fresh one only when ``method`` is idempotent or the caller opts in
+        with ``retry_non_idempotent``.
+        """
+
+        headers = dict(headers or {})
+        headers.setdefault("Connection", "keep-alive")
+
+        for attempt in range(2):
+            connection, reused = self._acquire(timeout)
+            reusable = False
+            try:
+                connection.request(method, path, body=body, headers=headers)
+                response = connection.getresponse()
+                raw_body = response.read()
+                reusable = not response.will_close
+                return response.status, raw_body
+            except _STALE_CONNECTION_ERRORS:
+                if not reused or attempt:
+                    raise
+                if not _may_retry(method, retry_non_idempotent):
+                    raise
+                with self._lock:
+                    self.stats.retries += 1
+            finally:
+                self._release(connection, reusable)
+
+        raise AssertionError("unreachable")  # pragma: no cover
+
+    def clear(self) -> None:
+        with self._lock:
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+        for connection in idle:
+            connection.close()
+
+    def close(self) -> None:
+        self._closed = True
+        self.clear()
+
+    @property
+    def idle_count(self) -> int:
+        with self._lock:
+            return len(self._idle)
+
+
+class _PoolManagerBase:
+    """Hand out one pool per origin."""
+
+    pool_class: type
+
+    def __init__(
+        self,
+        *,
+        maxsize: int = 10,
+        idle_timeout: float = 60.0,
+        dns_ttl: float = 300.0,
+        ssl_context: Optional[ssl.SSLContext] = None,
+    ) -> None:
+        self.maxsize = maxsize
+        self.idle_timeout = idle_timeout
+        self.dns_cache = DNSCache(ttl=dns_ttl)
+        self.ssl_context = ssl_context
+        self._pools: Dict[Tuple[str, str, int], object] = {}
+        self._lock = threading.Lock()
+
+    def pool_for(self, scheme: str, host: str, port: Optional[int] = None):
+        port = port or (443 if scheme == "https" else 80)
+        key = (scheme, host, port)
+
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                pool = self.pool_class(
+                    scheme,
+                    host,
+                    port,
+                    maxsize=self.maxsize,
+                    idle_timeout=self.idle_timeout,
+                    dns_cache=self.dns_cache,
+                    ssl_context=self.ssl_context,
+                )
+                self._pools[key] = pool
+            return pool
+
+    def _route(self, url: str):
+        parts = urlsplit(url)
+        pool = self.pool_for(parts.scheme, parts.hostname or "", parts.port)
+        path = parts.path or "/"
+        if parts.query:
+            path = f"{path}?{parts.query}"
+        return pool, path
+
+    def _all_pools(self) -> list:
+        with self._lock:
+            return list(self._pools.values())
+
+    def stats(self) -> Dict[str, int]:
+        totals = PoolStats()
+        for pool in self._all_pools():
+            totals.hits += pool.stats.hits
+            totals.misses += pool.stats.misses
+            totals.evictions += pool.stats.evictions
+            totals.discarded += pool.stats.discarded
+            totals.retries += pool.stats.retries
+        return totals.as_dict()
+
+
+class PoolManager(_PoolManagerBase):
+    """Hand out one :class:`ConnectionPool` per origin."""
+
+    pool_class = ConnectionPool
+
+    def urlopen(
+        self,
+        method: str,
+        url: str,
+        *,
+        body: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: float = 10.0,
+        retry_non_idempotent: bool = False,
+    ) -> Tuple[int, bytes]:
+        pool, path = self._route(url)
+        return pool.urlopen(
+            method,
+            path,
+            body=body,
+            headers=headers,
+            timeout=timeout,
+            retry_non_idempotent=retry_non_idempotent,
+        )
+
+    def prewarm(self, url: str, count: int = 1, timeout: float = 10.0) -> int:
+        pool, _ = self._route(url)
+        return pool.prewarm(count, timeout)
+
+    def clear(self) -> None:
+        for pool in self._all_pools():
+            pool.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+        for pool in pools:
+            pool.close()
+
+
+_StreamPair = Tuple[asyncio.StreamReader, asyncio.StreamWriter]
+
+
+async def _read_chunked(reader: asyncio.StreamReader) -> bytes:
+    chunks = []
+    while True:
+        size_line = await reader.readline()
+        if not size_line:
+            raise asyncio.IncompleteReadError(b"", None)
+        size = int(size_line.split(b";", 1)[0].strip(), 16)
+        if size == 0:
+            # Skip optional trailers up to the terminating blank line.
+            while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                pass
+            return b"".join(chunks)
+        chunks.append(await reader.readexactly(size))
+        await reader.readexactly(2)
+
+
+async def _read_response(reader: asyncio.StreamReader) -> Tuple[int, bytes, bool]:
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionResetError("Connection closed before a response was received")
+
+    version, status_raw, *_ = status_line.decode("latin-1").split(None, 2)
+    status = int(status_raw)
+
+    headers: Dict[str, str] = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    connection_header = headers.get("connection", "").lower()
+    if version == "HTTP/1.1":
+        keep_alive = connection_header != "close"
+    else:
+        keep_alive = connection_header == "keep-alive"
+
+    if status in (204, 304) or 100 <= status < 200:
+        body = b""
+    elif "chunked" in headers.get("transfer-encoding", "").lower():
+        body = await _read_chunked(reader)
+    elif "content-length" in headers:
+        body = await reader.readexactly(int(headers["content-length"]))
+    else:
+        body = await reader.read()
+        keep_alive = False
+
+    return status, body, keep_alive
+
+
+class AsyncConnectionPool:
+    """The asyncio counterpart of :class:`ConnectionPool`.
+
+    Streams are bound to the event loop that opened them, so an instance must
+    only be used from a single loop.
+    """
+
+    def __init__(
+        self,
+        scheme: str,
+        host: str,
+        port: int,
+        *,
+        maxsize: int = 10,
+        idle_timeout: float = 60.0,
+        dns_cache: Optional[DNSCache] = None,
+        ssl_context: Optional[ssl.SSLContext] = None,
+    ) -> None:
+        self.scheme = scheme
+        self.host = host
+        self.port = port
+        self.maxsize = max(1, maxsize)
+        self.idle_timeout = idle_timeout
+        self.dns_cache = dns_cache or DNSCache()
+        self.ssl_context = ssl_context
+        self.stats = PoolStats()
+
+        self._idle: Deque[Tuple[_StreamPair, float]] = deque()
+        self._slots = asyncio.Semaphore(self.maxsize)
+        self._closed = False
+
+    async def _open(self) -> _StreamPair:
+        context = None
+        if self.scheme == "https":
+            context = self.ssl_context or ssl.create_default_context()
+
+        last_error: Optional[OSError] = None
+        for family, _, _, _, sockaddr in await self.dns_cache.aresolve(self.host, self.port):
+            try:
+                return await asyncio.open_connection(
+                    sockaddr[0],
+                    sockaddr[1],
+                    family=family,
+                    ssl=context,
+                    server_hostname=self.host if context else None,
+                )
+            except OSError as exc:
+                last_error = exc
+
+        self.dns_cache.invalidate(self.host, self.port)
+        raise last_error or OSError(f"Could not resolve {self.host}:{self.port}")
+
+    def _take_idle(self) -> Optional[_StreamPair]:
+        now = time.monotonic()
+        while self._idle:
+            streams, released_at = self._idle.pop()
+            if now - released_at > self.idle_timeout or streams[0].at_eof():
+                streams[1].close()
+                self.stats.evictions += 1
+                continue
+            self.stats.hits += 1
+            return streams
+        self.stats.misses += 1
+        return None
+
+    async def _exchange(self, streams: _StreamPair, request: bytes) -> Tuple[int, bytes, bool]:
+        reader, writer = streams
+        writer.write(request)
+        await writer.drain()
+        return await _read_response(reader)
+
+    def _build_request(
+        self, method: str, path: str, body: Optional[bytes], headers: Dict[str, str]
+    ) -> bytes:
+        default_port = 443 if self.scheme == "https" else 80
+        host_header = self.host if self.port == default_port else f"{self.host}:{self.port}"
+        lines = [f"{method} {path} HTTP/1.1", f"Host: {host_header}"]
+        lines.extend(f"{name}: {value}" for name, value in headers.items())
+        if body is not None or method in ("POST", "PUT", "PATCH"):
+            lines.append(f"Content-Length: {len(body or b'')}")
+        head = ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+        return head + (body or b"")
+
+    async def urlopen(
+        self,
+        method: str,
+        path: str,
+        *,
+        body: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: float = 10.0,
+        retry_non_idempotent: bool = False,
+    ) -> Tuple[int, bytes]:
+        """Send a request and return ``(status, body)`` once fully read.
+
+        A request that fails on a stale kept-alive connection is retried once
+        on a fresh one only when ``method`` is idempotent or the caller opts in
+        with ``retry_non_idempotent``.
+        """
+
+        headers = dict(headers or {})
+        headers.setdefault("Connection", "keep-alive")
+        request = self._build_request(method, path, body, headers)
+
+        async with self._slots:
+            for attempt in range(2):
+                streams = self._take_idle()
+                reused = streams is not None
+                keep_alive = False
+                try:
+                    if streams is None:
+                        streams = await asyncio.wait_for(self._open(), timeout)
+                    status, raw_body, keep_alive = await asyncio.wait_for(
+                        self._exchange(streams, request), timeout
+                    )
+                    return status, raw_body
+                except (*_STALE_CONNECTION_ERRORS, asyncio.IncompleteReadError):
+                    if not reused or attempt:
+                        raise
+                    if not _may_retry(method, retry_non_idempotent):
+                        raise
+                    self.stats.retries += 1
+                finally:
+                    if streams is not None:
+                        if keep_alive and not self._closed:
+                            self._idle.append((streams, time.monotonic()))
+                        else:
+                            self.stats.discarded += 1
+                            streams[1].close()
+
+        raise AssertionError("unreachable")  # pragma: no cover
+
+    def clear(self) -> None:
+        while self._idle:
+            streams, _ = self._idle.pop()
+            streams[1].close()
+
+    def close(self) -> None:
+        self._closed = True
+        self.clear()
+
+    @property
+    def idle_count(self) -> int:
+        return len(self._idle)
+
+
+class AsyncPoolManager(_PoolManagerBase):
+    """Hand out one :class:`AsyncConnectionPool` per origin."""
+
+    pool_class = AsyncConnectionPool
+
+    async def urlopen(
+        self,
+        method: str,
+        url: str,
+        *,
+        body: Optional[bytes] = None,
+        headers: Optional[Dict[str, str]] = None,
+        timeout: float = 10.0,
+        retry_non_idempotent: bool = False,
+    ) -> Tuple[int, bytes]:
+        pool, path = self._route(url)
+        return await pool.urlopen(
+            method,
+            path,
+            body=body,
+            headers=headers,
+            timeout=timeout,
+            retry_non_idempotent=retry_non_idempotent,
+        )
+
+    def close(self) -> None:
+        with self._lock:
+            pools = list(self._pools.values())
+            self._pools.clear()
+        for pool in pools:
+            pool.close()
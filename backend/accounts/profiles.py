@@ -0,0 +1,131 @@
+"""Auth0 profiles as stored on Django users.
+
+Shared by the login views and the commands that import or refresh users
+outside a login: the normalization of an Auth0 profile, the fingerprint
+kept in :class:`~accounts.models.Auth0Identity` to skip unchanged writes,
+and :class:`ProfileBatch` for bulk updates.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from typing import Dict, Optional
+
+from django.contrib.auth import get_user_model
+
+from .models import Auth0Identity
+
+PROFILE_FIELDS = ("first_name", "last_name", "email")
+
+
+def normalize_profile(
+    username: str, profile: Optional[Dict[str, object]]
+) -> Dict[str, str]:
+    """Extract a sanitized payload from the Auth0 profile response."""
+
+    def _coerce(value: object) -> str:
+        return str(value).strip() if isinstance(value, str) else ""
+
+    first_name = ""
+    last_name = ""
+    email = ""
+
+    if profile:
+        first_name = _coerce(profile.get("given_name"))
+        last_name = _coerce(profile.get("family_name"))
+        email = _coerce(profile.get("email"))
+
+        if not first_name and profile.get("name"):
+            full_name = _coerce(profile.get("name"))
+            if full_name:
+                parts = full_name.split()
+                first_name = parts[0]
+                if len(parts) > 1 and not last_name:
+                    last_name = " ".join(parts[1:])
+
+        if not first_name and profile.get("nickname"):
+            first_name = _coerce(profile.get("nickname"))
+
+    return {
+        "username": username,
+        "first_name": first_name,
+        "last_name": last_name,
+        "email": email,
+    }
+
+
+def profile_fingerprint(profile: Dict[str, str]) -> str:
+    material = "\0".join(profile.get(field, "") for field in PROFILE_FIELDS)
+    return hashlib.blake2b(material.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def identity_current(identity: Auth0Identity, fingerprint: str, subject: str) -> bool:
+    return identity.profile_fingerprint == fingerprint and (
+        not subject or identity.subject == subject
+    )
+
+
+def apply_profile(user, profile: Dict[str, str]) -> list[str]:
+    """Copy the non-empty profile values onto ``user``; return the changed fields."""
+
+    changed = []
+    for field in PROFILE_FIELDS:
+        value = profile.get(field, "")
+        if value and getattr(user, field) != value:
+            setattr(user, field, value)
+            changed.append(field)
+    return changed
+
+
+class ProfileBatch:
+    """Profile changes for many existing users, written with a few bulk queries.
+
+    The bulk counterpart of the per-login sync in ``accounts.views``, for
+    jobs that import or refresh profiles outside a login.
+    """
+
+    def __init__(self) -> None:
+        self.users: list = []
+        self.fields: set[str] = set()
+        self.new_identities: list[Auth0Identity] = []
+        self.identities: list[Auth0Identity] = []
+
+    def add(self, user, profile: Dict[str, str], subject: str = "") -> bool:
+        """Stage ``profile`` for ``user``; return whether anything changes."""
+
+        fingerprint = profile_fingerprint(profile)
+        identity = getattr(user, "auth0_identity", None)
+        if identity is not None and identity_current(identity, fingerprint, subject):
+            return False
+
+        fields = apply_profile(user, profile)
+        if fields:
+            self.users.append(user)
+            self.fields.update(fields)
+        if identity is None:
+            self.new_identities.append(
+                Auth0Identity(user=user, profile_fingerprint=fingerprint, subject=subject)
+            )
+        else:
+            identity.profile_fingerprint = fingerprint
+            identity.subject = subject or identity.subject
+            self.identities.append(identity)
+        return True
+
+    def add_new(self, user, profile: Dict[str, str], subject: str = "") -> None:
+        """Stage the identity of a user just created from ``profile``."""
+
+        self.new_identities.append(
+            Auth0Identity(
+                user=user, profile_fingerprint=profile_fingerprint(profile), subject=subject
+            )
+        )
+
+    def save(self) -> None:
+        if self.users:
+            get_user_model().objects.bulk_update(self.users, sorted(self.fields))
+        Auth0Identity.objects.bulk_create(self.new_identities)
+        if self.identities:
+            Auth0Identity.objects.bulk_update(
+                self.identities, ["profile_fingerprint", "subject"]
+            )
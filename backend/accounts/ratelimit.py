@@ -0,0 +1,330 @@
+"""Rate limits and load shedding for the login endpoint.
+
+Every login attempt costs an Auth0 password grant or a local password hash,
+so a credential-stuffing burst has to be turned away before either runs.
+Attempts are counted per client IP and per username with approximate
+sliding windows kept in fixed-size arrays: memory does not depend on how
+many distinct keys an attacker sends, and each attempt is a handful of
+array reads and writes.
+
+The arrays live in a pluggable :class:`CounterStore`
+(``ACCOUNTS_RATELIMIT_BACKEND``). :class:`LocalCounterStore` keeps them in
+process memory; :class:`SharedCounterStore` maps a file so every worker on
+the host shares the same counters.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import math
+import mmap
+import os
+import tempfile
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, MutableSequence, Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.utils.module_loading import import_string
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+# Cells per slot: the window a slot was last used in, the attempts counted
+# in that window and the attempts counted in the one before it.
+_FIELDS = 3
+_CELL_SIZE = array("q").itemsize
+
+Rate = Tuple[int, int]
+
+
+def parse_rate(value: str) -> Optional[Rate]:
+    """Parse ``"<attempts>/<seconds>"``; an empty value disables the limit."""
+
+    value = (value or "").strip()
+    if not value:
+        return None
+    try:
+        attempts, seconds = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise ImproperlyConfigured(f"Invalid rate {value!r}, expected '<attempts>/<seconds>'.")
+    if attempts <= 0 or seconds <= 0:
+        raise ImproperlyConfigured(f"Invalid rate {value!r}, both parts must be positive.")
+    return attempts, seconds
+
+
+class CounterStore:
+    """Approximate sliding-window counters in a fixed array of integers.
+
+    Keys are hashed into ``rows`` independent rows of ``slots`` slots (a
+    count-min sketch): two keys sharing a slot in one row are told apart by
+    the other rows, and a collision can only over-count a key, never let it
+    through early. Subclasses provide the cells and the lock around them.
+    """
+
+    def __init__(self, name: str, slots: int, rows: int = 2) -> None:
+        self.name = name
+        self.slots = max(1, slots)
+        self.rows = max(1, rows)
+        self.size = self.slots * self.rows * _FIELDS
+        self._salt = hashlib.sha256(f"ratelimit:{settings.SECRET_KEY}".encode()).digest()
+
+    def _cells(self) -> MutableSequence[int]:
+        raise NotImplementedError
+
+    def _locked(self):
+        raise NotImplementedError
+
+    def _offsets(self, key: str) -> List[int]:
+        digest = hashlib.blake2b(
+            key.encode("utf-8"), digest_size=4 * self.rows, key=self._salt
+        ).digest()
+        return [
+            (row * self.slots + int.from_bytes(digest[4 * row : 4 * row + 4], "little") % self.slots)
+            * _FIELDS
+            for row in range(self.rows)
+        ]
+
+    def hit(self, key: str, rate: Rate, now: Optional[float] = None) -> float:
+        """Count an attempt for ``key``.
+
+        Returns 0 when the attempt is allowed, otherwise the number of
+        seconds until it would be (rejected attempts are not counted).
+        """
+
+        limit, window = rate
+        now = time.time() if now is None else now
+        current = int(now // window)
+        elapsed = (now % window) / window
+
+        with self._locked():
+            cells = self._cells()
+            offsets = self._offsets(key)
+            counts = []
+            for offset in offsets:
+                started = cells[offset]
+                if started == current:
+                    counts.append((cells[offset + 1], cells[offset + 2]))
+                elif started == current - 1:
+                    counts.append((0, cells[offset + 1]))
+                else:
+                    counts.append((0, 0))
+
+            estimate, this_window, previous = min(
+                (previous * (1 - elapsed) + this_window, this_window, previous)
+                for this_window, previous in counts
+            )
+            if estimate >= limit:
+                return _retry_after(estimate, this_window, previous, limit, window, elapsed)
+
+            for offset, (this_window, previous) in zip(offsets, counts):
+                cells[offset] = current
+                cells[offset + 1] = this_window + 1
+                cells[offset + 2] = previous
+        return 0.0
+
+    def clear(self) -> None:
+        with self._locked():
+            cells = self._cells()
+            for index in range(self.size):
+                cells[index] = 0
+
+
+def _retry_after(
+    estimate: float, this_window: int, previous: int, limit: int, window: int, elapsed: float
+) -> float:
+    remaining = (1 - elapsed) * window
+    # The previous window's share decays linearly while this one runs...
+    if previous and (estimate - limit) / previous * window < remaining:
+        wait = (estimate - limit) / previous * window
+    else:
+        # ...then this window's attempts decay through the next one.
+        wait = remaining + max(0.0, 1 - limit / this_window) * window if this_window else remaining
+    return max(1.0, math.ceil(wait))
+
+
+class LocalCounterStore(CounterStore):
+    """Counters in process memory, shared by the threads of one worker."""
+
+    def __init__(self, name: str, slots: int, rows: int = 2) -> None:
+        super().__init__(name, slots, rows)
+        self._array = array("q", bytes(self.size * _CELL_SIZE))
+        self._lock = threading.Lock()
+
+    def _cells(self) -> MutableSequence[int]:
+        return self._array
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with self._lock:
+            yield
+
+
+class SharedCounterStore(CounterStore):
+    """Counters in a memory-mapped file under ``ACCOUNTS_RATELIMIT_DIR``.
+
+    Every process that maps the same file sees the same counters; updates
+    are serialised with a POSIX record lock, which forked workers do not
+    inherit. Delete the files when changing ``ACCOUNTS_RATELIMIT_SLOTS``.
+    """
+
+    def __init__(self, name: str, slots: int, rows: int = 2) -> None:
+        if fcntl is None:
+            raise ImproperlyConfigured("SharedCounterStore needs fcntl (POSIX systems only).")
+        super().__init__(name, slots, rows)
+        directory = Path(
+            getattr(settings, "ACCOUNTS_RATELIMIT_DIR", "") or tempfile.gettempdir()
+        )
+        directory.mkdir(parents=True, exist_ok=True)
+        self.path = directory / f"accounts-ratelimit-{name}.bin"
+        self._lock = threading.Lock()
+
+        length = self.size * _CELL_SIZE
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.lockf(fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(fd).st_size < length:
+                os.ftruncate(fd, length)
+        finally:
+            fcntl.lockf(fd, fcntl.LOCK_UN)
+        self._fd = fd
+        self._mmap = mmap.mmap(fd, length)
+        self._view = memoryview(self._mmap).cast("q")
+
+    def _cells(self) -> MutableSequence[int]:
+        return self._view
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with self._lock:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+
+
+class LoginRateLimiter:
+    """Per-IP and per-username login limits over two counter stores."""
+
+    def __init__(
+        self,
+        ip_rate: Optional[Rate],
+        username_rate: Optional[Rate],
+        store_class=LocalCounterStore,
+        slots: int = 65536,
+    ) -> None:
+        self.ip_rate = ip_rate
+        self.username_rate = username_rate
+        self.ip_store = store_class("ip", slots) if ip_rate else None
+        self.username_store = store_class("username", slots) if username_rate else None
+
+    def check_ip(self, ip: str) -> float:
+        if self.ip_store is None or not ip:
+            return 0.0
+        return self.ip_store.hit(ip, self.ip_rate)
+
+    def check_username(self, username: str) -> float:
+        if self.username_store is None:
+            return 0.0
+        return self.username_store.hit(username.strip().lower(), self.username_rate)
+
+
+class ConcurrencyLimit:
+    """Admit at most ``limit`` logins at once; 0 admits any number."""
+
+    def __init__(self, limit: int) -> None:
+        self.limit = max(0, limit)
+        self.in_flight = 0
+        self.rejected = 0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> bool:
+        with self._lock:
+            if self.limit and self.in_flight >= self.limit:
+                self.rejected += 1
+                return False
+            self.in_flight += 1
+            return True
+
+    def release(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"limit": self.limit, "in_flight": self.in_flight, "rejected": self.rejected}
+
+
+def client_ip(request) -> str:
+    """The client address, skipping ``ACCOUNTS_TRUSTED_PROXY_COUNT`` proxies.
+
+    Each trusted proxy appends the address it received the request from to
+    ``X-Forwarded-For``, so the client is the entry that many places from
+    the end; anything before it may be forged.
+    """
+
+    proxies = getattr(settings, "ACCOUNTS_TRUSTED_PROXY_COUNT", 0)
+    if proxies > 0:
+        forwarded = [
+            part.strip()
+            for part in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")
+            if part.strip()
+        ]
+        if len(forwarded) >= proxies:
+            return forwarded[-proxies]
+    return request.META.get("REMOTE_ADDR", "")
+
+
+_limiter: Optional[LoginRateLimiter] = None
+_concurrency: Optional[ConcurrencyLimit] = None
+_lock = threading.Lock()
+
+
+def get_login_rate_limiter() -> Optional[LoginRateLimiter]:
+    """Return the process-wide limiter, or ``None`` when limiting is off."""
+
+    global _limiter
+
+    if not getattr(settings, "ACCOUNTS_LOGIN_RATE_LIMITING", False):
+        return None
+    if _limiter is None:
+        with _lock:
+            if _limiter is None:
+                _limiter = LoginRateLimiter(
+                    parse_rate(settings.ACCOUNTS_LOGIN_RATE_IP),
+                    parse_rate(settings.ACCOUNTS_LOGIN_RATE_USERNAME),
+                    import_string(settings.ACCOUNTS_RATELIMIT_BACKEND),
+                    settings.ACCOUNTS_RATELIMIT_SLOTS,
+                )
+    return _limiter
+
+
+def get_login_concurrency() -> ConcurrencyLimit:
+    global _concurrency
+
+    if _concurrency is None:
+        with _lock:
+            if _concurrency is None:
+                _concurrency = ConcurrencyLimit(
+                    getattr(settings, "ACCOUNTS_LOGIN_MAX_IN_FLIGHT", 0)
+                )
+    return _concurrency
+
+
+@receiver(setting_changed)
+def _reset_limits(setting: str, **kwargs) -> None:
+    global _limiter, _concurrency
+
+    if setting.startswith(("ACCOUNTS_LOGIN_", "ACCOUNTS_RATELIMIT_")):
+        with _lock:
+            _limiter = None
+            _concurrency = None
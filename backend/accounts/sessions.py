@@ -0,0 +1,187 @@
+"""Cached, database-backed sessions that skip redundant writes.
+
+Use with ``SESSION_ENGINE = "accounts.sessions"``. Sessions are read from
+the ``SESSION_CACHE_ALIAS`` cache (a bounded, LRU local-memory cache by
+default) and only fall back to ``django_session`` on a miss. The table is
+written when a session is created or its data changes; a save that would
+only push the expiry forward is skipped until the stored expiry is more
+than ``ACCOUNTS_SESSION_WRITE_INTERVAL`` seconds behind. Rotating the key
+(``login()``, the token refresh) costs one INSERT at the end of the request
+instead of an INSERT, an UPDATE and a DELETE. Expired rows are purged by a
+background thread every ``ACCOUNTS_SESSION_PURGE_INTERVAL`` seconds.
+
+With a process-local cache, a session deleted by another worker (a logout)
+stays valid here for up to ``ACCOUNTS_SESSION_CACHE_TTL`` seconds; point
+``SESSION_CACHE_ALIAS`` at a cache shared by the workers to avoid that.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+from typing import Any, Dict, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.sessions.backends.base import VALID_KEY_CHARS
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.core.cache import caches
+from django.db import close_old_connections
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "accounts.sessions"
+
+
+class SessionStore(DBStore):
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key: Optional[str] = None) -> None:
+        self._cache = caches[settings.SESSION_CACHE_ALIAS]
+        self._stale_key: Optional[str] = None
+        super().__init__(session_key)
+        ensure_purger()
+
+    @property
+    def cache_key(self) -> str:
+        return self.cache_key_prefix + self._get_or_create_session_key()
+
+    def _cached(self) -> Optional[Dict[str, Any]]:
+        try:
+            entry = self._cache.get(self.cache_key)
+        except Exception:
+            # Invalid keys raise on some backends; treat them as a miss.
+            return None
+        if entry is not None and entry["expiry"] <= timezone.now():
+            self._cache.delete(self.cache_key)
+            return None
+        return entry
+
+    def _remember(self, data: Dict[str, Any], expiry) -> None:
+        timeout = min(
+            self.get_expiry_age(expiry=expiry),
+            getattr(settings, "ACCOUNTS_SESSION_CACHE_TTL", 60),
+        )
+        self._cache.set(self.cache_key, {"data": data, "expiry": expiry}, timeout)
+
+    def load(self) -> Dict[str, Any]:
+        entry = self._cached() if self.session_key else None
+        if entry is not None:
+            return entry["data"]
+
+        s = self._get_session_from_db()
+        if s is None:
+            return {}
+        data = self.decode(s.session_data)
+        self._remember(data, s.expire_date)
+        return data
+
+    def save(self, must_create: bool = False) -> None:
+        if self.session_key is None:
+            return self.create()
+
+        data = self._get_session(no_load=must_create)
+        expiry = self.get_expiry_date()
+        if not must_create:
+            entry = self._cached()
+            # Unchanged data whose stored expiry is recent enough: skip the write.
+            interval = timedelta(seconds=getattr(settings, "ACCOUNTS_SESSION_WRITE_INTERVAL", 300))
+            if entry is not None and entry["data"] == data and expiry - entry["expiry"] < interval:
+                return
+
+        super().save(must_create)
+        self._remember(dict(data), expiry)
+
+        stale, self._stale_key = self._stale_key, None
+        if stale:
+            self.delete(stale)
+
+    def cycle_key(self) -> None:
+        """Give the session a new key, written by the next :meth:`save`.
+
+        Django creates the new row right away and then updates it with the
+        data ``login()`` adds; deferring the INSERT makes that one write. The
+        old key is deleted once the new one is stored.
+        """
+
+        data = self._session
+        self._stale_key = self._stale_key or self.session_key
+        self._session_key = None
+        self._session_cache = data
+        self.modified = True
+
+    def _get_new_session_key(self) -> str:
+        # create() inserts with force_insert and retries on a duplicate key,
+        # so Django's SELECT looking for one beforehand is not needed.
+        return get_random_string(32, VALID_KEY_CHARS)
+
+    def delete(self, session_key: Optional[str] = None) -> None:
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        self.model.objects.filter(session_key=session_key).delete()
+        self._cache.delete(self.cache_key_prefix + session_key)
+
+    def exists(self, session_key: str) -> bool:
+        return (
+            bool(session_key) and (self.cache_key_prefix + session_key) in self._cache
+        ) or super().exists(session_key)
+
+    # The request path is synchronous (SessionMiddleware saves in a thread);
+    # the async API is kept consistent with it by running the same code.
+
+    async def aload(self) -> Dict[str, Any]:
+        return await sync_to_async(self.load)()
+
+    async def asave(self, must_create: bool = False) -> None:
+        await sync_to_async(self.save)(must_create)
+
+    async def acycle_key(self) -> None:
+        await sync_to_async(self.cycle_key)()
+
+    async def adelete(self, session_key: Optional[str] = None) -> None:
+        await sync_to_async(self.delete)(session_key)
+
+    async def aexists(self, session_key: str) -> bool:
+        return await sync_to_async(self.exists)(session_key)
+
+
+# --------------------------------------------------------------------------
+# Background purge of expired rows
+
+_purger_pid: Optional[int] = None
+_purger_lock = threading.Lock()
+
+
+def _purge_forever(interval: float) -> None:
+    while True:
+        time.sleep(interval)
+        try:
+            SessionStore.clear_expired()
+        except Exception:
+            logger.exception("Could not purge expired sessions.")
+        finally:
+            close_old_connections()
+
+
+def ensure_purger() -> None:
+    """Start the purge thread once per process (again after a fork)."""
+
+    global _purger_pid
+    pid = os.getpid()
+    interval = getattr(settings, "ACCOUNTS_SESSION_PURGE_INTERVAL", 0)
+    if _purger_pid == pid or interval <= 0:
+        return
+    with _purger_lock:
+        if _purger_pid == pid:
+            return
+        _purger_pid = pid
+        threading.Thread(
+            target=_purge_forever, args=(interval,), name="session-purge", daemon=True
+        ).start()
@@ -1,11 +1,180 @@
+import asyncio
+import base64
+import gzip
+import hashlib
+import http.client
+import io
 import json
 import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from unittest import mock
 
 from django.contrib.auth import get_user_model
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase, override_settings
+from django.utils import timezone
 
-from .auth0 import Auth0AuthenticationError
+from core.database import database_from_env, sqlite_pragmas_from_env
+from core.dispatch import (
+    ApiWSGIHandler,
+    ASGIPrefixDispatcher,
+    WSGIPrefixDispatcher,
+    get_dispatching_wsgi_application,
+)
+
+from .auth0 import (
+    Auth0AuthenticationError,
+    Auth0Config,
+    Auth0ConfigurationError,
+    Auth0Result,
+    get_auth0_client,
+)
+from . import auth0, metrics, tokens
+from .auth0_stub import Auth0StubServer
+from .hashers import PBKDF2PasswordHasher, ScryptPasswordHasher
+from .hashing import PasswordCheckPool, verify_password
+from .management.commands import import_auth0_users
+from .management_api import ManagementClient, ManagementToken, user_id_query
+from .breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker, DependencyGuard
+from .pool import AsyncPoolManager, PoolManager
+from .sessions import SessionStore as CachedSessionStore
+from . import warmup
+from .ratelimit import ConcurrencyLimit, LocalCounterStore, SharedCounterStore, parse_rate
+from .singleflight import AsyncSingleFlight, SingleFlight, credential_fingerprint
+from .tokens import RSAPublicKey, TokenVerificationError, rsa_sha256_verify
+from . import views
+from .models import Auth0Identity, LoginEvent
+from .profiles import normalize_profile, profile_fingerprint
+from .writebehind import WriteBehindQueue
+from .views import alogin_view
+
+
+def _is_probable_prime(candidate, rounds=20):
+    if candidate % 2 == 0:
+        return candidate == 2
+    d, r = candidate - 1, 0
+    while d % 2 == 0:
+        d, r = d // 2, r + 1
+    for _ in range(rounds):
+        x = pow(random.randrange(2, candidate - 1), d, candidate)
+        if x in (1, candidate - 1):
+            continue
+        for _ in range(r - 1):
+            x = pow(x, 2, candidate)
+            if x == candidate - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def _generate_rsa_key(bits=1024):
+    """Return ``(public_key, private_exponent)`` for tests only."""
+
+    def prime():
+        while True:
+            candidate = random.getrandbits(bits // 2) | (1 << (bits // 2 - 1)) | 1
+            if _is_probable_prime(candidate):
+                return candidate
+
+    e = 65537
+    while True:
+        p, q = prime(), prime()
+        phi = (p - 1) * (q - 1)
+        if p != q and phi % e:
+            return RSAPublicKey(n=p * q, e=e), pow(e, -1, phi)
+
+
+def _b64url(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _sign_jwt(claims, key, private_exponent, kid="test-key"):
+    header = {"alg": "RS256", "typ": "JWT", "kid": kid}
+    signing_input = (
+        f"{_b64url(json.dumps(header).encode())}.{_b64url(json.dumps(claims).encode())}"
+    )
+    digest_info = tokens._SHA256_DIGEST_INFO + hashlib.sha256(signing_input.encode()).digest()
+    encoded = b"\x00\x01" + b"\xff" * (key.size - len(digest_info) - 3) + b"\x00" + digest_info
+    signature = pow(int.from_bytes(encoded, "big"), private_exponent, key.n)
+    return f"{signing_input}.{_b64url(signature.to_bytes(key.size, 'big'))}"
+
+
+def _jwks_for(key, kid="test-key"):
+    return {
+        "keys": [
+            {
+                "kty": "RSA",
+                "use": "sig",
+                "kid": kid,
+                "n": _b64url(key.n.to_bytes(key.size, "big")),
+                "e": _b64url(key.e.to_bytes(3, "big")),
+            }
+        ]
+    }
+
+
+_TEST_KEY, _TEST_PRIVATE_EXPONENT = _generate_rsa_key()
+
+# Every test client logs in from 127.0.0.1; RateLimitTests turns limits back on.
+_rate_limits_off = override_settings(ACCOUNTS_LOGIN_RATE_LIMITING=False)
+
+
+def setUpModule():
+    _rate_limits_off.enable()
+
+
+def tearDownModule():
+    _rate_limits_off.disable()
+
+
+class _KeepAliveHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        body = json.dumps({"path": self.path}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _DroppingHandler(_KeepAliveHandler):
+    """Process the request, then hang up without answering when asked to."""
+
+    def _handle(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            self.rfile.read(length)
+        self.server.seen.append(self.command)
+        if self.server.drop_next:
+            self.server.drop_next = False
+            self.close_connection = True
+            return
+        _KeepAliveHandler.do_GET(self)
+
+    do_GET = _handle
+    do_POST = _handle
 
 
 class LoginViewTests(TestCase):
@@ -154,3 +323,1632 @@ class LoginViewAuth0Tests(TestCase):
 
         self.assertEqual(response.status_code, 503)
         self.assertEqual(response.json()["error"], "No se pudo conectar con Auth0.")
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _KeepAliveHandler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        self.pool = PoolManager(maxsize=2, idle_timeout=60.0)
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connections_are_reused(self):
+        for _ in range(3):
+            status, body = self.pool.urlopen("GET", f"{self.base_url}/userinfo")
+            self.assertEqual(status, 200)
+            self.assertEqual(json.loads(body), {"path": "/userinfo"})
+
+        stats = self.pool.stats()
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["hits"], 2)
+
+    def test_idle_connections_are_evicted(self):
+        self.pool.urlopen("GET", f"{self.base_url}/a")
+        pool = self.pool.pool_for("http", "127.0.0.1", self.server.server_port)
+        pool.idle_timeout = 0.0
+
+        self.pool.urlopen("GET", f"{self.base_url}/b")
+
+        stats = self.pool.stats()
+        self.assertEqual(stats["evictions"], 1)
+        self.assertEqual(stats["misses"], 2)
+
+    def test_prewarmed_connection_serves_the_first_request(self):
+        self.assertEqual(self.pool.prewarm(self.base_url), 1)
+        self.assertEqual(self.pool.prewarm(self.base_url), 0)
+
+        self.pool.urlopen("GET", f"{self.base_url}/userinfo")
+
+        self.assertEqual(self.pool.stats()["hits"], 1)
+        self.assertEqual(self.pool.stats()["misses"], 0)
+
+    def test_connections_from_before_a_fork_are_not_reused(self):
+        self.pool.urlopen("GET", f"{self.base_url}/a")
+
+        with mock.patch("accounts.pool.os.getpid", return_value=os.getpid() + 1):
+            self.pool.urlopen("GET", f"{self.base_url}/b")
+
+        self.assertEqual(self.pool.stats()["misses"], 2)
+
+    async def test_async_connections_are_reused(self):
+        pool = AsyncPoolManager(maxsize=2)
+        try:
+            for _ in range(3):
+                status, body = await pool.urlopen("GET", f"{self.base_url}/userinfo")
+                self.assertEqual(status, 200)
+                self.assertEqual(json.loads(body), {"path": "/userinfo"})
+
+            stats = pool.stats()
+            self.assertEqual(stats["misses"], 1)
+            self.assertEqual(stats["hits"], 2)
+        finally:
+            pool.close()
+
+    def test_client_is_shared_until_config_changes(self):
+        config = Auth0Config(domain="a.auth0.com", client_id="id", client_secret="secret")
+        client = get_auth0_client(config)
+
+        self.assertIs(get_auth0_client(config), client)
+        other = get_auth0_client(
+            Auth0Config(domain="b.auth0.com", client_id="id", client_secret="secret")
+        )
+        self.assertIsNot(other, client)
+
+
+class StaleConnectionRetryTests(SimpleTestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _DroppingHandler)
+        self.server.seen = []
+        self.server.drop_next = False
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        self.pool = PoolManager(maxsize=1, idle_timeout=60.0)
+        self.pool.urlopen("GET", f"{self.base_url}/warm")
+        self.server.seen.clear()
+        self.server.drop_next = True
+
+    def tearDown(self):
+        self.pool.close()
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_stale_get_is_retried_on_a_fresh_connection(self):
+        status, _ = self.pool.urlopen("GET", f"{self.base_url}/userinfo")
+
+        self.assertEqual(status, 200)
+        self.assertEqual(self.server.seen, ["GET", "GET"])
+        self.assertEqual(self.pool.stats()["retries"], 1)
+
+    def test_stale_post_is_not_replayed(self):
+        with self.assertRaises(http.client.RemoteDisconnected):
+            self.pool.urlopen("POST", f"{self.base_url}/oauth/token", body=b"grant")
+
+        self.assertEqual(self.server.seen, ["POST"])
+        self.assertEqual(self.pool.stats()["retries"], 0)
+
+    def test_post_is_retried_when_the_caller_opts_in(self):
+        status, _ = self.pool.urlopen(
+            "POST",
+            f"{self.base_url}/oauth/token",
+            body=b"grant",
+            retry_non_idempotent=True,
+        )
+
+        self.assertEqual(status, 200)
+        self.assertEqual(self.server.seen, ["POST", "POST"])
+
+    async def test_async_stale_post_is_not_replayed(self):
+        pool = AsyncPoolManager(maxsize=1)
+        try:
+            self.server.drop_next = False
+            await pool.urlopen("GET", f"{self.base_url}/warm")
+            self.server.seen.clear()
+            self.server.drop_next = True
+
+            with self.assertRaises((ConnectionError, asyncio.IncompleteReadError)):
+                await pool.urlopen("POST", f"{self.base_url}/oauth/token", body=b"grant")
+
+            self.assertEqual(self.server.seen, ["POST"])
+            self.assertEqual(pool.stats()["retries"], 0)
+        finally:
+            pool.close()
+
+
+class AsyncLoginViewTests(TestCase):
+    def setUp(self):
+        self.factory = AsyncRequestFactory()
+
+    def _request(self, payload):
+        request = self.factory.post(
+            "/api/login/", data=json.dumps(payload), content_type="application/json"
+        )
+        SessionMiddleware(lambda request: None).process_request(request)
+        return request
+
+    @mock.patch("accounts.views.aauthenticate_with_auth0")
+    async def test_auth0_login_success(self, mock_auth0):
+        mock_auth0.return_value = Auth0Result(
+            tokens={"access_token": "access123", "token_type": "Bearer"},
+            profile={"given_name": "Jonathan", "family_name": "Morales"},
+        )
+
+        request = self._request({"username": "jona", "password": "200328"})
+        response = await alogin_view(request)
+
+        self.assertEqual(response.status_code, 200)
+        data = json.loads(response.content)
+        self.assertEqual(data["user"]["first_name"], "Jonathan")
+        self.assertEqual(data["tokens"]["access_token"], "access123")
+        self.assertIn("_auth_user_id", request.session)
+
+    @mock.patch("accounts.views.get_write_behind")
+    @mock.patch("accounts.views.aauthenticate_with_auth0")
+    async def test_auth0_failure(self, mock_auth0, mock_write_behind):
+        mock_auth0.side_effect = Auth0AuthenticationError(
+            "No se pudo conectar con Auth0.", status_code=503
+        )
+
+        response = await alogin_view(self._request({"username": "jona", "password": "x"}))
+
+        self.assertEqual(response.status_code, 503)
+        event = mock_write_behind.return_value.record_login_event.call_args.kwargs
+        self.assertEqual(event["outcome"], "failure")
+        self.assertEqual(event["status_code"], 503)
+
+    async def test_missing_fields(self):
+        response = await alogin_view(self._request({"username": "jona"}))
+
+        self.assertEqual(response.status_code, 400)
+
+
+class IdTokenProfileTests(TestCase):
+    def setUp(self):
+        tokens._jwks_caches.clear()
+        self.env = {
+            "AUTH0_DOMAIN": "servigenman.auth0.com",
+            "AUTH0_CLIENT_ID": "client-id",
+            "AUTH0_CLIENT_SECRET": "client-secret",
+            "AUTH0_VERIFY_ID_TOKEN": "true",
+        }
+        self.userinfo_calls = 0
+
+    def _id_token(self, **claims):
+        base = {
+            "iss": "https://servigenman.auth0.com/",
+            "aud": "client-id",
+            "sub": "auth0|123",
+            "exp": int(time.time()) + 3600,
+        }
+        base.update(claims)
+        return _sign_jwt(base, _TEST_KEY, _TEST_PRIVATE_EXPONENT)
+
+    def _fake_get_json(self, url, headers, timeout, pool=None):
+        if url.endswith("/.well-known/jwks.json"):
+            return 200, _jwks_for(_TEST_KEY)
+        self.userinfo_calls += 1
+        return 200, {"given_name": "Desde", "family_name": "Userinfo", "email": "u@example.com"}
+
+    def _login(self, id_token):
+        with mock.patch.dict(os.environ, self.env, clear=False), mock.patch(
+            "accounts.auth0._post_form_urlencoded",
+            return_value=(200, {"access_token": "access123", "id_token": id_token}),
+        ), mock.patch("accounts.auth0._get_json", side_effect=self._fake_get_json):
+            return self.client.post(
+                "/api/login/",
+                data=json.dumps({"username": "jona", "password": "200328"}),
+                content_type="application/json",
+            )
+
+    def test_profile_comes_from_verified_id_token(self):
+        response = self._login(
+            self._id_token(given_name="Jonathan", family_name="Morales", email="j@example.com")
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["user"]["first_name"], "Jonathan")
+        self.assertEqual(self.userinfo_calls, 0)
+
+    def test_falls_back_to_userinfo_when_claims_are_missing(self):
+        response = self._login(self._id_token(nickname="jona"))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["user"]["first_name"], "Desde")
+        self.assertEqual(self.userinfo_calls, 1)
+
+    def test_falls_back_to_userinfo_when_audience_is_wrong(self):
+        response = self._login(
+            self._id_token(aud="someone-else", given_name="Jonathan", email="j@example.com")
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.userinfo_calls, 1)
+
+    def test_tampered_signature_is_rejected(self):
+        token = self._id_token(email="j@example.com")
+        _, _, signing_input, signature = tokens.decode_unverified(token)
+        self.assertTrue(rsa_sha256_verify(_TEST_KEY, signing_input, signature))
+
+        tampered = signing_input.replace(b".", b".e", 1)
+        self.assertFalse(rsa_sha256_verify(_TEST_KEY, tampered, signature))
+        with self.assertRaises(TokenVerificationError):
+            tokens.decode_unverified("not-a-token")
+
+
+class BearerTokenMiddlewareTests(TestCase):
+    def setUp(self):
+        tokens._jwks_caches.clear()
+        self.env = {
+            "AUTH0_DOMAIN": "servigenman.auth0.com",
+            "AUTH0_CLIENT_ID": "client-id",
+            "AUTH0_CLIENT_SECRET": "client-secret",
+            "AUTH0_AUDIENCE": "https://api.servigenman.cl",
+        }
+        self.jwks_calls = 0
+
+    def _access_token(self, **claims):
+        base = {
+            "iss": "https://servigenman.auth0.com/",
+            "aud": ["https://api.servigenman.cl", "https://servigenman.auth0.com/userinfo"],
+            "sub": "auth0|123",
+            "exp": int(time.time()) + 3600,
+            "scope": "openid profile",
+        }
+        base.update(claims)
+        return _sign_jwt(base, _TEST_KEY, _TEST_PRIVATE_EXPONENT)
+
+    def _fake_get_json(self, url, headers, timeout, pool=None):
+        self.jwks_calls += 1
+        return 200, _jwks_for(_TEST_KEY)
+
+    def _get_me(self, token):
+        with mock.patch.dict(os.environ, self.env, clear=False), mock.patch(
+            "accounts.auth0._get_json", side_effect=self._fake_get_json
+        ):
+            return self.client.get("/api/me/", HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_valid_token_authenticates_without_queries(self):
+        token = self._access_token()
+
+        with self.assertNumQueries(0):
+            first = self._get_me(token)
+            second = self._get_me(token)
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.json()["user"]["username"], "auth0|123")
+        self.assertEqual(self.jwks_calls, 1)
+
+    def test_invalid_token_is_rejected(self):
+        response = self._get_me(self._access_token(aud="https://other.example.com"))
+
+        self.assertEqual(response.status_code, 401)
+        self.assertIn("invalid_token", response["WWW-Authenticate"])
+
+    def test_expired_entries_leave_the_verified_cache(self):
+        cache = tokens.VerifiedTokenCache(maxsize=2)
+        cache.put("a", {"exp": time.time() - 1})
+        cache.put("b", {"exp": time.time() + 60})
+        cache.put("c", {"exp": time.time() + 60})
+        cache.put("d", {"exp": time.time() + 60})
+
+        self.assertIsNone(cache.get("a"))
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(len(cache), 2)
+
+    def test_anonymous_request_is_rejected(self):
+        response = self.client.get("/api/me/")
+
+        self.assertEqual(response.status_code, 401)
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_concurrent_threads_share_one_call(self):
+        flight = SingleFlight()
+        release = threading.Event()
+        upstream_calls = []
+        results = []
+
+        def upstream():
+            upstream_calls.append(1)
+            release.wait(5)
+            return "tokens"
+
+        threads = [
+            threading.Thread(target=lambda: results.append(flight.do("key", upstream)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        deadline = time.monotonic() + 5
+        while flight.coalesced < 4 and time.monotonic() < deadline:
+            time.sleep(0.001)
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(upstream_calls), 1)
+        self.assertEqual(results, ["tokens"] * 5)
+        self.assertEqual(flight.stats(), {"calls": 5, "coalesced": 4, "in_flight": 0})
+
+    def test_errors_are_shared_and_not_cached(self):
+        flight = SingleFlight()
+
+        def failing():
+            raise Auth0AuthenticationError("Wrong email or password.")
+
+        with self.assertRaises(Auth0AuthenticationError):
+            flight.do("key", failing)
+        self.assertEqual(flight.do("key", lambda: "ok"), "ok")
+
+    async def test_concurrent_tasks_share_one_call(self):
+        flight = AsyncSingleFlight()
+        upstream_calls = []
+
+        async def upstream():
+            upstream_calls.append(1)
+            await asyncio.sleep(0.01)
+            return "tokens"
+
+        results = await asyncio.gather(*(flight.do("key", upstream) for _ in range(5)))
+
+        self.assertEqual(results, ["tokens"] * 5)
+        self.assertEqual(len(upstream_calls), 1)
+        self.assertEqual(flight.coalesced, 4)
+
+    def test_fingerprint_is_keyed(self):
+        fingerprint = credential_fingerprint("secret", "jona", "200328")
+
+        self.assertNotIn("200328", fingerprint)
+        self.assertNotEqual(fingerprint, credential_fingerprint("other", "jona", "200328"))
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def test_opens_after_failures_and_recovers_through_half_open(self):
+        now = [0.0]
+        breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=10, clock=lambda: now[0])
+
+        breaker.record_failure()
+        self.assertEqual(breaker.state, CLOSED)
+        breaker.record_failure()
+        self.assertEqual(breaker.state, OPEN)
+        self.assertFalse(breaker.allow())
+
+        now[0] = 10.0
+        self.assertEqual(breaker.state, HALF_OPEN)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(breaker.state, OPEN)
+
+        now[0] = 20.0
+        self.assertTrue(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(breaker.state, CLOSED)
+
+    def test_timeout_adapts_to_observed_latency(self):
+        guard = DependencyGuard(max_timeout=10.0, min_timeout=0.05)
+        self.assertEqual(guard.timeout(), 10.0)
+
+        for _ in range(guard.min_samples):
+            guard.latency.record(0.1)
+
+        self.assertAlmostEqual(guard.timeout(), 0.3)
+
+    def test_hedged_call_returns_the_fastest_answer(self):
+        guard = DependencyGuard(max_timeout=5.0, min_timeout=0.01)
+        for _ in range(guard.min_samples):
+            guard.latency.record(0.01)
+        attempts = []
+
+        def send(timeout):
+            attempts.append(timeout)
+            if len(attempts) == 1:
+                time.sleep(0.5)
+                return "slow"
+            return "fast"
+
+        self.assertEqual(guard.call(send, hedge=True), "fast")
+        self.assertEqual(guard.hedged, 1)
+
+
+class LoginCircuitBreakerTests(TestCase):
+    def setUp(self):
+        auth0._guards.clear()
+        get_user_model().objects.create_user(username="jona", password="200328")
+        self.env = {
+            "AUTH0_DOMAIN": "servigenman.auth0.com",
+            "AUTH0_CLIENT_ID": "client-id",
+            "AUTH0_CLIENT_SECRET": "client-secret",
+            "AUTH0_BREAKER_FAILURES": "2",
+        }
+
+    def tearDown(self):
+        auth0._guards.clear()
+
+    def _login_attempts(self, count, upstream=(503, {}), **env):
+        responses = []
+        with mock.patch.dict(os.environ, {**self.env, **env}, clear=False), mock.patch(
+            "accounts.auth0._post_form_urlencoded", return_value=upstream
+        ) as mock_post:
+            for _ in range(count):
+                responses.append(
+                    self.client.post(
+                        "/api/login/",
+                        data=json.dumps({"username": "jona", "password": "200328"}),
+                        content_type="application/json",
+                    )
+                )
+        return responses, mock_post.call_count
+
+    def test_open_circuit_fails_fast(self):
+        responses, upstream_calls = self._login_attempts(3)
+
+        self.assertEqual([r.status_code for r in responses], [503, 503, 503])
+        self.assertEqual(upstream_calls, 2)
+        self.assertEqual(
+            responses[-1].json()["error"], "Auth0 no está disponible en este momento."
+        )
+
+    def test_locked_out_user_does_not_open_the_circuit(self):
+        too_many_attempts = (
+            429,
+            {"error": "too_many_attempts", "error_description": "Your account has been blocked."},
+        )
+        responses, upstream_calls = self._login_attempts(3, upstream=too_many_attempts)
+
+        self.assertEqual([r.status_code for r in responses], [429, 429, 429])
+        self.assertEqual(upstream_calls, 3)
+
+    def test_open_circuit_falls_back_to_local_auth(self):
+        responses, upstream_calls = self._login_attempts(
+            3, AUTH0_OPEN_CIRCUIT_POLICY="local"
+        )
+
+        self.assertEqual([r.status_code for r in responses], [503, 503, 200])
+        self.assertEqual(upstream_calls, 2)
+
+
+class ProfileFingerprintSyncTests(TestCase):
+    def setUp(self):
+        views._synced_profiles.clear()
+        self.profile = normalize_profile(
+            "jona",
+            {"given_name": "Jonathan", "family_name": "Morales", "email": "j@example.com"},
+        )
+
+    def test_unchanged_profile_is_one_read_and_no_writes(self):
+        views._sync_user_with_profile("jona", self.profile)
+
+        with self.assertNumQueries(1):
+            views._sync_user_with_profile("jona", self.profile)
+
+        views._synced_profiles.clear()
+        with self.assertNumQueries(1):
+            user = views._sync_user_with_profile("jona", self.profile)
+        self.assertEqual(user.first_name, "Jonathan")
+
+    def test_changed_profile_is_written_and_fingerprinted(self):
+        views._sync_user_with_profile("jona", self.profile)
+        changed = dict(self.profile, email="nuevo@example.com")
+
+        user = views._sync_user_with_profile("jona", changed)
+
+        user.refresh_from_db()
+        self.assertEqual(user.email, "nuevo@example.com")
+        self.assertEqual(
+            Auth0Identity.objects.get(user=user).profile_fingerprint,
+            profile_fingerprint(changed),
+        )
+
+    def test_subject_is_backfilled_for_unchanged_profiles(self):
+        views._sync_user_with_profile("jona", self.profile)
+
+        user = views._sync_user_with_profile("jona", self.profile, "auth0|jona")
+        with self.assertNumQueries(1):
+            views._sync_user_with_profile("jona", self.profile, "auth0|jona")
+
+        self.assertEqual(Auth0Identity.objects.get(user=user).subject, "auth0|jona")
+
+
+class WriteBehindQueueTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="jona", password="200328")
+
+    def test_flush_batches_last_login_and_events(self):
+        write_behind = WriteBehindQueue(batch_size=10)
+        write_behind.start = lambda: None  # flush from the test thread only
+        earlier = timezone.now() - timedelta(minutes=5)
+        latest = timezone.now()
+
+        write_behind.record_last_login(self.user.pk, earlier)
+        write_behind.record_last_login(self.user.pk, latest)
+        for outcome in ("failure", "success"):
+            write_behind.record_login_event(
+                user_id=self.user.pk,
+                username="jona",
+                source="local",
+                outcome=outcome,
+                status_code=200,
+                latency_ms=1.5,
+            )
+
+        with self.assertNumQueries(4):  # savepoint, UPDATE, INSERT, release
+            self.assertEqual(write_behind.flush(), 4)
+
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.last_login, latest)
+        self.assertEqual(LoginEvent.objects.filter(username="jona").count(), 2)
+
+    def test_full_queue_flushes_in_the_producer(self):
+        write_behind = WriteBehindQueue(batch_size=10, max_size=1, put_timeout=0)
+        write_behind.start = lambda: None
+
+        write_behind.record_last_login(self.user.pk, timezone.now())
+        write_behind.record_last_login(self.user.pk, timezone.now())
+
+        self.assertEqual(write_behind.backpressure_flushes, 1)
+        self.assertEqual(len(write_behind), 1)
+
+    async def test_full_queue_never_flushes_on_the_event_loop(self):
+        write_behind = WriteBehindQueue(batch_size=10, max_size=1, put_timeout=5)
+        write_behind.start = lambda: None
+        write_behind._flush_batch = mock.Mock(side_effect=AssertionError("flushed inline"))
+
+        started = time.perf_counter()
+        write_behind.record_last_login(self.user.pk, timezone.now())
+        write_behind.record_last_login(self.user.pk, timezone.now())
+
+        self.assertLess(time.perf_counter() - started, 1)
+        self.assertEqual(write_behind.dropped, 1)
+        self.assertEqual(write_behind.backpressure_flushes, 0)
+        self.assertEqual(write_behind.failed_batches, 0)
+        self.assertEqual(len(write_behind), 1)
+        self.assertTrue(write_behind._wake.is_set())
+
+    def test_login_defers_last_login_to_the_queue(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(
+                "/api/login/",
+                data=json.dumps({"username": "jona", "password": "200328"}),
+                content_type="application/json",
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.last_login)
+        # One callback for last_login, one for the audit event.
+        self.assertEqual(len(callbacks), 2)
+
+
+class DatabaseSettingsTests(TestCase):
+    def test_sqlite_is_the_default_with_persistent_connections(self):
+        databases = database_from_env(Path("/srv"), {})
+
+        default = databases["default"]
+        self.assertEqual(default["ENGINE"], "django.db.backends.sqlite3")
+        self.assertEqual(default["NAME"], Path("/srv") / "db.sqlite3")
+        self.assertEqual(default["CONN_MAX_AGE"], 60)
+        self.assertTrue(default["CONN_HEALTH_CHECKS"])
+        self.assertEqual(default["OPTIONS"], {"transaction_mode": "IMMEDIATE"})
+
+    def test_postgres_pool_disables_persistent_connections(self):
+        databases = database_from_env(
+            Path("/srv"),
+            {
+                "DJANGO_DB_ENGINE": "postgresql",
+                "DJANGO_DB_NAME": "inventario",
+                "DJANGO_DB_HOST": "db",
+                "DJANGO_DB_POOL": "true",
+                "DJANGO_DB_POOL_MAX_SIZE": "20",
+            },
+        )
+
+        default = databases["default"]
+        self.assertEqual(default["ENGINE"], "django.db.backends.postgresql")
+        self.assertEqual(default["NAME"], "inventario")
+        self.assertEqual(default["HOST"], "db")
+        self.assertEqual(default["CONN_MAX_AGE"], 0)
+        self.assertEqual(default["OPTIONS"]["pool"], {"min_size": 2, "max_size": 20, "timeout": 10})
+
+    def test_unknown_engine_is_rejected(self):
+        with self.assertRaises(ValueError):
+            database_from_env(Path("/srv"), {"DJANGO_DB_ENGINE": "oracle"})
+        with self.assertRaises(ValueError):
+            sqlite_pragmas_from_env({"DJANGO_SQLITE_SYNCHRONOUS": "1; DROP TABLE x"})
+
+    def test_wal_can_be_switched_off(self):
+        pragmas = sqlite_pragmas_from_env({"DJANGO_SQLITE_WAL": "False"})
+
+        self.assertEqual(pragmas["journal_mode"], "DELETE")
+        self.assertEqual(pragmas["synchronous"], "FULL")
+
+    def test_pragmas_are_applied_to_new_connections(self):
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], 5000)
+            cursor.execute("PRAGMA synchronous")
+            self.assertEqual(cursor.fetchone()[0], 1)  # NORMAL
+
+
+class _InlinePasswordCheckPool:
+    """Runs checks in-process so tests see ``override_settings``."""
+
+    def check(self, password, encoded):
+        return verify_password(password, encoded)
+
+    async def acheck(self, password, encoded):
+        return verify_password(password, encoded)
+
+
+@override_settings(ACCOUNTS_PBKDF2_ITERATIONS=2000)
+class PasswordHashingTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="jona", password="200328")
+
+    def _old_hash(self):
+        return PBKDF2PasswordHasher().encode("200328", "somesaltvalue1234", iterations=1000)
+
+    def test_outdated_hash_is_rehashed_on_login(self):
+        get_user_model().objects.filter(pk=self.user.pk).update(password=self._old_hash())
+
+        with mock.patch(
+            "accounts.views.get_password_check_pool", return_value=_InlinePasswordCheckPool()
+        ):
+            response = self.client.post(
+                "/api/login/",
+                data=json.dumps({"username": "jona", "password": "200328"}),
+                content_type="application/json",
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$2000$"))
+
+    def test_wrong_password_is_not_rehashed(self):
+        self.assertEqual(verify_password("incorrecta", self._old_hash()), (False, None))
+        self.assertEqual(verify_password("200328", None), (False, None))
+
+    def test_scrypt_parameters_come_from_settings(self):
+        with override_settings(ACCOUNTS_SCRYPT_WORK_FACTOR=2**10):
+            encoded = ScryptPasswordHasher().encode("200328", "somesaltvalue1234")
+        self.assertTrue(encoded.startswith("scrypt$1024$"))
+
+    def test_pool_checks_in_worker_processes(self):
+        pool = PasswordCheckPool(max_workers=1)
+        self.addCleanup(pool.shutdown)
+
+        valid, rehashed = pool.check("200328", self._old_hash())
+
+        self.assertTrue(valid)
+        self.assertIsNotNone(rehashed)
+        self.assertEqual(pool.check("incorrecta", self._old_hash()), (False, None))
+        self.assertEqual(pool.stats()["pending"], 0)
+
+    def test_full_pool_sheds_load(self):
+        pool = PasswordCheckPool(max_workers=1, max_pending=1)
+        pool._pending = 1
+
+        with mock.patch("accounts.views.get_password_check_pool", return_value=pool):
+            response = self.client.post(
+                "/api/login/",
+                data=json.dumps({"username": "jona", "password": "200328"}),
+                content_type="application/json",
+            )
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertEqual(pool.rejected, 1)
+
+    async def test_async_login_awaits_the_pool(self):
+        request = AsyncRequestFactory().post(
+            "/api/login/",
+            data=json.dumps({"username": "jona", "password": "200328"}),
+            content_type="application/json",
+        )
+        SessionMiddleware(lambda request: None).process_request(request)
+
+        with mock.patch(
+            "accounts.views.get_password_check_pool", return_value=_InlinePasswordCheckPool()
+        ), mock.patch("accounts.views.authenticate_with_auth0", side_effect=AssertionError):
+            response = await alogin_view(request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("_auth_user_id", request.session)
+
+
+class MetricsTests(TestCase):
+    def setUp(self):
+        self.env = {
+            "AUTH0_DOMAIN": "metrics.auth0.com",
+            "AUTH0_CLIENT_ID": "client-id",
+            "AUTH0_CLIENT_SECRET": "client-secret",
+        }
+
+    @mock.patch("accounts.auth0._get_json")
+    @mock.patch("accounts.auth0._post_form_urlencoded")
+    def test_login_reports_phases_and_upstream_statuses(self, mock_post, mock_get):
+        mock_post.return_value = (200, {"access_token": "access123"})
+        mock_get.return_value = (200, {"given_name": "Jonathan", "email": "j@example.com"})
+        before = metrics.AUTH0_RESPONSES.value(endpoint="oauth_token", status=200)
+
+        with mock.patch.dict(os.environ, self.env, clear=False):
+            response = self.client.post(
+                "/api/login/",
+                data=json.dumps({"username": "jona", "password": "200328"}),
+                content_type="application/json",
+            )
+
+        self.assertEqual(response.status_code, 200)
+        phases = [item.split(";")[0] for item in response["Server-Timing"].split(", ")]
+        for phase in ("parse", "oauth_token", "userinfo", "auth0", "sync_user", "login"):
+            self.assertIn(phase, phases)
+        self.assertEqual(phases[-1], "total")
+        self.assertEqual(
+            metrics.AUTH0_RESPONSES.value(endpoint="oauth_token", status=200), before + 1
+        )
+        self.assertEqual(metrics.AUTH0_IN_FLIGHT.value(endpoint="oauth_token"), 0)
+
+    def test_metrics_endpoint_renders_prometheus_text(self):
+        metrics.PHASE_SECONDS.observe(0.003, phase="parse")
+
+        response = self.client.get("/api/metrics/")
+
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn("# TYPE login_phase_seconds histogram", body)
+        self.assertIn('login_phase_seconds_bucket{phase="parse",le="+Inf"}', body)
+        self.assertIn("http_requests_in_flight", body)
+
+    def test_metrics_endpoint_is_restricted_to_allowed_addresses(self):
+        response = self.client.get("/api/metrics/", REMOTE_ADDR="203.0.113.9")
+
+        self.assertEqual(response.status_code, 403)
+
+    def test_snapshots_from_dead_workers_keep_counters_but_not_gauges(self):
+        registry = metrics.Registry()
+        registry.counter("logins_total", "Logins.").inc(3)
+        registry.gauge("in_flight", "In flight.").set(2)
+        registry.histogram("latency_seconds", "Latency.", buckets=(0.1, 1.0)).observe(0.5)
+        alive = registry.snapshot()
+        dead = {**registry.snapshot(), "pid": alive["pid"] + 1}
+
+        with mock.patch("accounts.metrics._pid_alive", return_value=False):
+            merged = metrics.merge_snapshots([alive, dead])
+
+        self.assertEqual(merged["logins_total"]["samples"][()], 6)
+        self.assertEqual(merged["in_flight"]["samples"][()], 2)
+        text = metrics.render(merged)
+        self.assertIn('latency_seconds_bucket{le="0.1"} 0', text)
+        self.assertIn('latency_seconds_bucket{le="1.0"} 2', text)
+        self.assertIn("latency_seconds_count 2", text)
+
+    def test_metrics_are_merged_from_the_snapshot_directory(self):
+        with tempfile.TemporaryDirectory() as directory:
+            other = metrics.Registry()
+            other.counter("auth0_responses_total", "", ["endpoint", "status"]).inc(
+                5, endpoint="userinfo", status="503"
+            )
+            Path(directory, "1-1.json").write_text(
+                json.dumps({**other.snapshot(), "pid": 1})
+            )
+            metrics.AUTH0_RESPONSES.inc(endpoint="userinfo", status="503")
+            own = metrics.AUTH0_RESPONSES.value(endpoint="userinfo", status="503")
+
+            with override_settings(ACCOUNTS_METRICS_DIR=directory):
+                body = metrics.render_metrics()
+
+        self.assertIn(
+            f'auth0_responses_total{{endpoint="userinfo",status="503"}} {own + 5}', body
+        )
+
+
+class Auth0StubTests(TestCase):
+    def setUp(self):
+        self.stub = Auth0StubServer().start()
+        self.addCleanup(self.stub.stop)
+        self.env = {
+            "AUTH0_DOMAIN": self.stub.url,
+            "AUTH0_CLIENT_ID": "bench-client",
+            "AUTH0_CLIENT_SECRET": "bench-secret",
+        }
+
+    def _post(self, password):
+        with mock.patch.dict(os.environ, self.env, clear=False):
+            return self.client.post(
+                "/api/login/",
+                data=json.dumps({"username": "jona", "password": password}),
+                content_type="application/json",
+            )
+
+    def test_domain_with_scheme_is_used_as_base_url(self):
+        config = Auth0Config(domain="http://127.0.0.1:8080/", client_id="id", client_secret="s")
+
+        self.assertEqual(config.base_url, "http://127.0.0.1:8080")
+        self.assertEqual(config.issuer, "http://127.0.0.1:8080/")
+
+    def test_login_round_trips_through_the_stub(self):
+        response = self._post("bench-password")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["user"]["first_name"], "Jona")
+        self.assertEqual(self.stub.requests, {"/oauth/token": 1, "/userinfo": 1})
+
+    def test_stub_rejects_wrong_passwords(self):
+        response = self._post("incorrecta")
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()["error"], "Wrong email or password.")
+
+
+class ApiDispatchTests(TestCase):
+    def _call(self, app, path, host="testserver"):
+        captured = {}
+
+        def start_response(status, headers, exc_info=None):
+            captured["status"] = int(status.split()[0])
+            captured["headers"] = dict(headers)
+
+        environ = {
+            "REQUEST_METHOD": "GET",
+            "PATH_INFO": path,
+            "SCRIPT_NAME": "",
+            "QUERY_STRING": "",
+            "SERVER_NAME": "testserver",
+            "SERVER_PORT": "80",
+            "HTTP_HOST": host,
+            "REMOTE_ADDR": "127.0.0.1",
+            "SERVER_PROTOCOL": "HTTP/1.1",
+            "wsgi.input": io.BytesIO(b""),
+            "wsgi.errors": io.StringIO(),
+            "wsgi.url_scheme": "http",
+        }
+        b"".join(app(environ, start_response))
+        return captured["status"], captured["headers"]
+
+    def test_api_requests_skip_the_admin_middleware(self):
+        application = get_dispatching_wsgi_application()
+
+        with self.assertLogs("django.request", "WARNING"):
+            status, headers = self._call(application, "/api/me/")
+
+        self.assertIsInstance(application, WSGIPrefixDispatcher)
+        self.assertEqual(status, 401)
+        self.assertIn("Server-Timing", headers)
+        self.assertNotIn("X-Frame-Options", headers)
+
+    def test_other_paths_keep_the_full_stack(self):
+        application = get_dispatching_wsgi_application()
+
+        status, headers = self._call(application, "/admin/login/")
+
+        self.assertEqual(status, 200)
+        self.assertEqual(headers["X-Frame-Options"], "DENY")
+
+    def test_api_chain_still_validates_the_host(self):
+        with self.assertLogs("django.security.DisallowedHost", "ERROR"):
+            status, _ = self._call(ApiWSGIHandler(), "/api/me/", host="evil.example")
+
+        self.assertEqual(status, 400)
+
+    @override_settings(API_FAST_PATH=False)
+    def test_fast_path_can_be_disabled(self):
+        self.assertNotIsInstance(get_dispatching_wsgi_application(), WSGIPrefixDispatcher)
+
+    def test_asgi_dispatcher_routes_http_requests_by_prefix(self):
+        calls = []
+
+        def app(name):
+            async def handler(scope, receive, send):
+                calls.append(name)
+
+            return handler
+
+        dispatcher = ASGIPrefixDispatcher(app("api"), app("default"), "/api/")
+
+        async def run():
+            await dispatcher({"type": "http", "path": "/api/login/"}, None, None)
+            await dispatcher({"type": "http", "path": "/admin/"}, None, None)
+            await dispatcher({"type": "lifespan"}, None, None)
+
+        asyncio.run(run())
+
+        self.assertEqual(calls, ["api", "default", "default"])
+
+
+@override_settings(
+    ACCOUNTS_LOGIN_RATE_LIMITING=True,
+    ACCOUNTS_LOGIN_RATE_IP="5/60",
+    ACCOUNTS_LOGIN_RATE_USERNAME="3/60",
+    ACCOUNTS_RATELIMIT_BACKEND="accounts.ratelimit.LocalCounterStore",
+    ACCOUNTS_RATELIMIT_SLOTS=1024,
+    ACCOUNTS_LOGIN_MAX_IN_FLIGHT=0,
+    ACCOUNTS_HASHING_WORKERS=0,
+)
+class RateLimitTests(TestCase):
+    def setUp(self):
+        get_user_model().objects.create_user(username="jona", password="secreto123")
+        patcher = mock.patch(
+            "accounts.views.authenticate_with_auth0", side_effect=Auth0ConfigurationError("")
+        )
+        self.auth0 = patcher.start()
+        self.addCleanup(patcher.stop)
+        # Stay inside one window so the sliding estimate does not decay.
+        clock = mock.patch("accounts.ratelimit.time.time", return_value=6000.0)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def _post(self, username="jona", password="incorrecta", **extra):
+        return self.client.post(
+            "/api/login/",
+            data=json.dumps({"username": username, "password": password}),
+            content_type="application/json",
+            **extra,
+        )
+
+    def test_parse_rate(self):
+        self.assertEqual(parse_rate("10/60"), (10, 60))
+        self.assertIsNone(parse_rate(""))
+        with self.assertRaises(ImproperlyConfigured):
+            parse_rate("10 per minute")
+
+    def test_sliding_window_weights_the_previous_window(self):
+        store = LocalCounterStore("test", 64)
+
+        for _ in range(4):
+            self.assertEqual(store.hit("key", (4, 60), now=6000.0), 0)
+        self.assertEqual(store.hit("key", (4, 60), now=6059.0), 2)
+        # Half way through the next window half of the old attempts still count.
+        self.assertEqual(store.hit("key", (4, 60), now=6090.0), 0)
+        self.assertEqual(store.hit("key", (4, 60), now=6090.0), 0)
+        self.assertGreater(store.hit("key", (4, 60), now=6090.0), 0)
+        self.assertEqual(store.hit("other", (4, 60), now=6090.0), 0)
+
+    def test_memory_does_not_grow_with_keys(self):
+        store = LocalCounterStore("test", 256)
+        size = len(store._cells())
+
+        for index in range(5000):
+            store.hit(f"10.0.{index // 256}.{index % 256}", (30, 60), now=6000.0)
+
+        self.assertEqual(len(store._cells()), size)
+
+    def test_username_limit_rejects_before_authenticating(self):
+        statuses = [self._post().status_code for _ in range(4)]
+
+        self.assertEqual(statuses, [401, 401, 401, 429])
+        self.assertEqual(self.auth0.call_count, 3)
+
+    def test_ip_limit_applies_across_usernames(self):
+        statuses = [self._post(username=f"user{index}").status_code for index in range(6)]
+        other_client = self._post(username="someone", REMOTE_ADDR="10.0.0.9")
+
+        self.assertEqual(statuses[-1], 429)
+        self.assertEqual(other_client.status_code, 401)
+        self.assertIn("Retry-After", self._post(username="user9"))
+
+    @override_settings(ACCOUNTS_TRUSTED_PROXY_COUNT=1)
+    def test_client_ip_comes_from_the_trusted_proxy(self):
+        for index in range(5):
+            self._post(username=f"user{index}", HTTP_X_FORWARDED_FOR="203.0.113.7")
+
+        blocked = self._post(username="user5", HTTP_X_FORWARDED_FOR="203.0.113.7")
+        other = self._post(username="user6", HTTP_X_FORWARDED_FOR="1.2.3.4, 203.0.113.8")
+
+        self.assertEqual(blocked.status_code, 429)
+        self.assertEqual(other.status_code, 401)
+
+    def test_concurrency_limit_sheds_load(self):
+        limit = ConcurrencyLimit(1)
+
+        self.assertTrue(limit.acquire())
+        self.assertFalse(limit.acquire())
+        limit.release()
+        self.assertTrue(limit.acquire())
+        self.assertEqual(limit.stats()["rejected"], 1)
+
+    def test_async_view_is_limited_too(self):
+        factory = AsyncRequestFactory()
+
+        async def attempt():
+            request = factory.post(
+                "/api/login/",
+                data=json.dumps({"username": "ana", "password": "x"}),
+                content_type="application/json",
+            )
+            return await alogin_view(request)
+
+        with mock.patch("accounts.views.aauthenticate_with_auth0") as authenticate, mock.patch(
+            "accounts.views.get_write_behind"
+        ):
+            authenticate.side_effect = Auth0AuthenticationError("Credenciales inválidas.", 401)
+            statuses = [asyncio.run(attempt()).status_code for _ in range(4)]
+
+        self.assertEqual(statuses, [401, 401, 401, 429])
+
+    def test_shared_store_is_visible_to_other_instances(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(ACCOUNTS_RATELIMIT_DIR=directory):
+                first = SharedCounterStore("ip", 64)
+                second = SharedCounterStore("ip", 64)
+
+                first.hit("10.0.0.1", (2, 60), now=6000.0)
+                first.hit("10.0.0.1", (2, 60), now=6000.0)
+
+                self.assertGreater(second.hit("10.0.0.1", (2, 60), now=6001.0), 0)
+
+
+class TokenRefreshTests(TestCase):
+    def setUp(self):
+        tokens._jwks_caches.clear()
+        views._synced_profiles.clear()
+        self.env = {
+            "AUTH0_DOMAIN": "refresh.auth0.com",
+            "AUTH0_CLIENT_ID": "client-id",
+            "AUTH0_CLIENT_SECRET": "client-secret",
+            "AUTH0_VERIFY_ID_TOKEN": "true",
+        }
+        self.grants = []
+        self.userinfo_calls = 0
+        self.subject = "auth0|123"
+
+    def _id_token(self):
+        claims = {
+            "iss": "https://refresh.auth0.com/",
+            "aud": "client-id",
+            "sub": self.subject,
+            "exp": int(time.time()) + 3600,
+            "given_name": "Jonathan",
+            "email": "j@example.com",
+        }
+        return _sign_jwt(claims, _TEST_KEY, _TEST_PRIVATE_EXPONENT)
+
+    def _fake_post(self, url, payload, timeout, pool=None):
+        self.grants.append(payload["grant_type"])
+        if payload["grant_type"] == "refresh_token" and payload["refresh_token"] != "refresh-1":
+            return 403, {"error": "invalid_grant", "error_description": "Unknown or invalid refresh token."}
+        return 200, {
+            "access_token": f"access-{len(self.grants)}",
+            "id_token": self._id_token(),
+            "token_type": "Bearer",
+            "expires_in": 86400,
+            **({"refresh_token": "refresh-1"} if payload["grant_type"] == "password" else {}),
+        }
+
+    def _fake_get_json(self, url, headers, timeout, pool=None):
+        if url.endswith("/.well-known/jwks.json"):
+            return 200, _jwks_for(_TEST_KEY)
+        self.userinfo_calls += 1
+        return 200, {"sub": self.subject, "given_name": "Desde", "email": "u@example.com"}
+
+    def _post(self, path, payload):
+        with mock.patch.dict(os.environ, self.env, clear=False), mock.patch(
+            "accounts.auth0._post_form_urlencoded", side_effect=self._fake_post
+        ), mock.patch("accounts.auth0._get_json", side_effect=self._fake_get_json):
+            return self.client.post(path, data=json.dumps(payload), content_type="application/json")
+
+    def _login(self):
+        response = self._post("/api/login/", {"username": "jona", "password": "200328"})
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_refresh_renews_tokens_and_rotates_the_session(self):
+        login_payload = self._login().json()
+        session_key = self.client.session.session_key
+
+        with mock.patch("accounts.views._sync_user_with_profile") as sync_user:
+            response = self._post("/api/token/refresh/", {"refresh_token": "refresh-1"})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(set(data), set(login_payload))
+        self.assertEqual(data["user"], login_payload["user"])
+        self.assertEqual(data["tokens"]["access_token"], "access-2")
+        self.assertEqual(data["tokens"]["refresh_token"], "refresh-1")
+        self.assertEqual(self.grants, ["password", "refresh_token"])
+        self.assertEqual(self.userinfo_calls, 0)
+        sync_user.assert_not_called()
+        self.assertNotEqual(self.client.session.session_key, session_key)
+        self.assertEqual(self.client.get("/api/me/").json()["user"]["username"], "jona")
+
+    def test_refresh_token_of_another_subject_is_rejected(self):
+        self._login()
+        self.subject = "auth0|999"
+
+        response = self._post("/api/token/refresh/", {"refresh_token": "refresh-1"})
+
+        self.assertEqual(response.status_code, 403)
+
+    def _legacy_session(self, subject=""):
+        user = get_user_model().objects.create_user(username="jona", password="secreto123")
+        if subject:
+            Auth0Identity.objects.create(user=user, subject=subject)
+        self.client.force_login(user)
+        return user
+
+    def test_sessions_without_a_subject_sync_the_profile(self):
+        self._legacy_session(subject="auth0|123")
+
+        response = self._post("/api/token/refresh/", {"refresh_token": "refresh-1"})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["user"]["first_name"], "Jonathan")
+        self.assertEqual(self.client.session[views.AUTH0_SUBJECT_SESSION_KEY], "auth0|123")
+
+    def test_sessions_without_a_subject_reject_tokens_of_another_subject(self):
+        user = self._legacy_session(subject="auth0|123")
+        self.subject = "auth0|999"
+        session_key = self.client.session.session_key
+
+        response = self._post("/api/token/refresh/", {"refresh_token": "refresh-1"})
+
+        self.assertEqual(response.status_code, 403)
+        user.refresh_from_db()
+        self.assertEqual(user.first_name, "")
+        self.assertEqual(Auth0Identity.objects.get(user=user).subject, "auth0|123")
+        self.assertEqual(self.client.session.session_key, session_key)
+        self.assertNotIn(views.AUTH0_SUBJECT_SESSION_KEY, self.client.session)
+
+    def test_users_never_bound_to_auth0_cannot_refresh(self):
+        self._legacy_session()
+
+        response = self._post("/api/token/refresh/", {"refresh_token": "refresh-1"})
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.grants, [])
+
+    def test_profile_without_a_subject_is_rejected(self):
+        user = self._legacy_session(subject="auth0|123")
+        session_key = self.client.session.session_key
+        result = Auth0Result(tokens={"access_token": "access"}, profile={"given_name": "Otro"})
+
+        with mock.patch("accounts.views.refresh_with_auth0", return_value=result):
+            response = self._post("/api/token/refresh/", {"refresh_token": "refresh-1"})
+
+        self.assertEqual(response.status_code, 502)
+        user.refresh_from_db()
+        self.assertEqual(user.first_name, "")
+        self.assertEqual(self.client.session.session_key, session_key)
+
+    def test_auth0_errors_are_passed_through(self):
+        self._login()
+
+        response = self._post("/api/token/refresh/", {"refresh_token": "stale"})
+
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(response.json()["error"], "Unknown or invalid refresh token.")
+
+    def test_requires_a_session_and_a_token(self):
+        self.assertEqual(
+            self._post("/api/token/refresh/", {"refresh_token": "refresh-1"}).status_code, 401
+        )
+        self._login()
+        self.assertEqual(self._post("/api/token/refresh/", {}).status_code, 400)
+        self.assertEqual(self.grants, ["password"])
+
+
+@override_settings(SESSION_ENGINE="accounts.sessions")
+class CachedSessionTests(TestCase):
+    def _session_queries(self, queries):
+        return [
+            query["sql"].split()[0]
+            for query in queries
+            if "django_session" in query["sql"]
+        ]
+
+    def _stored(self, data):
+        session = CachedSessionStore()
+        session.update(data)
+        session.save()
+        return session.session_key
+
+    def test_login_writes_the_session_once(self):
+        get_user_model().objects.create_user(username="jona", password="secreto123")
+
+        with override_settings(ACCOUNTS_HASHING_WORKERS=0), CaptureQueriesContext(
+            connection
+        ) as queries, mock.patch.dict(os.environ, {"AUTH0_DOMAIN": ""}, clear=False):
+            response = self.client.post(
+                "/api/login/",
+                data=json.dumps({"username": "jona", "password": "secreto123"}),
+                content_type="application/json",
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self._session_queries(queries), ["INSERT"])
+
+    def test_reads_are_served_from_the_cache(self):
+        key = self._stored({"answer": 42})
+
+        with self.assertNumQueries(0):
+            self.assertEqual(CachedSessionStore(key)["answer"], 42)
+
+    def test_cache_miss_falls_back_to_the_database(self):
+        key = self._stored({"answer": 42})
+        caches[settings.SESSION_CACHE_ALIAS].clear()
+
+        with self.assertNumQueries(1):
+            self.assertEqual(CachedSessionStore(key)["answer"], 42)
+
+    def test_saves_without_a_material_change_are_skipped(self):
+        key = self._stored({"answer": 42})
+
+        session = CachedSessionStore(key)
+        session["answer"] = 42
+        with self.assertNumQueries(0):
+            session.save()
+
+        session["answer"] = 43
+        with CaptureQueriesContext(connection) as queries:
+            session.save()
+        self.assertIn("UPDATE", self._session_queries(queries))
+
+    @override_settings(ACCOUNTS_SESSION_WRITE_INTERVAL=0)
+    def test_expiry_is_written_once_it_falls_behind(self):
+        key = self._stored({"answer": 42})
+
+        session = CachedSessionStore(key)
+        session["answer"] = 42
+        with CaptureQueriesContext(connection) as queries:
+            session.save()
+        self.assertIn("UPDATE", self._session_queries(queries))
+
+    def test_cycle_key_is_deferred_to_save(self):
+        key = self._stored({"answer": 42})
+        session = CachedSessionStore(key)
+
+        with self.assertNumQueries(0):
+            session.cycle_key()
+        with CaptureQueriesContext(connection) as queries:
+            session.save()
+
+        self.assertNotEqual(session.session_key, key)
+        self.assertEqual(self._session_queries(queries), ["INSERT", "DELETE"])
+        self.assertFalse(CachedSessionStore().exists(key))
+        self.assertEqual(CachedSessionStore(session.session_key)["answer"], 42)
+
+    def test_deleted_sessions_are_evicted(self):
+        key = self._stored({"answer": 42})
+
+        CachedSessionStore(key).delete()
+
+        self.assertEqual(CachedSessionStore(key).load(), {})
+
+
+class ImportAuth0UsersTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        self.records = [
+            {
+                "user_id": f"auth0|{index}",
+                "email": f"user{index}@example.com",
+                "given_name": f"Nombre{index}",
+                "family_name": "Apellido",
+                "created_at": "2024-01-02T03:04:05.000Z",
+            }
+            for index in range(25)
+        ]
+
+    def _write(self, name, records, *, array=False):
+        path = self.directory / name
+        if array:
+            text = json.dumps(records, indent=1)
+        else:
+            text = "\n".join(json.dumps(record) for record in records) + "\n"
+        data = text.encode("utf-8")
+        path.write_bytes(gzip.compress(data) if name.endswith(".gz") else data)
+        return str(path)
+
+    def _import(self, path, *args):
+        out = io.StringIO()
+        call_command("import_auth0_users", path, "--batch-size", "10", *args, stdout=out)
+        return out.getvalue()
+
+    def test_imports_gzipped_json_lines(self):
+        output = self._import(self._write("users.jsonl.gz", self.records))
+
+        self.assertIn("created=25", output)
+        user = get_user_model().objects.get(username="user3@example.com")
+        self.assertEqual((user.first_name, user.last_name), ("Nombre3", "Apellido"))
+        self.assertFalse(user.has_usable_password())
+        self.assertEqual(user.date_joined.year, 2024)
+        self.assertEqual(
+            user.auth0_identity.profile_fingerprint,
+            profile_fingerprint(normalize_profile(user.username, self.records[3])),
+        )
+        self.assertEqual(user.auth0_identity.subject, "auth0|3")
+
+    def test_second_run_only_updates_changed_profiles(self):
+        self._import(self._write("users.jsonl", self.records))
+        self.records[0]["given_name"] = "Cambiado"
+        self.records[1]["family_name"] = ""
+
+        with CaptureQueriesContext(connection) as queries:
+            output = self._import(self._write("users.json", self.records, array=True))
+
+        self.assertIn("created=0 updated=2 unchanged=23", output)
+        self.assertEqual(
+            get_user_model().objects.get(username="user0@example.com").first_name, "Cambiado"
+        )
+        # Empty values never clear a field, as on login.
+        self.assertEqual(
+            get_user_model().objects.get(username="user1@example.com").last_name, "Apellido"
+        )
+        self.assertLess(len(queries), 20)
+
+    def test_dry_run_writes_nothing(self):
+        output = self._import(self._write("users.jsonl", self.records), "--dry-run")
+
+        self.assertIn("dry-run", output)
+        self.assertIn("created=25", output)
+        self.assertFalse(get_user_model().objects.exists())
+
+    def test_resume_skips_committed_batches(self):
+        path = self._write("users.jsonl", self.records)
+        Path(f"{path}.checkpoint").write_text(json.dumps({"records": 20}))
+
+        output = self._import(path, "--resume")
+
+        self.assertIn("created=5", output)
+        self.assertEqual(get_user_model().objects.count(), 5)
+        self.assertFalse(Path(f"{path}.checkpoint").exists())
+
+    def test_json_arrays_are_parsed_across_chunks(self):
+        stream = io.StringIO(' [ {"a": 1}, {"b": [2, 3]} ,\n 4.5, {"c": "]"} ]')
+
+        with mock.patch.object(import_auth0_users, "_CHUNK_SIZE", 3):
+            items = list(import_auth0_users._iter_json_array(stream))
+
+        self.assertEqual(items, [{"a": 1}, {"b": [2, 3]}, 4.5, {"c": "]"}])
+
+
+class ManagementAPITests(TestCase):
+    def setUp(self):
+        self.config = auth0.Auth0Config(
+            domain="servigenman-mgmt.auth0.com",
+            client_id="client-id",
+            client_secret="client-secret",
+        )
+        self.sleeps = []
+        self.client_api = ManagementClient(self.config, sleep=self.sleeps.append)
+        self.addCleanup(self.client_api.close)
+        self.tenant = {
+            f"auth0|{index}": {
+                "user_id": f"auth0|{index}",
+                "email": f"user{index}@example.com",
+                "given_name": f"Nombre{index}",
+                "family_name": "Apellido",
+            }
+            for index in range(120)
+        }
+
+    def _token(self, *args, **kwargs):
+        return (200, {"access_token": "m2m", "expires_in": 86400, "token_type": "Bearer"})
+
+    def _search(self, url, headers, timeout, pool=None):
+        params = parse_qs(urlsplit(url).query)
+        ids = re.findall(r'"([^"]+)"', params["q"][0])
+        found = [self.tenant[user_id] for user_id in ids if user_id in self.tenant]
+        page, per_page = int(params["page"][0]), int(params["per_page"][0])
+        users = found[page * per_page : (page + 1) * per_page]
+        return 200, {"users": users, "total": len(found), "start": page * per_page}
+
+    def test_token_is_reused_until_shortly_before_expiry(self):
+        now = [1000.0]
+        fetch = mock.Mock(return_value={"access_token": "first", "expires_in": 600})
+        token = ManagementToken(fetch, refresh_margin=60, clock=lambda: now[0])
+
+        self.assertEqual(token.get(), "first")
+        now[0] += 539
+        self.assertEqual(token.get(), "first")
+        fetch.return_value = {"access_token": "second", "expires_in": 600}
+        now[0] += 1
+        self.assertEqual(token.get(), "second")
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_concurrent_callers_share_one_token_request(self):
+        release = threading.Event()
+
+        def fetch():
+            release.wait(5)
+            return {"access_token": "shared", "expires_in": 3600}
+
+        token = ManagementToken(fetch)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(token.get())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        release.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(results, ["shared"] * 8)
+        self.assertEqual(token.fetches, 1)
+
+    def test_users_are_searched_in_batches(self):
+        wanted = [f"auth0|{index}" for index in range(110)] + ["auth0|gone"]
+
+        with mock.patch(
+            "accounts.management_api._post_form_urlencoded", side_effect=self._token
+        ) as token_post, mock.patch(
+            "accounts.management_api._get_json", side_effect=self._search
+        ) as search:
+            users = self.client_api.users_by_id(wanted)
+
+        self.assertEqual(len(users), 110)
+        self.assertEqual(users["auth0|42"]["given_name"], "Nombre42")
+        self.assertEqual(search.call_count, 3)
+        self.assertEqual(token_post.call_count, 1)
+        self.assertEqual(
+            token_post.call_args.args[1]["audience"], "https://servigenman-mgmt.auth0.com/api/v2/"
+        )
+        self.assertEqual(search.call_args.args[1]["Authorization"], "Bearer m2m")
+
+    def test_query_quotes_ids(self):
+        self.assertEqual(
+            user_id_query(['auth0|1', 'odd"id']), 'user_id:("auth0|1" OR "odd\\"id")'
+        )
+
+    def test_rejected_token_is_renewed_and_rate_limits_back_off(self):
+        responses = [(401, {}), (429, {"message": "Too Many Requests"}), (200, {"users": []})]
+
+        with mock.patch(
+            "accounts.management_api._post_form_urlencoded", side_effect=self._token
+        ) as token_post, mock.patch(
+            "accounts.management_api._get_json", side_effect=responses
+        ):
+            self.assertEqual(list(self.client_api.search_users(["auth0|1"])), [])
+
+        self.assertEqual(token_post.call_count, 2)
+        self.assertEqual(self.sleeps, [1.0])
+
+    def test_network_failures_back_off_like_a_503(self):
+        down = auth0.Auth0AuthenticationError("No se pudo conectar con Auth0.", status_code=503)
+
+        with mock.patch(
+            "accounts.management_api._post_form_urlencoded", side_effect=self._token
+        ), mock.patch(
+            "accounts.management_api._get_json", side_effect=[down, down, (200, {"users": []})]
+        ):
+            self.assertEqual(list(self.client_api.search_users(["auth0|1"])), [])
+
+        self.assertEqual(self.sleeps, [1.0, 2.0])
+
+    def test_refresh_command_reports_an_unreachable_tenant(self):
+        views._synced_profiles.clear()
+        record = self.tenant["auth0|1"]
+        views._sync_user_with_profile(
+            record["email"], normalize_profile(record["email"], record), "auth0|1"
+        )
+        down = auth0.Auth0AuthenticationError("No se pudo conectar con Auth0.", status_code=503)
+
+        with mock.patch(
+            "accounts.management.commands.refresh_auth0_profiles.get_management_client",
+            return_value=self.client_api,
+        ), mock.patch(
+            "accounts.management_api._post_form_urlencoded", side_effect=down
+        ), self.assertRaisesMessage(CommandError, "(503): No se pudo conectar con Auth0."):
+            call_command("refresh_auth0_profiles", stdout=io.StringIO())
+
+        self.assertEqual(self.sleeps, [1.0, 2.0, 4.0])
+
+    def test_refresh_command_updates_changed_profiles(self):
+        views._synced_profiles.clear()
+        for index in range(60):
+            record = dict(self.tenant[f"auth0|{index}"], given_name="Viejo")
+            username = record["email"]
+            views._sync_user_with_profile(
+                username, normalize_profile(username, record), record["user_id"]
+            )
+        Auth0Identity.objects.filter(user__username="user7@example.com").update(
+            subject="auth0|gone"
+        )
+        self.tenant["auth0|3"]["given_name"] = "Viejo"
+
+        out = io.StringIO()
+        with mock.patch(
+            "accounts.management.commands.refresh_auth0_profiles.get_management_client",
+            return_value=self.client_api,
+        ), mock.patch(
+            "accounts.management_api._post_form_urlencoded", side_effect=self._token
+        ), mock.patch(
+            "accounts.management_api._get_json", side_effect=self._search
+        ):
+            call_command("refresh_auth0_profiles", "--batch-size", "50", stdout=out)
+
+        self.assertIn("processed=60 updated=58 unchanged=1 missing=1 requests=2", out.getvalue())
+        user = get_user_model().objects.get(username="user42@example.com")
+        self.assertEqual(user.first_name, "Nombre42")
+        profile = normalize_profile(user.username, self.tenant["auth0|42"])
+        self.assertEqual(
+            user.auth0_identity.profile_fingerprint, profile_fingerprint(profile)
+        )
+
+
+class WarmupTests(TestCase):
+    def setUp(self):
+        self.env = {
+            "AUTH0_DOMAIN": "servigenman-warmup.auth0.com",
+            "AUTH0_CLIENT_ID": "client-id",
+            "AUTH0_CLIENT_SECRET": "client-secret",
+            "AUTH0_VERIFY_ID_TOKEN": "True",
+        }
+        warmup._prepared = False
+        warmup._connected_pid = None
+        self.addCleanup(auth0.thaw_auth0_config)
+
+    @mock.patch("accounts.auth0._get_json")
+    def test_prepare_freezes_config_and_prefetches_jwks(self, mock_get):
+        mock_get.return_value = (200, _jwks_for(_TEST_KEY))
+
+        with mock.patch.dict(os.environ, self.env):
+            warmup.prepare()
+            config = auth0.load_auth0_config()
+        with mock.patch.dict(os.environ, {"AUTH0_DOMAIN": "otro.auth0.com"}):
+            self.assertIs(auth0.load_auth0_config(), config)
+
+        self.assertEqual(config.domain, "servigenman-warmup.auth0.com")
+        self.assertIsNotNone(tokens.get_jwks_cache(config.jwks_url).lookup("test-key"))
+        self.assertIn("urlconf", warmup.timings)
+
+    def test_prepare_runs_once(self):
+        with mock.patch.object(warmup, "_import_urlconf") as import_urlconf:
+            warmup.prepare()
+            warmup.prepare()
+
+        import_urlconf.assert_called_once()
+
+    def test_failed_steps_are_skipped(self):
+        with mock.patch("accounts.auth0.PoolManager.prewarm", side_effect=OSError("down")):
+            with mock.patch.dict(os.environ, self.env), self.assertLogs(
+                "accounts.warmup", "WARNING"
+            ):
+                warmup.connect()
+
+        self.assertIn("database", warmup.timings)
+        self.assertTrue(connection.is_usable())
+
+    def test_building_the_application_warms_up(self):
+        from core.dispatch import get_dispatching_wsgi_application
+
+        with override_settings(ACCOUNTS_WARMUP=True), mock.patch.object(
+            warmup, "prepare"
+        ) as prepare, mock.patch.object(warmup, "connect") as connect:
+            get_dispatching_wsgi_application()
+
+        prepare.assert_called_once()
+        connect.assert_called_once()
+
+    def test_hashing_workers_do_not_warm_up(self):
+        # A spawned worker is a fresh interpreter that only runs django.setup().
+        child = (
+            "import json\n"
+            "from accounts.hashing import _init_worker\n"
+            "_init_worker()\n"
+            "from accounts import warmup\n"
+            "print(json.dumps(sorted(warmup.timings)))\n"
+        )
+        env = {
+            **os.environ,
+            **self.env,
+            "DJANGO_SETTINGS_MODULE": "core.settings",
+            "DJANGO_WARMUP": "True",
+        }
+        completed = subprocess.run(
+            [sys.executable, "-c", child],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+            timeout=60,
+        )
+
+        self.assertEqual(completed.returncode, 0, completed.stderr)
+        self.assertEqual(json.loads(completed.stdout.splitlines()[-1]), [])
@@ -0,0 +1,367 @@
+"""Local verification of Auth0-issued RS256 JSON Web Tokens.
+
+Only the pieces Auth0 actually uses are implemented: compact JWS with the
+``RS256`` algorithm, keys published as a JWKS document, and the standard
+``iss``/``aud``/``exp``/``nbf`` claims. RSA verification is done with plain
+integer arithmetic, so no cryptography package is required.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# DER encoding of the DigestInfo prefix for SHA-256 (RFC 8017, section 9.2).
+_SHA256_DIGEST_INFO = bytes.fromhex("3031300d060960864801650304020105000420")
+
+
+class TokenVerificationError(Exception):
+    """Raised when a JWT cannot be decoded or fails verification."""
+
+
+@dataclass(frozen=True)
+class RSAPublicKey:
+    n: int
+    e: int
+
+    @property
+    def size(self) -> int:
+        return (self.n.bit_length() + 7) // 8
+
+    @classmethod
+    def from_jwk(cls, jwk: Dict[str, Any]) -> "RSAPublicKey":
+        return cls(
+            n=int.from_bytes(b64url_decode(jwk["n"]), "big"),
+            e=int.from_bytes(b64url_decode(jwk["e"]), "big"),
+        )
+
+
+def b64url_decode(value: str) -> bytes:
+    padding = "=" * (-len(value) % 4)
+    try:
+        return base64.urlsafe_b64decode(value + padding)
+    except (ValueError, TypeError) as exc:
+        raise TokenVerificationError("Malformed base64url segment.") from exc
+
+
+def rsa_sha256_verify(key: RSAPublicKey, message: bytes, signature: bytes) -> bool:
+    """Verify an RSASSA-PKCS1-v1_5 SHA-256 signature."""
+
+    size = key.size
+    if len(signature) != size:
+        return False
+
+    signed = int.from_bytes(signature, "big")
+    if signed >= key.n:
+        return False
+
+    encoded = pow(signed, key.e, key.n).to_bytes(size, "big")
+    digest_info = _SHA256_DIGEST_INFO + hashlib.sha256(message).digest()
+    padding_length = size - len(digest_info) - 3
+    if padding_length < 8:
+        return False
+
+    expected = b"\x00\x01" + b"\xff" * padding_length + b"\x00" + digest_info
+    return hmac.compare_digest(encoded, expected)
+
+
+def decode_unverified(token: str) -> Tuple[Dict[str, Any], Dict[str, Any], bytes, bytes]:
+    """Split a compact JWS into ``(header, claims, signing_input, signature)``."""
+
+    if not isinstance(token, str) or token.count(".") != 2:
+        raise TokenVerificationError("Malformed token.")
+
+    header_segment, claims_segment, signature_segment = token.split(".")
+    try:
+        header = json.loads(b64url_decode(header_segment))
+        claims = json.loads(b64url_decode(claims_segment))
+    except ValueError as exc:
+        raise TokenVerificationError("Malformed token.") from exc
+
+    if not isinstance(header, dict) or not isinstance(claims, dict):
+        raise TokenVerificationError("Malformed token.")
+
+    signing_input = f"{header_segment}.{claims_segment}".encode("ascii")
+    return header, claims, signing_input, b64url_decode(signature_segment)
+
+
+def validate_claims(
+    claims: Dict[str, Any],
+    *,
+    issuer: str,
+    audience: Iterable[str],
+    leeway: float = 60.0,
+    now: Optional[float] = None,
+) -> None:
+    now = time.time() if now is None else now
+
+    if claims.get("iss") != issuer:
+        raise TokenVerificationError("Unexpected token issuer.")
+
+    token_audience = claims.get("aud")
+    if isinstance(token_audience, str):
+        token_audience = [token_audience]
+    if not isinstance(token_audience, list) or not set(token_audience) & set(audience):
+        raise TokenVerificationError("Unexpected token audience.")
+
+    expires_at = claims.get("exp")
+    if not isinstance(expires_at, (int, float)) or expires_at + leeway < now:
+        raise TokenVerificationError("Token has expired.")
+
+    not_before = claims.get("nbf")
+    if isinstance(not_before, (int, float)) and not_before - leeway > now:
+        raise TokenVerificationError("Token is not valid yet.")
+
+
+def _check_signature(
+    header: Dict[str, Any], signing_input: bytes, signature: bytes, key: RSAPublicKey
+) -> None:
+    if header.get("alg") != "RS256":
+        raise TokenVerificationError("Unsupported token algorithm.")
+    if not rsa_sha256_verify(key, signing_input, signature):
+        raise TokenVerificationError("Invalid token signature.")
+
+
+class JWKSCache:
+    """Public keys from a JWKS document, indexed by ``kid``.
+
+    Keys are kept for ``ttl`` seconds. An unknown ``kid`` triggers a refresh
+    (to pick up rotated keys), but at most once every
+    ``min_refresh_interval`` seconds so forged tokens cannot be used to
+    hammer the JWKS endpoint. Once a lookup lands within ``refresh_margin``
+    seconds of expiry the keys are refetched on a background thread while
+    the cached ones keep being served.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 600.0,
+        min_refresh_interval: float = 30.0,
+        refresh_margin: Optional[float] = None,
+    ) -> None:
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.refresh_margin = ttl / 10 if refresh_margin is None else refresh_margin
+        self._keys: Dict[str, RSAPublicKey] = {}
+        self._expires_at = 0.0
+        self._fetched_at = 0.0
+        self._refreshing = False
+        self._refresh_task: Optional["asyncio.Task[None]"] = None
+        self._lock = threading.Lock()
+
+    def update(self, jwks: Dict[str, Any]) -> None:
+        keys: Dict[str, RSAPublicKey] = {}
+        for jwk in jwks.get("keys") or []:
+            if not isinstance(jwk, dict) or jwk.get("kty") != "RSA":
+                continue
+            if jwk.get("use", "sig") != "sig" or "kid" not in jwk:
+                continue
+            try:
+                keys[jwk["kid"]] = RSAPublicKey.from_jwk(jwk)
+            except (KeyError, TokenVerificationError):
+                continue
+
+        now = time.monotonic()
+        with self._lock:
+            self._keys = keys
+            self._fetched_at = now
+            self._expires_at = now + self.ttl
+
+    def lookup(self, kid: str) -> Optional[RSAPublicKey]:
+        """Return a cached key without doing any I/O."""
+
+        with self._lock:
+            if time.monotonic() >= self._expires_at:
+                return None
+            return self._keys.get(kid)
+
+    def _may_refresh(self) -> bool:
+        with self._lock:
+            now = time.monotonic()
+            return now >= self._expires_at or (
+                now - self._fetched_at >= self.min_refresh_interval
+            )
+
+    def _claim_background_refresh(self) -> bool:
+        with self._lock:
+            if self._refreshing or time.monotonic() < self._expires_at - self.refresh_margin:
+                return False
+            self._refreshing = True
+            return True
+
+    def _background_refresh(self, fetch: Callable[[], Dict[str, Any]]) -> None:
+        try:
+            self.update(fetch())
+        except Exception:  # pragma: no cover - keep serving the cached keys
+            logger.warning("Background JWKS refresh failed.", exc_info=True)
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    async def _abackground_refresh(
+        self, fetch: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> None:
+        try:
+            self.update(await fetch())
+        except Exception:  # pragma: no cover - keep serving the cached keys
+            logger.warning("Background JWKS refresh failed.", exc_info=True)
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def refresh_in_background(self, fetch: Callable[[], Dict[str, Any]]) -> None:
+        """Refetch the keys on a daemon thread if they are close to expiring."""
+
+        if self._claim_background_refresh():
+            threading.Thread(
+                target=self._background_refresh,
+                args=(fetch,),
+                name="jwks-refresh",
+                daemon=True,
+            ).start()
+
+    def get_key(self, kid: str, fetch: Callable[[], Dict[str, Any]]) -> RSAPublicKey:
+        key = self.lookup(kid)
+        if key is not None:
+            self.refresh_in_background(fetch)
+        elif self._may_refresh():
+            self.update(fetch())
+            key = self.lookup(kid)
+        if key is None:
+            raise TokenVerificationError("Unknown signing key.")
+        return key
+
+    async def aget_key(
+        self, kid: str, fetch: Callable[[], Awaitable[Dict[str, Any]]]
+    ) -> RSAPublicKey:
+        key = self.lookup(kid)
+        if key is not None:
+            if self._claim_background_refresh():
+                self._refresh_task = asyncio.get_running_loop().create_task(
+                    self._abackground_refresh(fetch)
+                )
+        elif self._may_refresh():
+            self.update(await fetch())
+            key = self.lookup(kid)
+        if key is None:
+            raise TokenVerificationError("Unknown signing key.")
+        return key
+
+    @property
+    def expires_at(self) -> float:
+        return self._expires_at
+
+
+class VerifiedTokenCache:
+    """A size-bounded LRU of already verified tokens.
+
+    Entries are keyed by the SHA-256 of the token, so raw credentials are not
+    kept in memory, and they expire together with the token's ``exp``.
+    """
+
+    def __init__(self, maxsize: int = 10000) -> None:
+        self.maxsize = max(1, maxsize)
+        self._entries: "OrderedDict[bytes, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode("utf-8")).digest()
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        key = self._key(token)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, token: str, claims: Dict[str, Any]) -> None:
+        expires_at = claims.get("exp")
+        if not isinstance(expires_at, (int, float)):
+            return
+
+        key = self._key(token)
+        with self._lock:
+            self._entries[key] = (float(expires_at), claims)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_jwks_caches: Dict[str, JWKSCache] = {}
+_jwks_lock = threading.Lock()
+
+
+def get_jwks_cache(jwks_url: str, ttl: float = 600.0) -> JWKSCache:
+    """Return the process-wide cache for ``jwks_url``."""
+
+    with _jwks_lock:
+        cache = _jwks_caches.get(jwks_url)
+        if cache is None:
+            cache = JWKSCache(ttl=ttl)
+            _jwks_caches[jwks_url] = cache
+        return cache
+
+
+def verify_jwt(
+    token: str,
+    *,
+    jwks: JWKSCache,
+    fetch: Callable[[], Dict[str, Any]],
+    issuer: str,
+    audience: Iterable[str],
+    leeway: float = 60.0,
+) -> Dict[str, Any]:
+    """Verify an RS256 token and return its claims."""
+
+    header, claims, signing_input, signature = decode_unverified(token)
+    key = jwks.get_key(str(header.get("kid", "")), fetch)
+    _check_signature(header, signing_input, signature, key)
+    validate_claims(claims, issuer=issuer, audience=audience, leeway=leeway)
+    return claims
+
+
+async def averify_jwt(
+    token: str,
+    *,
+    jwks: JWKSCache,
+    fetch: Callable[[], Awaitable[Dict[str, Any]]],
+    issuer: str,
+    audience: Iterable[str],
+    leeway: float = 60.0,
+) -> Dict[str, Any]:
+    """Async version of :func:`verify_jwt`; only the JWKS fetch awaits."""
+
+    header, claims, signing_input, signature = decode_unverified(token)
+    key = await jwks.aget_key(str(header.get("kid", "")), fetch)
+    _check_signature(header, signing_input, signature, key)
+    validate_claims(claims, issuer=issuer, audience=audience, leeway=leeway)
+    return claims
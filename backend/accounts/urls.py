@@ -1,9 +1,28 @@
+from django.conf import settings
 from django.urls import path
 
-from .views import login_view
+from .views import (
+    alogin_view,
+    atoken_refresh_view,
+    login_view,
+    me_view,
+    metrics_view,
+    token_refresh_view,
+)
 
 app_name = "accounts"
 
 urlpatterns = [
-    path("login/", login_view, name="login"),
+    path(
+        "login/",
+        alogin_view if settings.ACCOUNTS_ASYNC_VIEWS else login_view,
+        name="login",
+    ),
+    path(
+        "token/refresh/",
+        atoken_refresh_view if settings.ACCOUNTS_ASYNC_VIEWS else token_refresh_view,
+        name="token_refresh",
+    ),
+    path("me/", me_view, name="me"),
+    path("metrics/", metrics_view, name="metrics"),
 ]
@@ -1,15 +1,46 @@
 import json
-from typing import Dict, Optional
+import time
+from typing import Any, Dict, Optional, Tuple
 
+from asgiref.sync import sync_to_async
+from django.conf import settings
 from django.contrib.auth import authenticate, get_user_model, login
-from django.http import JsonResponse
+from django.contrib.auth.signals import user_login_failed
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_GET, require_POST
 
 from .auth0 import (
     Auth0AuthenticationError,
     Auth0ConfigurationError,
+    Auth0Result,
+    Auth0UnavailableError,
+    aauthenticate_with_auth0,
+    arefresh_with_auth0,
     authenticate_with_auth0,
+    refresh_with_auth0,
+)
+from .hashing import MODEL_BACKEND, PasswordCheckBusy, get_password_check_pool
+from .lru import LRUCache
+from .metrics import LOGINS_THROTTLED, render_metrics, timed
+from .models import Auth0Identity, LoginEvent
+from .profiles import (
+    apply_profile,
+    identity_current,
+    normalize_profile,
+    profile_fingerprint,
+)
+from .ratelimit import client_ip, get_login_concurrency, get_login_rate_limiter
+from .writebehind import get_write_behind
+
+# Session key holding the Auth0 ``sub`` the session was opened for.
+AUTH0_SUBJECT_SESSION_KEY = "_auth0_sub"
+
+# username -> (fingerprint, Auth0 subject) last written for that user. Lets a
+# login with an unchanged profile skip the identity join.
+_synced_profiles: LRUCache[str, Tuple[str, str]] = LRUCache(
+    maxsize=getattr(settings, "ACCOUNTS_PROFILE_CACHE_SIZE", 10000)
 )
 
 
@@ -20,47 +51,38 @@ def _parse_payload(request):
         return None
 
 
-def _normalize_profile(
-    username: str, profile: Optional[Dict[str, object]]
-) -> Dict[str, str]:
-    """Extract a sanitized payload from the Auth0 profile response."""
-
-    def _coerce(value: object) -> str:
-        return str(value).strip() if isinstance(value, str) else ""
-
-    first_name = ""
-    last_name = ""
-    email = ""
+def _sync_user_with_profile(username: str, profile: Dict[str, str], subject: str = ""):
+    """Ensure a Django user exists for the authenticated Auth0 identity.
 
-    if profile:
-        first_name = _coerce(profile.get("given_name"))
-        last_name = _coerce(profile.get("family_name"))
-        email = _coerce(profile.get("email"))
-
-        if not first_name and profile.get("name"):
-            full_name = _coerce(profile.get("name"))
-            if full_name:
-                parts = full_name.split()
-                first_name = parts[0]
-                if len(parts) > 1 and not last_name:
-                    last_name = " ".join(parts[1:])
-
-        if not first_name and profile.get("nickname"):
-            first_name = _coerce(profile.get("nickname"))
-
-    return {
-        "username": username,
-        "first_name": first_name,
-        "last_name": last_name,
-        "email": email,
-    }
+    Users whose profile matches the stored fingerprint are returned after a
+    single indexed read and no writes. An empty ``subject`` leaves the stored
+    one alone.
+    """
 
+    user_model = get_user_model()
+    fingerprint = profile_fingerprint(profile)
+
+    if _synced_profiles.get(username) == (fingerprint, subject):
+        user = user_model.objects.filter(username=username).first()
+        if user is not None:
+            return user
+        _synced_profiles.discard(username)
+
+    user = (
+        user_model.objects.select_related("auth0_identity")
+        .filter(username=username)
+        .first()
+    )
+    identity = getattr(user, "auth0_identity", None) if user is not None else None
 
-def _sync_user_with_profile(username: str, profile: Dict[str, str]):
-    """Ensure a Django user exists for the authenticated Auth0 identity."""
+    if identity is not None and identity_current(identity, fingerprint, subject):
+        _synced_profiles.put(username, (fingerprint, subject))
+        return user
 
-    user_model = get_user_model()
-    user, created = user_model.objects.get_or_create(username=username)
+    if user is None:
+        user, created = user_model.objects.get_or_create(username=username)
+    else:
+        created = False
 
     update_fields: list[str] = []
 
@@ -68,21 +90,30 @@ def _sync_user_with_profile(username: str, profile: Dict[str, str]):
         user.set_unusable_password()
         update_fields.append("password")
 
-    for field in ("first_name", "last_name", "email"):
-        value = profile.get(field, "")
-        if value and getattr(user, field) != value:
-            setattr(user, field, value)
-            update_fields.append(field)
+    update_fields.extend(apply_profile(user, profile))
 
     if update_fields:
         user.save(update_fields=list(dict.fromkeys(update_fields)))
 
+    if identity is None:
+        defaults = {"profile_fingerprint": fingerprint}
+        if subject:
+            defaults["subject"] = subject
+        Auth0Identity.objects.update_or_create(user=user, defaults=defaults)
+    else:
+        identity.profile_fingerprint = fingerprint
+        identity.subject = subject or identity.subject
+        identity.save(update_fields=["profile_fingerprint", "subject"])
+
+    _synced_profiles.put(username, (fingerprint, subject))
     return user
 
 
-def _build_response_payload(user_profile: Dict[str, str], tokens: Dict[str, object]):
+def _build_response_payload(
+    user_profile: Dict[str, str], tokens: Dict[str, object], message: str = "Login successful."
+):
     payload: Dict[str, object] = {
-        "message": "Login successful.",
+        "message": message,
         "user": user_profile,
     }
 
@@ -99,52 +130,462 @@ def _build_response_payload(user_profile: Dict[str, str], tokens: Dict[str, obje
     return payload
 
 
-@csrf_exempt
-@require_POST
-def login_view(request):
-    """Authenticate an existing user using username/password credentials."""
-
-    payload = _parse_payload(request)
+def _read_credentials(request) -> Tuple[Optional[Tuple[str, str]], Optional[JsonResponse]]:
+    with timed("parse"):
+        payload = _parse_payload(request)
     if payload is None:
-        return JsonResponse({"error": "Invalid JSON payload."}, status=400)
+        return None, JsonResponse({"error": "Invalid JSON payload."}, status=400)
 
     username = (payload.get("username") or payload.get("usuario") or "").strip()
     password_raw = payload.get("password")
     password = password_raw if isinstance(password_raw, str) else ""
 
     if not username or not password:
-        return JsonResponse(
+        return None, JsonResponse(
             {"error": "Username and password are required."}, status=400
         )
 
+    return (username, password), None
+
+
+def _login_event(
+    username: str, source: str, status_code: int, started: float, user=None
+) -> Dict[str, Any]:
+    return {
+        "user_id": getattr(user, "pk", None),
+        "username": username,
+        "source": source,
+        "outcome": (
+            LoginEvent.OUTCOME_SUCCESS if status_code == 200 else LoginEvent.OUTCOME_FAILURE
+        ),
+        "status_code": status_code,
+        "latency_ms": (time.perf_counter() - started) * 1000,
+    }
+
+
+def _record_login(event: Dict[str, Any], *, on_commit: bool = True) -> None:
+    """Queue an audit event, by default once the surrounding transaction commits.
+
+    Async callers that did no database work pass ``on_commit=False``:
+    ``transaction.on_commit`` needs a connection, which the event loop
+    thread must not touch.
+    """
+
+    if not settings.ACCOUNTS_WRITE_BEHIND:
+        return
+    if on_commit:
+        transaction.on_commit(lambda: get_write_behind().record_login_event(**event))
+    else:
+        get_write_behind().record_login_event(**event)
+
+
+def _complete_auth0_login(
+    request, username: str, auth0_result: Auth0Result, started: float
+):
+    profile = normalize_profile(username, auth0_result.profile)
+    subject = (auth0_result.profile or {}).get("sub")
+    with timed("sync_user"):
+        user = _sync_user_with_profile(
+            username, profile, subject if isinstance(subject, str) else ""
+        )
+    with timed("login"):
+        login(request, user)
+    if subject:
+        request.session[AUTH0_SUBJECT_SESSION_KEY] = subject
+    _record_login(_login_event(username, LoginEvent.SOURCE_AUTH0, 200, started, user))
+    return JsonResponse(_build_response_payload(profile, auth0_result.tokens))
+
+
+def _local_user(username: str):
+    user_model = get_user_model()
+    try:
+        return user_model._default_manager.get_by_natural_key(username)
+    except user_model.DoesNotExist:
+        return None
+
+
+def _accept_local_user(request, username: str, user, valid: bool, rehashed: Optional[str]):
+    """Apply the outcome of an offloaded password check like ``ModelBackend`` would."""
+
+    if user is not None and valid and rehashed:
+        user.password = rehashed
+        user.save(update_fields=["password"])
+
+    if user is None or not valid or not user.is_active:
+        user_login_failed.send(
+            sender=__name__, credentials={"username": username}, request=request
+        )
+        return None
+
+    user.backend = MODEL_BACKEND
+    return user
+
+
+def _password_check_busy(username: str, started: float, *, on_commit: bool = True) -> JsonResponse:
+    _record_login(
+        _login_event(username, LoginEvent.SOURCE_LOCAL, 503, started), on_commit=on_commit
+    )
+    response = JsonResponse({"error": "Too many logins in progress."}, status=503)
+    response["Retry-After"] = "1"
+    return response
+
+
+def _complete_local_login(request, username: str, password: str, started: float):
+    pool = get_password_check_pool()
+    if pool is None:
+        with timed("password_check"):
+            user = authenticate(request, username=username, password=password)
+    else:
+        user = _local_user(username)
+        try:
+            with timed("password_check"):
+                valid, rehashed = pool.check(password, user.password if user else None)
+        except PasswordCheckBusy:
+            return _password_check_busy(username, started)
+        return _finish_offloaded_local_login(request, username, user, valid, rehashed, started)
+    return _finish_local_login(request, username, user, started)
+
+
+def _finish_offloaded_local_login(request, username, user, valid, rehashed, started):
+    user = _accept_local_user(request, username, user, valid, rehashed)
+    return _finish_local_login(request, username, user, started)
+
+
+def _finish_local_login(request, username: str, user, started: float):
+    if user is None:
+        _record_login(_login_event(username, LoginEvent.SOURCE_LOCAL, 401, started))
+        return JsonResponse({"error": "Invalid credentials."}, status=401)
+
+    with timed("login"):
+        login(request, user)
+    _record_login(_login_event(username, LoginEvent.SOURCE_LOCAL, 200, started, user))
+
+    return JsonResponse(
+        {
+            "message": "Login successful.",
+            "user": {
+                "username": user.username,
+                "first_name": user.first_name,
+                "last_name": user.last_name,
+                "email": user.email,
+            },
+        }
+    )
+
+
+def _auth0_error_response(
+    username: str, exc: Auth0AuthenticationError, started: float, *, on_commit: bool = True
+) -> JsonResponse:
+    _record_login(
+        _login_event(username, LoginEvent.SOURCE_AUTH0, exc.status_code, started),
+        on_commit=on_commit,
+    )
+    return JsonResponse({"error": exc.message}, status=exc.status_code)
+
+
+def _throttled(limit: str, retry_after: float) -> JsonResponse:
+    LOGINS_THROTTLED.inc(limit=limit)
+    response = JsonResponse({"error": "Too many login attempts."}, status=429)
+    response["Retry-After"] = str(int(retry_after))
+    return response
+
+
+def _overloaded() -> JsonResponse:
+    LOGINS_THROTTLED.inc(limit="in_flight")
+    response = JsonResponse({"error": "Too many logins in progress."}, status=503)
+    response["Retry-After"] = "1"
+    return response
+
+
+def _check_client_rate(request) -> Optional[JsonResponse]:
+    limiter = get_login_rate_limiter()
+    retry_after = limiter.check_ip(client_ip(request)) if limiter else 0
+    return _throttled("ip", retry_after) if retry_after else None
+
+
+def _check_username_rate(username: str) -> Optional[JsonResponse]:
+    limiter = get_login_rate_limiter()
+    retry_after = limiter.check_username(username) if limiter else 0
+    return _throttled("username", retry_after) if retry_after else None
+
+
+@csrf_exempt
+@require_POST
+def login_view(request):
+    """Authenticate an existing user using username/password credentials."""
+
+    started = time.perf_counter()
+    rejected = _check_client_rate(request)
+    if rejected is not None:
+        return rejected
+    credentials, error_response = _read_credentials(request)
+    if error_response is not None:
+        return error_response
+    username, password = credentials
+    rejected = _check_username_rate(username)
+    if rejected is not None:
+        return rejected
+
+    concurrency = get_login_concurrency()
+    if not concurrency.acquire():
+        return _overloaded()
+    try:
+        return _authenticate(request, username, password, started)
+    finally:
+        concurrency.release()
+
+
+def _authenticate(request, username: str, password: str, started: float):
     try:
         auth0_result = authenticate_with_auth0(username=username, password=password)
     except Auth0ConfigurationError:
         auth0_result = None
+    except Auth0UnavailableError as exc:
+        if not exc.fallback_to_local:
+            return _auth0_error_response(username, exc, started)
+        auth0_result = None
     except Auth0AuthenticationError as exc:
-        return JsonResponse({"error": exc.message}, status=exc.status_code)
+        return _auth0_error_response(username, exc, started)
 
     if auth0_result is not None:
-        profile = _normalize_profile(username, auth0_result.profile)
-        user = _sync_user_with_profile(username, profile)
-        login(request, user)
-        return JsonResponse(_build_response_payload(profile, auth0_result.tokens))
+        return _complete_auth0_login(request, username, auth0_result, started)
 
-    user = authenticate(request, username=username, password=password)
+    return _complete_local_login(request, username, password, started)
+
+
+@csrf_exempt
+@require_POST
+async def alogin_view(request):
+    """Async version of :func:`login_view` served under ASGI.
+
+    The Auth0 round trips run on the event loop; the database work that
+    follows (user sync, session login) is done in a single ``sync_to_async``
+    hop.
+    """
+
+    started = time.perf_counter()
+    rejected = _check_client_rate(request)
+    if rejected is not None:
+        return rejected
+    credentials, error_response = _read_credentials(request)
+    if error_response is not None:
+        return error_response
+    username, password = credentials
+    rejected = _check_username_rate(username)
+    if rejected is not None:
+        return rejected
+
+    concurrency = get_login_concurrency()
+    if not concurrency.acquire():
+        return _overloaded()
+    try:
+        return await _aauthenticate(request, username, password, started)
+    finally:
+        concurrency.release()
+
+
+async def _aauthenticate(request, username: str, password: str, started: float):
+    try:
+        auth0_result = await aauthenticate_with_auth0(username=username, password=password)
+    except Auth0ConfigurationError:
+        auth0_result = None
+    except Auth0UnavailableError as exc:
+        if not exc.fallback_to_local:
+            return _auth0_error_response(username, exc, started, on_commit=False)
+        auth0_result = None
+    except Auth0AuthenticationError as exc:
+        return _auth0_error_response(username, exc, started, on_commit=False)
+
+    if auth0_result is not None:
+        return await sync_to_async(_complete_auth0_login)(
+            request, username, auth0_result, started
+        )
+
+    pool = get_password_check_pool()
+    if pool is None:
+        return await sync_to_async(_complete_local_login)(request, username, password, started)
+
+    user = await sync_to_async(_local_user)(username)
+    try:
+        with timed("password_check"):
+            valid, rehashed = await pool.acheck(password, user.password if user else None)
+    except PasswordCheckBusy:
+        return _password_check_busy(username, started, on_commit=False)
+    return await sync_to_async(_finish_offloaded_local_login)(
+        request, username, user, valid, rehashed, started
+    )
+
+
+def _read_refresh_token(request) -> Tuple[Optional[str], Optional[JsonResponse]]:
+    with timed("parse"):
+        payload = _parse_payload(request)
+    if payload is None:
+        return None, JsonResponse({"error": "Invalid JSON payload."}, status=400)
+
+    refresh_token = payload.get("refresh_token")
+    if not isinstance(refresh_token, str) or not refresh_token.strip():
+        return None, JsonResponse({"error": "refresh_token is required."}, status=400)
+    return refresh_token.strip(), None
 
-    if user is None:
-        return JsonResponse({"error": "Invalid credentials."}, status=401)
 
-    login(request, user)
+def _session_user_required() -> JsonResponse:
+    return JsonResponse({"error": "Authentication required."}, status=401)
+
+
+def _refresh_error(exc: Exception) -> JsonResponse:
+    if isinstance(exc, Auth0AuthenticationError):
+        return JsonResponse({"error": exc.message}, status=exc.status_code)
+    return JsonResponse({"error": "Token refresh requires Auth0."}, status=400)
+
+
+def _refresh_subject(session_subject: Optional[str], user) -> Optional[str]:
+    """Return the Auth0 subject a refresh token has to belong to.
+
+    Sessions from before subjects were stored fall back to the one saved on
+    the user's :class:`Auth0Identity`; ``None`` means the user has never been
+    bound to an Auth0 identity and nothing can be refreshed.
+    """
+
+    if session_subject:
+        return session_subject
+    stored = (
+        Auth0Identity.objects.filter(user=user)
+        .values_list("subject", flat=True)
+        .first()
+    )
+    return stored or None
+
+
+def _unbound_session() -> JsonResponse:
+    return JsonResponse(
+        {"error": "This session is not bound to an Auth0 user; log in again."},
+        status=403,
+    )
+
+
+def _complete_refresh(
+    request,
+    user,
+    subject: str,
+    from_session: bool,
+    refresh_token: str,
+    result: Auth0Result,
+):
+    """Update the session after a refresh grant.
+
+    Auth0 has to report ``subject``. When it came from the session the user
+    row is left alone; otherwise (sessions from before subjects were stored)
+    the profile is synced as on login and the subject saved in the session.
+    """
+
+    profile = result.profile or {}
+    returned = profile.get("sub")
+    if returned is None:
+        return JsonResponse({"error": "Auth0 did not return the user profile."}, status=502)
+    if returned != subject:
+        return JsonResponse(
+            {"error": "The refresh token belongs to another user."}, status=403
+        )
+
+    username = user.get_username()
+    if not from_session:
+        with timed("sync_user"):
+            user = _sync_user_with_profile(
+                username, normalize_profile(username, profile), subject
+            )
+        request.session[AUTH0_SUBJECT_SESSION_KEY] = subject
+    request.session.cycle_key()
+
+    tokens = dict(result.tokens)
+    # Without refresh token rotation Auth0 does not send a new one back.
+    tokens.setdefault("refresh_token", refresh_token)
+    user_profile = {
+        "username": username,
+        "first_name": user.first_name,
+        "last_name": user.last_name,
+        "email": user.email,
+    }
+    return JsonResponse(_build_response_payload(user_profile, tokens, "Token refreshed."))
+
+
+# The refresh token in the body is the credential: a cross-site request
+# cannot know it, and it has to belong to the session's Auth0 subject.
+@csrf_exempt
+@require_POST
+def token_refresh_view(request):
+    """Renew the Auth0 tokens and the session without a password grant."""
+
+    user = request.user
+    if not user.is_authenticated or user.pk is None:
+        return _session_user_required()
+    refresh_token, error_response = _read_refresh_token(request)
+    if error_response is not None:
+        return error_response
+
+    session_subject = request.session.get(AUTH0_SUBJECT_SESSION_KEY)
+    subject = _refresh_subject(session_subject, user)
+    if subject is None:
+        return _unbound_session()
+    try:
+        result = refresh_with_auth0(refresh_token, subject)
+    except (Auth0ConfigurationError, Auth0AuthenticationError) as exc:
+        return _refresh_error(exc)
+    return _complete_refresh(
+        request, user, subject, bool(session_subject), refresh_token, result
+    )
+
+
+@csrf_exempt
+@require_POST
+async def atoken_refresh_view(request):
+    """Async version of :func:`token_refresh_view` served under ASGI."""
+
+    user = await request.auser()
+    if not user.is_authenticated or user.pk is None:
+        return _session_user_required()
+    refresh_token, error_response = _read_refresh_token(request)
+    if error_response is not None:
+        return error_response
+
+    session_subject = await request.session.aget(AUTH0_SUBJECT_SESSION_KEY)
+    subject = await sync_to_async(_refresh_subject)(session_subject, user)
+    if subject is None:
+        return _unbound_session()
+    try:
+        result = await arefresh_with_auth0(refresh_token, subject)
+    except (Auth0ConfigurationError, Auth0AuthenticationError) as exc:
+        return _refresh_error(exc)
+    return await sync_to_async(_complete_refresh)(
+        request, user, subject, bool(session_subject), refresh_token, result
+    )
+
+
+@require_GET
+def me_view(request):
+    """Return the identity behind the session cookie or bearer token."""
+
+    user = request.user
+    if not user.is_authenticated:
+        return JsonResponse({"error": "Authentication required."}, status=401)
 
     return JsonResponse(
         {
-            "message": "Login successful.",
             "user": {
                 "username": user.username,
                 "first_name": user.first_name,
                 "last_name": user.last_name,
                 "email": user.email,
-            },
+            }
         }
     )
+
+
+@require_GET
+def metrics_view(request):
+    """Expose login metrics in the Prometheus text format."""
+
+    allowed = settings.ACCOUNTS_METRICS_ALLOWED_IPS
+    if allowed and request.META.get("REMOTE_ADDR") not in allowed:
+        return JsonResponse({"error": "Forbidden."}, status=403)
+
+    return HttpResponse(render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8")
@@ -0,0 +1,133 @@
+"""Pay a worker's cold-start costs before its first request.
+
+Left alone, the first login served by a fresh worker imports the URLconf
+(and with it the admin), parses the Auth0 settings, connects to the
+database, performs the TLS handshake with Auth0 and downloads the JWKS.
+With ``ACCOUNTS_WARMUP`` on, that work happens at boot in two parts:
+
+* :func:`prepare`, run when the WSGI/ASGI application is built, does
+  everything that survives a fork: imports, the frozen Auth0 config, the
+  JWKS keys. Under ``gunicorn --preload`` it runs once in the master and
+  every worker inherits the result. Processes that only call
+  ``django.setup()`` (management commands, the password hashing workers)
+  never warm up.
+* :func:`connect` opens the sockets, which must not be shared between
+  processes: the database connection and an idle keep-alive connection to
+  Auth0. The WSGI/ASGI entry points call it next unless
+  ``ACCOUNTS_WARMUP_CONNECT`` is off, in which case the server calls it in
+  each worker (``post_fork`` in ``gunicorn.conf.py``).
+
+A failing step is logged and skipped; the request that needs it pays the
+cost as before. Durations of the last run are kept in :data:`timings`.
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Seconds spent in each step of this process's warm-up.
+timings: Dict[str, float] = {}
+
+_prepared = False
+_connected_pid: Optional[int] = None
+_lock = threading.Lock()
+
+
+def _step(name: str, func: Callable[[], object]) -> None:
+    started = time.perf_counter()
+    try:
+        func()
+    except Exception:
+        logger.warning("Warm-up step %r failed.", name, exc_info=True)
+    finally:
+        timings[name] = time.perf_counter() - started
+
+
+def _import_urlconf() -> None:
+    from django.urls import get_resolver
+
+    get_resolver().url_patterns
+
+
+def _load_hashers() -> None:
+    from django.contrib.auth.hashers import get_hashers
+
+    get_hashers()
+
+
+def _freeze_auth0_config() -> None:
+    from .auth0 import freeze_auth0_config
+
+    freeze_auth0_config()
+
+
+def _prefetch_jwks() -> None:
+    from .auth0 import get_auth0_client, load_auth0_config
+    from .tokens import get_jwks_cache
+
+    config = load_auth0_config()
+    # The keys are only used to verify id_tokens and bearer tokens.
+    if config is None or not (config.verify_id_token or config.audience):
+        return
+    client = get_auth0_client(config)
+    get_jwks_cache(config.jwks_url, config.jwks_ttl).update(client.fetch_jwks())
+    if not settings.ACCOUNTS_WARMUP_CONNECT:
+        # A preloading master must not leave a connection for workers to inherit.
+        client.pool.clear()
+
+
+def _connect_database() -> None:
+    from django.db import connections
+
+    for alias in connections:
+        connections[alias].ensure_connection()
+
+
+def _prewarm_auth0() -> None:
+    from .auth0 import get_auth0_client, load_auth0_config
+
+    config = load_auth0_config()
+    if config is not None:
+        get_auth0_client(config).pool.prewarm(config.base_url, timeout=config.timeout)
+
+
+def prepare() -> None:
+    """Do the fork-safe part of the warm-up, once per process tree."""
+
+    global _prepared
+    with _lock:
+        if _prepared:
+            return
+        _prepared = True
+
+    _step("urlconf", _import_urlconf)
+    _step("hashers", _load_hashers)
+    _step("auth0_config", _freeze_auth0_config)
+    _step("jwks", _prefetch_jwks)
+
+
+def connect() -> None:
+    """Open this process's database and Auth0 connections (again after a fork).
+
+    Django database connections belong to the thread that opens them, so
+    this helps servers that answer on the thread calling it (gunicorn sync
+    workers, runserver's first thread) more than thread-pool workers.
+    """
+
+    global _connected_pid
+    pid = os.getpid()
+    with _lock:
+        if _connected_pid == pid:
+            return
+        _connected_pid = pid
+
+    _step("database", _connect_database)
+    _step("auth0_pool", _prewarm_auth0)
@@ -0,0 +1,214 @@
+"""Bounded write-behind queue for login bookkeeping.
+
+``last_login`` updates and login audit events are not needed by the request
+that produces them, so they are queued in memory and written in periodic
+bulk statements by a background thread instead of one synchronous write per
+login.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import atexit
+import logging
+import queue
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_LAST_LOGIN = "last_login"
+_LOGIN_EVENT = "login_event"
+
+
+class WriteBehindQueue:
+    """Buffer writes and apply them in batches.
+
+    ``max_size`` bounds memory. When the queue is full a producer waits up
+    to ``put_timeout`` seconds and then flushes a batch itself, so a stalled
+    flusher slows logins down instead of dropping records or growing without
+    limit. A producer running on an event loop must neither block nor touch
+    the database: it wakes the flusher and drops the record, counted in
+    ``dropped``.
+    """
+
+    def __init__(
+        self,
+        *,
+        flush_interval: float = 1.0,
+        batch_size: int = 500,
+        max_size: int = 10000,
+        put_timeout: float = 0.05,
+    ) -> None:
+        self.flush_interval = flush_interval
+        self.batch_size = max(1, batch_size)
+        self.put_timeout = put_timeout
+        self._queue: "queue.Queue[Tuple[str, Any]]" = queue.Queue(maxsize=max_size)
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_lock = threading.Lock()
+        self.flushed = 0
+        self.backpressure_flushes = 0
+        self.failed_batches = 0
+        self.dropped = 0
+
+    def _put(self, item: Tuple[str, Any]) -> None:
+        self.start()
+        if _on_event_loop():
+            try:
+                self._queue.put_nowait(item)
+            except queue.Full:
+                self.dropped += 1
+                self._wake.set()
+                logger.warning("Write-behind queue full; dropping a %s record.", item[0])
+            return
+        try:
+            self._queue.put(item, timeout=self.put_timeout)
+        except queue.Full:
+            self.backpressure_flushes += 1
+            self._flush_batch()
+            self._queue.put(item)
+
+    def record_last_login(self, user_id: int, when: datetime) -> None:
+        self._put((_LAST_LOGIN, (user_id, when)))
+
+    def record_login_event(self, **fields: Any) -> None:
+        fields.setdefault("created_at", timezone.now())
+        self._put((_LOGIN_EVENT, fields))
+
+    def __len__(self) -> int:
+        return self._queue.qsize()
+
+    def _drain(self) -> List[Tuple[str, Any]]:
+        items: List[Tuple[str, Any]] = []
+        while len(items) < self.batch_size:
+            try:
+                items.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def _write(self, items: List[Tuple[str, Any]]) -> None:
+        from .models import LoginEvent
+
+        last_logins: Dict[int, datetime] = {}
+        events: List[LoginEvent] = []
+        for kind, payload in items:
+            if kind == _LAST_LOGIN:
+                user_id, when = payload
+                if user_id not in last_logins or last_logins[user_id] < when:
+                    last_logins[user_id] = when
+            else:
+                events.append(LoginEvent(**payload))
+
+        user_model = get_user_model()
+        with transaction.atomic():
+            if last_logins:
+                user_model.objects.bulk_update(
+                    [user_model(pk=pk, last_login=when) for pk, when in last_logins.items()],
+                    ["last_login"],
+                    batch_size=self.batch_size,
+                )
+            if events:
+                LoginEvent.objects.bulk_create(events, batch_size=self.batch_size)
+
+    def _flush_batch(self) -> int:
+        with self._flush_lock:
+            items = self._drain()
+            if not items:
+                return 0
+            try:
+                self._write(items)
+            except Exception:
+                self.failed_batches += 1
+                logger.exception("Dropping %d write-behind records.", len(items))
+                return 0
+            self.flushed += len(items)
+            return len(items)
+
+    def flush(self) -> int:
+        """Write everything queued so far and return how many records were written."""
+
+        total = 0
+        while True:
+            written = self._flush_batch()
+            total += written
+            if written == 0 and self._queue.empty():
+                return total
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            self.flush()
+            close_old_connections()
+
+    def start(self) -> None:
+        if self._thread is not None:
+            return
+        with self._thread_lock:
+            if self._thread is None:
+                self._stop.clear()
+                self._wake.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name="write-behind", daemon=True
+                )
+                self._thread.start()
+
+    def stop(self) -> None:
+        """Stop the flusher and write whatever is still queued."""
+
+        with self._thread_lock:
+            thread, self._thread = self._thread, None
+        self._stop.set()
+        self._wake.set()
+        if thread is not None:
+            thread.join()
+        self.flush()
+
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+_queue: Optional[WriteBehindQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_write_behind() -> WriteBehindQueue:
+    """Return the process-wide queue, flushed automatically at exit."""
+
+    global _queue
+
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = WriteBehindQueue(
+                    flush_interval=settings.ACCOUNTS_WRITE_BEHIND_INTERVAL,
+                    batch_size=settings.ACCOUNTS_WRITE_BEHIND_BATCH_SIZE,
+                    max_size=settings.ACCOUNTS_WRITE_BEHIND_MAX_QUEUE,
+                )
+                atexit.register(_queue.stop)
+    return _queue
+
+
+def queue_last_login(sender, user, **kwargs) -> None:
+    """``user_logged_in`` receiver replacing Django's synchronous update."""
+
+    user.last_login = timezone.now()
+    user_id, when = user.pk, user.last_login
+    transaction.on_commit(lambda: get_write_behind().record_last_login(user_id, when))
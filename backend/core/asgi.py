@@ -9,8 +9,9 @@ https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+from core.dispatch import get_dispatching_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+os.environ.setdefault('DJANGO_ASYNC_VIEWS', 'True')
 
-application = get_asgi_application()
+application = get_dispatching_asgi_application()
@@ -0,0 +1,145 @@
+"""Database configuration built from environment variables.
+
+``DJANGO_DB_ENGINE`` selects ``sqlite`` (the default) or ``postgresql``.
+Both keep connections open between requests (``DJANGO_DB_CONN_MAX_AGE``)
+with health checks. SQLite connections get WAL-friendly pragmas applied when
+they are opened; PostgreSQL can use psycopg's connection pool instead of
+persistent connections.
+"""
+
+from __future__ import annotations
+
+import os
+from pathlib import Path
+from typing import Any, Dict, Mapping, Optional
+
+_TRUE_VALUES = {"1", "true", "yes"}
+
+# Applied to every new SQLite connection, in order: busy_timeout comes first
+# so that switching the journal mode waits for other connections.
+_SQLITE_PRAGMA_DEFAULTS = {
+    "busy_timeout": "5000",
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": "268435456",
+}
+
+
+def _get(environ: Mapping[str, str], name: str) -> Optional[str]:
+    value = environ.get(name)
+    if value is None:
+        return None
+    value = value.strip()
+    return value or None
+
+
+def _get_bool(environ: Mapping[str, str], name: str, default: bool) -> bool:
+    value = _get(environ, name)
+    if value is None:
+        return default
+    return value.lower() in _TRUE_VALUES
+
+
+def _get_int(environ: Mapping[str, str], name: str, default: int) -> int:
+    value = _get(environ, name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        return default
+
+
+def sqlite_pragmas_from_env(environ: Mapping[str, str] = os.environ) -> Dict[str, str]:
+    """Return the pragmas to apply to SQLite connections.
+
+    ``DJANGO_SQLITE_WAL=False`` restores SQLite's rollback journal and
+    ``synchronous=FULL`` (WAL mode is stored in the database file, so it has
+    to be switched off explicitly); the remaining values can be overridden
+    one by one.
+    """
+
+    pragmas = dict(_SQLITE_PRAGMA_DEFAULTS)
+    if not _get_bool(environ, "DJANGO_SQLITE_WAL", True):
+        pragmas["journal_mode"] = "DELETE"
+        pragmas["synchronous"] = "FULL"
+    else:
+        synchronous = (_get(environ, "DJANGO_SQLITE_SYNCHRONOUS") or "NORMAL").upper()
+        if synchronous not in {"OFF", "NORMAL", "FULL", "EXTRA"}:
+            raise ValueError(f"Unsupported DJANGO_SQLITE_SYNCHRONOUS: {synchronous}")
+        pragmas["synchronous"] = synchronous
+
+    pragmas["busy_timeout"] = str(_get_int(environ, "DJANGO_SQLITE_BUSY_TIMEOUT_MS", 5000))
+    pragmas["mmap_size"] = str(_get_int(environ, "DJANGO_SQLITE_MMAP_SIZE", 268435456))
+    return pragmas
+
+
+def database_from_env(
+    base_dir: Path, environ: Mapping[str, str] = os.environ
+) -> Dict[str, Dict[str, Any]]:
+    """Return a ``DATABASES`` setting for the configured engine."""
+
+    engine = (_get(environ, "DJANGO_DB_ENGINE") or "sqlite").lower()
+    conn_max_age = _get_int(environ, "DJANGO_DB_CONN_MAX_AGE", 60)
+    health_checks = _get_bool(environ, "DJANGO_DB_CONN_HEALTH_CHECKS", True)
+
+    if engine in {"postgres", "postgresql"}:
+        database: Dict[str, Any] = {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": _get(environ, "DJANGO_DB_NAME") or "servigenman",
+            "USER": _get(environ, "DJANGO_DB_USER") or "",
+            "PASSWORD": _get(environ, "DJANGO_DB_PASSWORD") or "",
+            "HOST": _get(environ, "DJANGO_DB_HOST") or "localhost",
+            "PORT": _get(environ, "DJANGO_DB_PORT") or "5432",
+            "CONN_MAX_AGE": conn_max_age,
+            "CONN_HEALTH_CHECKS": health_checks,
+            "OPTIONS": {},
+        }
+        if _get_bool(environ, "DJANGO_DB_POOL", False):
+            # psycopg's pool owns connection reuse; Django requires
+            # persistent connections to be off when it is enabled.
+            database["CONN_MAX_AGE"] = 0
+            database["OPTIONS"]["pool"] = {
+                "min_size": _get_int(environ, "DJANGO_DB_POOL_MIN_SIZE", 2),
+                "max_size": _get_int(environ, "DJANGO_DB_POOL_MAX_SIZE", 10),
+                "timeout": _get_int(environ, "DJANGO_DB_POOL_TIMEOUT", 10),
+            }
+        return {"default": database}
+
+    if engine not in {"sqlite", "sqlite3"}:
+        raise ValueError(f"Unsupported DJANGO_DB_ENGINE: {engine}")
+
+    transaction_mode = (_get(environ, "DJANGO_SQLITE_TRANSACTION_MODE") or "IMMEDIATE").upper()
+    if transaction_mode not in {"DEFERRED", "IMMEDIATE", "EXCLUSIVE"}:
+        raise ValueError(f"Unsupported DJANGO_SQLITE_TRANSACTION_MODE: {transaction_mode}")
+
+    return {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": _get(environ, "DJANGO_DB_NAME") or base_dir / "db.sqlite3",
+            "CONN_MAX_AGE": conn_max_age,
+            "CONN_HEALTH_CHECKS": health_checks,
+            # A deferred transaction that reads and then writes fails with
+            # "database is locked" without waiting for busy_timeout when
+            # another writer got there first; taking the write lock up
+            # front makes concurrent logins queue instead.
+            "OPTIONS": {"transaction_mode": transaction_mode},
+        }
+    }
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs) -> None:
+    """``connection_created`` receiver applying ``SQLITE_PRAGMAS``."""
+
+    if connection.vendor != "sqlite":
+        return
+
+    from django.conf import settings
+
+    pragmas = getattr(settings, "SQLITE_PRAGMAS", {})
+    if not pragmas:
+        return
+
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
@@ -0,0 +1,124 @@
+"""Serve ``/api/`` through a shorter middleware chain.
+
+The JSON API does not need the admin-oriented middleware (messages,
+clickjacking protection, trailing-slash redirects), yet every request paid
+for all of ``MIDDLEWARE``. The entry points in ``core.wsgi`` and
+``core.asgi`` route requests under ``API_PREFIX`` to a second Django
+handler built from ``API_MIDDLEWARE``; everything else keeps the full
+stack.
+"""
+
+from __future__ import annotations
+
+import threading
+from contextlib import contextmanager
+from typing import Iterator
+
+from django.conf import settings
+from django.core.asgi import get_asgi_application
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.wsgi import get_wsgi_application
+
+_load_lock = threading.Lock()
+
+
+@contextmanager
+def _middleware_from(setting: str) -> Iterator[None]:
+    """Point ``settings.MIDDLEWARE`` at another list while a chain is built.
+
+    Django's handlers always read ``settings.MIDDLEWARE``; chains are built
+    once, when the entry point is imported, so the swap is not observable
+    by requests.
+    """
+
+    with _load_lock:
+        original = settings.MIDDLEWARE
+        settings.MIDDLEWARE = getattr(settings, setting)
+        try:
+            yield
+        finally:
+            settings.MIDDLEWARE = original
+
+
+class AllowedHostsMiddleware:
+    """Validate the Host header, which ``CommonMiddleware`` does for the full stack."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response) -> None:
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.get_host()
+        return self.get_response(request)
+
+
+class ApiWSGIHandler(WSGIHandler):
+    def load_middleware(self, is_async: bool = False) -> None:
+        with _middleware_from("API_MIDDLEWARE"):
+            super().load_middleware(is_async)
+
+
+class ApiASGIHandler(ASGIHandler):
+    def load_middleware(self, is_async: bool = False) -> None:
+        with _middleware_from("API_MIDDLEWARE"):
+            super().load_middleware(is_async)
+
+
+class WSGIPrefixDispatcher:
+    def __init__(self, api, default, prefix: str) -> None:
+        self.api = api
+        self.default = default
+        self.prefix = prefix
+
+    def __call__(self, environ, start_response):
+        if environ.get("PATH_INFO", "").startswith(self.prefix):
+            return self.api(environ, start_response)
+        return self.default(environ, start_response)
+
+
+class ASGIPrefixDispatcher:
+    def __init__(self, api, default, prefix: str) -> None:
+        self.api = api
+        self.default = default
+        self.prefix = prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["path"].startswith(self.prefix):
+            return await self.api(scope, receive, send)
+        return await self.default(scope, receive, send)
+
+
+def _warm_up() -> None:
+    # Only the server entry points warm up: management commands and the
+    # password hashing workers also run django.setup() and must not.
+    if not settings.ACCOUNTS_WARMUP:
+        return
+    from accounts.warmup import connect, prepare
+
+    prepare()
+    if settings.ACCOUNTS_WARMUP_CONNECT:
+        connect()
+
+
+def get_dispatching_wsgi_application():
+    """Return the project's WSGI callable, with the API fast path if enabled."""
+
+    default = get_wsgi_application()
+    _warm_up()
+    if not settings.API_FAST_PATH:
+        return default
+    return WSGIPrefixDispatcher(ApiWSGIHandler(), default, settings.API_PREFIX)
+
+
+def get_dispatching_asgi_application():
+    """Return the project's ASGI callable, with the API fast path if enabled."""
+
+    default = get_asgi_application()
+    _warm_up()
+    if not settings.API_FAST_PATH:
+        return default
+    return ASGIPrefixDispatcher(ApiASGIHandler(), default, settings.API_PREFIX)
+
@@ -0,0 +1,94 @@
+"""Measure per-request framework overhead of the full and API middleware chains."""
+
+import io
+import logging
+import time
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+
+from core.dispatch import ApiWSGIHandler
+
+# Requests that never reach the database or Auth0, so what is left is
+# middleware, routing and response handling.
+_REQUESTS = (
+    ("GET /api/me/ (401)", "GET", "/api/me/", b""),
+    ("POST /api/login/ (400)", "POST", "/api/login/", b"not-json"),
+)
+
+
+def _environ(method, path, body):
+    return {
+        "REQUEST_METHOD": method,
+        "PATH_INFO": path,
+        "SCRIPT_NAME": "",
+        "QUERY_STRING": "",
+        "CONTENT_TYPE": "application/json",
+        "CONTENT_LENGTH": str(len(body)),
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "HTTP_HOST": "localhost",
+        "HTTP_ORIGIN": "http://localhost:3000",
+        "REMOTE_ADDR": "127.0.0.1",
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "wsgi.input": io.BytesIO(body),
+        "wsgi.errors": io.StringIO(),
+        "wsgi.url_scheme": "http",
+        "wsgi.version": (1, 0),
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+
+
+def _start_response(status, headers, exc_info=None):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Send requests that touch neither the database nor Auth0 through the "
+        "full MIDDLEWARE chain and through API_MIDDLEWARE, in-process, and "
+        "report microseconds per request for each."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=5000)
+
+    def _measure(self, handler, method, path, body, count, rounds=3):
+        for _ in range(100):
+            b"".join(handler(_environ(method, path, body), _start_response))
+        best = float("inf")
+        for _ in range(rounds):
+            started = time.perf_counter()
+            for _ in range(count):
+                b"".join(handler(_environ(method, path, body), _start_response))
+            best = min(best, time.perf_counter() - started)
+        return best * 1e6 / count
+
+    def handle(self, *args, **options):
+        count = options["requests"]
+        # 4xx responses are logged as warnings; that would dominate the timing.
+        request_logger = logging.getLogger("django.request")
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            self._report(count)
+        finally:
+            request_logger.setLevel(level)
+
+    def _report(self, count):
+        handlers = (
+            (f"full ({len(settings.MIDDLEWARE)} middleware)", WSGIHandler()),
+            (f"api ({len(settings.API_MIDDLEWARE)} middleware)", ApiWSGIHandler()),
+        )
+
+        self.stdout.write(f"{'request':<24} {'chain':<22} {'us/request':>11}")
+        for label, method, path, body in _REQUESTS:
+            baseline = None
+            for name, handler in handlers:
+                micros = self._measure(handler, method, path, body, count)
+                change = f"  ({(micros / baseline - 1) * 100:+.0f}%)" if baseline else ""
+                baseline = baseline or micros
+                self.stdout.write(f"{label:<24} {name:<22} {micros:>11.1f}{change}")
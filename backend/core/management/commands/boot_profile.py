@@ -0,0 +1,149 @@
+"""Measure how long a fresh worker takes to import, boot and serve its first request."""
+
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter under ``-X importtime``: build the WSGI
+# application exactly like a worker does, then serve two requests.
+_CHILD = r"""
+import io, json, os, sys, time
+started = time.perf_counter()
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+from django.conf import settings
+settings.INSTALLED_APPS
+settings_loaded = time.perf_counter()
+from core.wsgi import application
+app_loaded = time.perf_counter()
+
+method, path = sys.argv[1], sys.argv[2]
+statuses = []
+
+def serve():
+    environ = {
+        "REQUEST_METHOD": method, "PATH_INFO": path, "SCRIPT_NAME": "", "QUERY_STRING": "",
+        "CONTENT_TYPE": "application/json", "CONTENT_LENGTH": "0",
+        "SERVER_NAME": "localhost", "SERVER_PORT": "80", "HTTP_HOST": "localhost",
+        "REMOTE_ADDR": "127.0.0.1", "SERVER_PROTOCOL": "HTTP/1.1",
+        "wsgi.input": io.BytesIO(), "wsgi.errors": io.StringIO(), "wsgi.url_scheme": "http",
+        "wsgi.version": (1, 0), "wsgi.multithread": True, "wsgi.multiprocess": True,
+        "wsgi.run_once": False,
+    }
+    b"".join(application(environ, lambda status, headers, exc_info=None: statuses.append(status)))
+
+serve()
+first_served = time.perf_counter()
+first_served_wall = time.time()
+serve()
+second_served = time.perf_counter()
+
+from accounts import warmup
+print(json.dumps({
+    "settings": settings_loaded - started,
+    "application": app_loaded - settings_loaded,
+    "first_request": first_served - app_loaded,
+    "second_request": second_served - first_served,
+    "first_served_wall": first_served_wall,
+    "status": statuses[0],
+    "warmup": warmup.timings,
+}))
+"""
+
+_IMPORT_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|(\s+)(\S+)")
+
+
+def _parse_importtime(stderr):
+    """Return ``(module, self_us, cumulative_us, depth)`` for each import."""
+
+    modules = []
+    for line in stderr.splitlines():
+        match = _IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            modules.append((module, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return modules
+
+
+class Command(BaseCommand):
+    help = (
+        "Start fresh interpreters that build the WSGI application like a "
+        "worker, serve one request and then a second; report the slowest "
+        "imports, the time of each boot phase and the time from process "
+        "start to the first response. --warmup/--no-warmup set DJANGO_WARMUP "
+        "for the child processes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=3)
+        parser.add_argument("--top", type=int, default=15, help="Imports to list.")
+        parser.add_argument("--method", default="GET")
+        parser.add_argument("--path", default="/api/me/")
+        parser.add_argument(
+            "--warmup",
+            action="store_true",
+            default=None,
+            help="Default: inherit DJANGO_WARMUP from the environment.",
+        )
+        parser.add_argument("--no-warmup", dest="warmup", action="store_false")
+
+    def handle(self, *args, **options):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get(
+            "DJANGO_SETTINGS_MODULE", "core.settings"
+        ))
+        if options["warmup"] is not None:
+            env["DJANGO_WARMUP"] = "True" if options["warmup"] else "False"
+
+        runs = [self._run(env, options["method"], options["path"]) for _ in range(max(1, options["runs"]))]
+        self._report_imports(runs[len(runs) // 2]["imports"], options["top"])
+        self._report_phases(runs)
+
+    def _run(self, env, method, path):
+        spawned = time.time()
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", _CHILD, method, path],
+            cwd=settings.BASE_DIR,
+            env=env,
+            capture_output=True,
+            text=True,
+        )
+        if result.returncode != 0:
+            raise CommandError(f"Boot failed:\n{result.stderr[-2000:]}")
+        measured = json.loads(result.stdout.strip().splitlines()[-1])
+        measured["to_first_response"] = measured.pop("first_served_wall") - spawned
+        measured["imports"] = _parse_importtime(result.stderr)
+        return measured
+
+    def _report_imports(self, imports, top):
+        packages = defaultdict(int)
+        for module, self_us, _, _ in imports:
+            packages[module.split(".")[0]] += self_us
+        total = sum(packages.values())
+
+        self.stdout.write(f"imports: {len(imports)} modules, {total / 1000:.1f} ms")
+        self.stdout.write(f"{'package':<32} {'self ms':>9}")
+        for package, self_us in sorted(packages.items(), key=lambda item: -item[1])[:top]:
+            self.stdout.write(f"{package:<32} {self_us / 1000:>9.1f}")
+        self.stdout.write("")
+        self.stdout.write(f"{'module':<48} {'self ms':>9} {'cumulative ms':>14}")
+        for module, self_us, cumulative_us, _ in sorted(imports, key=lambda item: -item[1])[:top]:
+            self.stdout.write(f"{module:<48} {self_us / 1000:>9.1f} {cumulative_us / 1000:>14.1f}")
+        self.stdout.write("")
+
+    def _report_phases(self, runs):
+        self.stdout.write(f"status of first request: {runs[0]['status']}")
+        self.stdout.write(f"{'phase (median of ' + str(len(runs)) + ' runs)':<32} {'ms':>9}")
+        for phase in ("settings", "application", "first_request", "second_request", "to_first_response"):
+            median = statistics.median(run[phase] for run in runs)
+            self.stdout.write(f"{phase:<32} {median * 1000:>9.1f}")
+        steps = sorted({step for run in runs for step in run["warmup"]})
+        for step in steps:
+            median = statistics.median(run["warmup"].get(step, 0.0) for run in runs)
+            self.stdout.write(f"{'  warmup.' + step:<32} {median * 1000:>9.1f}")
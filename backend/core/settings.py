@@ -1,10 +1,13 @@
 """Django settings for core project."""
 
+import importlib.util
 import os
 from pathlib import Path
 
 from dotenv import load_dotenv
 
+from .database import database_from_env, sqlite_pragmas_from_env
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -44,20 +47,40 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'corsheaders',
+    'core',
     'accounts',
+    'inventory',
 ]
 
 MIDDLEWARE = [
+    'accounts.metrics.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'accounts.metrics.TimedSessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.BearerTokenMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Requests under API_PREFIX skip the admin-oriented middleware above (see
+# core/dispatch.py). CSRF stays: session-authenticated API writes still need
+# it, and views that opt out with csrf_exempt cost it almost nothing.
+API_FAST_PATH = os.getenv("DJANGO_API_FAST_PATH", "True").lower() in {"1", "true", "yes"}
+API_PREFIX = "/api/"
+API_MIDDLEWARE = [
+    'accounts.metrics.ServerTimingMiddleware',
+    'django.middleware.security.SecurityMiddleware',
+    'core.dispatch.AllowedHostsMiddleware',
+    'corsheaders.middleware.CorsMiddleware',
+    'accounts.metrics.TimedSessionMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.BearerTokenMiddleware',
+]
+
 ROOT_URLCONF = 'core.urls'
 
 TEMPLATES = [
@@ -77,16 +100,23 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'core.wsgi.application'
 
+# Serve the API with native async views; core.asgi turns this on so that
+# logins waiting on Auth0 do not hold a thread each.
+ACCOUNTS_ASYNC_VIEWS = os.getenv("DJANGO_ASYNC_VIEWS", "False").lower() in {
+    "1",
+    "true",
+    "yes",
+}
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# Configured through DJANGO_DB_* variables, see core/database.py.
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
-}
+DATABASES = database_from_env(BASE_DIR)
+
+# Applied by core.database.apply_sqlite_pragmas to every new SQLite connection.
+SQLITE_PRAGMAS = sqlite_pragmas_from_env()
 
 
 # Password validation
@@ -107,6 +137,66 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashing. The preferred hasher comes first; the others stay listed
+# so existing hashes keep verifying and are upgraded on the next login.
+_PASSWORD_HASHERS = {
+    "pbkdf2": "accounts.hashers.PBKDF2PasswordHasher",
+    "scrypt": "accounts.hashers.ScryptPasswordHasher",
+    "argon2": "accounts.hashers.Argon2PasswordHasher",
+}
+
+
+def _password_hashers(preferred):
+    available = dict(_PASSWORD_HASHERS)
+    if importlib.util.find_spec("argon2") is None:
+        del available["argon2"]
+    if preferred not in available:
+        raise ValueError(f"Unsupported or unavailable DJANGO_PASSWORD_HASHER: {preferred}")
+    return [
+        available.pop(preferred),
+        *available.values(),
+        "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
+    ]
+
+
+PASSWORD_HASHERS = _password_hashers(os.getenv("DJANGO_PASSWORD_HASHER", "pbkdf2").lower())
+
+# 0 keeps Django's default for each parameter (accounts.hashers).
+ACCOUNTS_PBKDF2_ITERATIONS = int(os.getenv("ACCOUNTS_PBKDF2_ITERATIONS", "0"))
+ACCOUNTS_SCRYPT_WORK_FACTOR = int(os.getenv("ACCOUNTS_SCRYPT_WORK_FACTOR", "0"))
+ACCOUNTS_SCRYPT_BLOCK_SIZE = int(os.getenv("ACCOUNTS_SCRYPT_BLOCK_SIZE", "0"))
+ACCOUNTS_SCRYPT_PARALLELISM = int(os.getenv("ACCOUNTS_SCRYPT_PARALLELISM", "0"))
+ACCOUNTS_ARGON2_TIME_COST = int(os.getenv("ACCOUNTS_ARGON2_TIME_COST", "0"))
+ACCOUNTS_ARGON2_MEMORY_COST = int(os.getenv("ACCOUNTS_ARGON2_MEMORY_COST", "0"))
+ACCOUNTS_ARGON2_PARALLELISM = int(os.getenv("ACCOUNTS_ARGON2_PARALLELISM", "0"))
+
+# Local password checks run in this many worker processes
+# (accounts.hashing); 0 checks them on the request thread.
+ACCOUNTS_HASHING_WORKERS = int(
+    os.getenv("ACCOUNTS_HASHING_WORKERS", str(min(4, os.cpu_count() or 1)))
+)
+ACCOUNTS_HASHING_MAX_PENDING = int(os.getenv("ACCOUNTS_HASHING_MAX_PENDING", "64"))
+
+# Login throttling (accounts.ratelimit). Rates are "<attempts>/<seconds>";
+# an empty rate disables that limit. Use accounts.ratelimit.SharedCounterStore
+# to share the counters between the worker processes of one host.
+ACCOUNTS_LOGIN_RATE_LIMITING = os.getenv("ACCOUNTS_LOGIN_RATE_LIMITING", "True").lower() in {
+    "1",
+    "true",
+    "yes",
+}
+ACCOUNTS_LOGIN_RATE_IP = os.getenv("ACCOUNTS_LOGIN_RATE_IP", "30/60")
+ACCOUNTS_LOGIN_RATE_USERNAME = os.getenv("ACCOUNTS_LOGIN_RATE_USERNAME", "10/60")
+ACCOUNTS_RATELIMIT_BACKEND = os.getenv(
+    "ACCOUNTS_RATELIMIT_BACKEND", "accounts.ratelimit.LocalCounterStore"
+)
+ACCOUNTS_RATELIMIT_SLOTS = int(os.getenv("ACCOUNTS_RATELIMIT_SLOTS", "65536"))
+ACCOUNTS_RATELIMIT_DIR = os.getenv("ACCOUNTS_RATELIMIT_DIR", "")
+# Reverse proxies in front of Django that append to X-Forwarded-For.
+ACCOUNTS_TRUSTED_PROXY_COUNT = int(os.getenv("ACCOUNTS_TRUSTED_PROXY_COUNT", "0"))
+# Logins authenticated at once per process; 0 means no limit.
+ACCOUNTS_LOGIN_MAX_IN_FLIGHT = int(os.getenv("ACCOUNTS_LOGIN_MAX_IN_FLIGHT", "100"))
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -145,3 +235,97 @@ CORS_ALLOW_CREDENTIALS = True
 CSRF_TRUSTED_ORIGINS = _get_list(
     os.getenv("DJANGO_CSRF_TRUSTED_ORIGINS"), _DEFAULT_FRONTEND_ORIGINS
 )
+
+
+# Bearer-token authentication (accounts.middleware.BearerTokenMiddleware)
+ACCOUNTS_VERIFIED_TOKEN_CACHE_SIZE = int(
+    os.getenv("ACCOUNTS_VERIFIED_TOKEN_CACHE_SIZE", "10000")
+)
+
+# Users whose Auth0 profile fingerprint is remembered in-process.
+ACCOUNTS_PROFILE_CACHE_SIZE = int(os.getenv("ACCOUNTS_PROFILE_CACHE_SIZE", "10000"))
+
+# Sessions (accounts.sessions): cached in SESSION_CACHE_ALIAS and written to
+# the database only on creation or change. A logout in one worker must end
+# the session in all of them, so the cached engine is the default only when
+# DJANGO_SESSION_CACHE_BACKEND/LOCATION point at a cache shared by the
+# workers (e.g. FileBasedCache under /dev/shm); with the per-process
+# local-memory cache plain database sessions are used unless
+# DJANGO_SESSION_ENGINE asks otherwise (a single process).
+_LOCMEM_CACHE = "django.core.cache.backends.locmem.LocMemCache"
+_SESSION_CACHE_BACKEND = os.getenv("DJANGO_SESSION_CACHE_BACKEND") or _LOCMEM_CACHE
+SESSION_ENGINE = os.getenv("DJANGO_SESSION_ENGINE") or (
+    "django.contrib.sessions.backends.db"
+    if _SESSION_CACHE_BACKEND == _LOCMEM_CACHE
+    else "accounts.sessions"
+)
+SESSION_CACHE_ALIAS = "sessions"
+CACHES = {
+    "default": {"BACKEND": _LOCMEM_CACHE},
+    "sessions": {
+        "BACKEND": _SESSION_CACHE_BACKEND,
+        "LOCATION": os.getenv("DJANGO_SESSION_CACHE_LOCATION", "sessions"),
+        "OPTIONS": {"MAX_ENTRIES": int(os.getenv("ACCOUNTS_SESSION_CACHE_SIZE", "10000"))},
+    },
+}
+ACCOUNTS_SESSION_CACHE_TTL = int(os.getenv("ACCOUNTS_SESSION_CACHE_TTL", "60"))
+ACCOUNTS_SESSION_WRITE_INTERVAL = int(os.getenv("ACCOUNTS_SESSION_WRITE_INTERVAL", "300"))
+# Seconds between purges of expired sessions; 0 disables the purge thread.
+ACCOUNTS_SESSION_PURGE_INTERVAL = float(os.getenv("ACCOUNTS_SESSION_PURGE_INTERVAL", "3600"))
+
+# Batch last_login updates and login audit events (accounts.writebehind).
+ACCOUNTS_WRITE_BEHIND = os.getenv("ACCOUNTS_WRITE_BEHIND", "True").lower() in {
+    "1",
+    "true",
+    "yes",
+}
+ACCOUNTS_WRITE_BEHIND_INTERVAL = float(os.getenv("ACCOUNTS_WRITE_BEHIND_INTERVAL", "1.0"))
+ACCOUNTS_WRITE_BEHIND_BATCH_SIZE = int(os.getenv("ACCOUNTS_WRITE_BEHIND_BATCH_SIZE", "500"))
+ACCOUNTS_WRITE_BEHIND_MAX_QUEUE = int(os.getenv("ACCOUNTS_WRITE_BEHIND_MAX_QUEUE", "10000"))
+
+# Prometheus metrics (accounts.metrics). With several worker processes set
+# ACCOUNTS_METRICS_DIR to a directory shared by all of them (and emptied on
+# deploy) so /api/metrics/ reports totals for the whole server.
+ACCOUNTS_METRICS_DIR = os.getenv("ACCOUNTS_METRICS_DIR", "")
+ACCOUNTS_METRICS_FLUSH_INTERVAL = float(os.getenv("ACCOUNTS_METRICS_FLUSH_INTERVAL", "5"))
+ACCOUNTS_METRICS_ALLOWED_IPS = _get_list(
+    os.getenv("ACCOUNTS_METRICS_ALLOWED_IPS"), ["127.0.0.1", "::1"]
+)
+
+# Warm-up when the WSGI/ASGI application is built (accounts.warmup): import
+# the URLconf, freeze the Auth0 config and prefetch the JWKS, then open the
+# database and Auth0 connections. Management commands and the hashing
+# workers skip it. Under
+# gunicorn --preload, gunicorn.conf.py turns DJANGO_WARMUP_CONNECT off so
+# the master opens no sockets and connects each worker in post_fork.
+ACCOUNTS_WARMUP = os.getenv("DJANGO_WARMUP", "False").lower() in {"1", "true", "yes"}
+ACCOUNTS_WARMUP_CONNECT = os.getenv("DJANGO_WARMUP_CONNECT", "True").lower() in {
+    "1",
+    "true",
+    "yes",
+}
+
+# Seconds the inventory budget summary (inventory.budget) stays cached. A
+# write clears it in its own process; others pick it up after this long.
+INVENTORY_BUDGET_CACHE_TTL = float(os.getenv("INVENTORY_BUDGET_CACHE_TTL", "5"))
+
+# Resource photos (inventory.photos): stored by content hash under
+# INVENTORY_PHOTO_ROOT; thumbnails are made by a thread pool when Pillow is
+# installed. With nginx in front, set INVENTORY_PHOTO_ACCEL_PREFIX to an
+# internal location aliased to INVENTORY_PHOTO_ROOT and nginx sends the files.
+INVENTORY_PHOTO_ROOT = os.getenv("INVENTORY_PHOTO_ROOT") or str(BASE_DIR / "media" / "photos")
+INVENTORY_PHOTO_MAX_BYTES = int(os.getenv("INVENTORY_PHOTO_MAX_BYTES", str(10 * 1024 * 1024)))
+INVENTORY_THUMBNAIL_SIZE = int(os.getenv("INVENTORY_THUMBNAIL_SIZE", "256"))
+INVENTORY_THUMBNAIL_WORKERS = int(os.getenv("INVENTORY_THUMBNAIL_WORKERS", "2"))
+INVENTORY_PHOTO_ACCEL_PREFIX = os.getenv("INVENTORY_PHOTO_ACCEL_PREFIX", "")
+
+# Autocomplete (inventory.search): each process keeps the index in memory,
+# starts from the snapshot at INVENTORY_SEARCH_SNAPSHOT and picks up other
+# processes' writes every INVENTORY_SEARCH_SYNC_INTERVAL seconds. Each of
+# those syncs also checks the next INVENTORY_SEARCH_SWEEP_BATCH names
+# against the table to drop the ones removed elsewhere (0 disables it).
+INVENTORY_SEARCH_SNAPSHOT = os.getenv("INVENTORY_SEARCH_SNAPSHOT") or str(
+    BASE_DIR / "media" / "search-index.pickle"
+)
+INVENTORY_SEARCH_SYNC_INTERVAL = float(os.getenv("INVENTORY_SEARCH_SYNC_INTERVAL", "2"))
+INVENTORY_SEARCH_SWEEP_BATCH = int(os.getenv("INVENTORY_SEARCH_SWEEP_BATCH", "5000"))
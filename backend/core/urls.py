@@ -19,5 +19,6 @@ from django.urls import include, path
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/inventory/', include('inventory.urls')),
     path('api/', include('accounts.urls')),
 ]
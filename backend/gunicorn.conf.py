@@ -0,0 +1,30 @@
+"""gunicorn settings: ``gunicorn -c gunicorn.conf.py`` from this directory.
+
+The application is loaded once in the master (``preload_app``), warm-up
+included, and forked into the workers, which then only open their own
+database and Auth0 connections (see ``accounts.warmup``).
+"""
+
+import os
+
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "core.settings")
+os.environ.setdefault("DJANGO_WARMUP", "True")
+# The master must not open sockets the workers would inherit.
+os.environ["DJANGO_WARMUP_CONNECT"] = "False"
+
+wsgi_app = "core.wsgi:application"
+bind = os.getenv("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.getenv("GUNICORN_WORKERS", str(2 * (os.cpu_count() or 1) + 1)))
+threads = int(os.getenv("GUNICORN_THREADS", "1"))
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", "0"))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", "0"))
+preload_app = True
+
+
+def post_fork(server, worker):
+    from django.conf import settings
+
+    if settings.ACCOUNTS_WARMUP:
+        from accounts.warmup import connect
+
+        connect()
@@ -0,0 +1,18 @@
+from django.contrib import admin
+
+from .models import Category, Resource
+
+
+@admin.register(Category)
+class CategoryAdmin(admin.ModelAdmin):
+    list_display = ("nombre",)
+    search_fields = ("nombre",)
+
+
+@admin.register(Resource)
+class ResourceAdmin(admin.ModelAdmin):
+    list_display = ("id", "recurso", "categoria", "cantidad", "precio")
+    list_filter = ("categoria",)
+    list_select_related = ("categoria",)
+    # Counting every row on each changelist page is what makes it slow.
+    show_full_result_count = False
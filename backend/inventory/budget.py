@@ -0,0 +1,123 @@
+"""Budget summary of the inventory, read from the per-category totals."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+from decimal import Decimal
+from typing import Any, Dict, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Category, CategoryBudget, Resource
+
+CACHE_KEY = "inventory:budget"
+
+_VALUE = ExpressionWrapper(
+    F("cantidad") * F("precio"), output_field=DecimalField(max_digits=24, decimal_places=2)
+)
+
+
+def invalidate() -> None:
+    cache.delete(CACHE_KEY)
+
+
+def summary() -> Dict[str, Any]:
+    """Inventory totals and one entry per category, largest value first."""
+
+    categories = []
+    recursos = unidades = 0
+    valor = Decimal("0.00")
+    budgets = CategoryBudget.objects.select_related("categoria").order_by(
+        "-valor", "categoria__clave"
+    )
+    for budget in budgets:
+        categories.append(
+            {
+                "id": budget.categoria_id,
+                "nombre": budget.categoria.nombre,
+                "recursos": budget.recursos,
+                "unidades": budget.unidades,
+                "valor": budget.valor,
+            }
+        )
+        recursos += budget.recursos
+        unidades += budget.unidades
+        valor += budget.valor
+    promedio = (valor / recursos).quantize(Decimal("0.01")) if recursos else Decimal("0.00")
+    return {
+        "recursos": recursos,
+        "unidades": unidades,
+        "valor": valor,
+        "promedio": promedio,
+        "categorias": categories,
+    }
+
+
+def cached_summary() -> Tuple[str, bytes]:
+    """``(etag, json body)`` of :func:`summary`, cached until the totals change.
+
+    Writes clear the cache of their own process when they commit; other
+    processes see them after ``INVENTORY_BUDGET_CACHE_TTL`` seconds unless
+    the cache backend is shared.
+    """
+
+    cached = cache.get(CACHE_KEY)
+    if cached is None:
+        body = json.dumps(summary(), cls=DjangoJSONEncoder).encode("utf-8")
+        cached = (hashlib.sha1(body).hexdigest(), body)
+        cache.set(CACHE_KEY, cached, getattr(settings, "INVENTORY_BUDGET_CACHE_TTL", 5))
+    return cached
+
+
+def rebuild(dry_run: bool = False) -> Dict[str, int]:
+    """Recompute every category's totals from its resources and fix the rows that differ."""
+
+    counts = dict.fromkeys(("checked", "fixed", "created"), 0)
+    with transaction.atomic():
+        # Lock the totals first: a concurrent write waits here, then applies
+        # its difference on top of the recomputed value.
+        stored = {
+            budget.categoria_id: budget
+            for budget in CategoryBudget.objects.select_for_update()
+        }
+        actual = {
+            row["categoria_id"]: row
+            for row in Resource.objects.values("categoria_id").annotate(
+                recursos=Count("id"),
+                unidades=Coalesce(Sum("cantidad"), 0),
+                valor=Coalesce(Sum(_VALUE), Decimal("0.00")),
+            )
+        }
+        changed, missing = [], []
+        for categoria_id in Category.objects.values_list("pk", flat=True):
+            counts["checked"] += 1
+            row = actual.get(categoria_id, {})
+            totals = {
+                "recursos": row.get("recursos", 0),
+                "unidades": row.get("unidades", 0),
+                "valor": Decimal(row.get("valor", 0)).quantize(Decimal("0.01")),
+            }
+            budget = stored.get(categoria_id)
+            if budget is None:
+                counts["created"] += 1
+                missing.append(CategoryBudget(categoria_id=categoria_id, **totals))
+            elif any(getattr(budget, name) != value for name, value in totals.items()):
+                counts["fixed"] += 1
+                for name, value in totals.items():
+                    setattr(budget, name, value)
+                budget.version += 1
+                changed.append(budget)
+        if not dry_run:
+            CategoryBudget.objects.bulk_create(missing, batch_size=500)
+            CategoryBudget.objects.bulk_update(
+                changed, ["recursos", "unidades", "valor", "version"], batch_size=500
+            )
+            if missing or changed:
+                transaction.on_commit(invalidate)
+    return counts
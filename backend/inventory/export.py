@@ -0,0 +1,258 @@
+"""Streaming CSV and XLSX exports of the resource listing.
+
+Rows come from ``iterator(chunk_size=...)`` (a server-side cursor on
+PostgreSQL) and are encoded as they arrive, so memory stays flat whatever
+the size of the export and the first bytes leave before the query ends.
+XLSX is a zip of XML parts: the sheet is written row by row through
+:mod:`zipfile`, which falls back to data descriptors on a stream it cannot
+seek, with inline strings instead of a shared strings table that would
+have to be kept until the end.
+
+Under ASGI Django would drain a sync iterator into a list before sending
+anything; :func:`aiter_chunks` hands it the pieces one at a time instead.
+"""
+
+from __future__ import annotations
+
+import csv
+import re
+import zipfile
+from decimal import Decimal
+from typing import AsyncIterator, Iterable, Iterator, List, Sequence
+from xml.sax.saxutils import escape
+
+from asgiref.sync import sync_to_async
+
+from .listing import FIELDS, Listing
+from .photos import photos_url, url_of
+
+HEADERS = ("ID", "Recurso", "Categoría", "Cantidad", "Precio", "Foto", "Información")
+
+CHUNK_SIZE = 2000
+
+# Rows encoded per yielded piece; one write per row would dominate.
+_ROWS_PER_PIECE = 500
+
+# Excel's limit is 1,048,576 rows per sheet, one of them the header.
+SHEET_ROWS = 1_048_575
+
+# Characters XML 1.0 does not allow, even escaped.
+_INVALID_XML = re.compile("[\x00-\x08\x0b\x0c\x0e-\x1f\ufffe\uffff]")
+
+
+_PHOTO = FIELDS.index("foto")
+
+
+def rows(listing: Listing, chunk_size: int = CHUNK_SIZE) -> Iterator[tuple]:
+    """The listing's rows as tuples of :data:`FIELDS`, in its order, with photo URLs."""
+
+    photos = photos_url()
+    for row in listing.queryset().values_list(*FIELDS).iterator(chunk_size=chunk_size):
+        if row[_PHOTO]:
+            row = (*row[:_PHOTO], url_of(row[_PHOTO], photos), *row[_PHOTO + 1 :])
+        yield row
+
+
+async def aiter_chunks(chunks: Iterator[bytes]) -> AsyncIterator[bytes]:
+    """Yield ``chunks`` to an async server, advancing it on the sync thread.
+
+    Every step runs in the same thread (``thread_sensitive``), so the query
+    and its cursor stay on one database connection.
+    """
+
+    step = sync_to_async(next, thread_sensitive=True)
+    try:
+        while True:
+            chunk = await step(chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            await sync_to_async(close, thread_sensitive=True)()
+
+
+class _Pending:
+    """A write-only file that keeps what was written until it is drained."""
+
+    def __init__(self) -> None:
+        self._parts: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+
+class _Line:
+    """The file argument of ``csv.writer`` when each line is wanted back."""
+
+    def write(self, line: str) -> str:
+        return line
+
+
+def stream_csv(source: Iterable[Sequence]) -> Iterator[bytes]:
+    # The BOM lets Excel open the file as UTF-8.
+    line = csv.writer(_Line())
+    yield ("\ufeff" + line.writerow(HEADERS)).encode("utf-8")
+    piece: List[str] = []
+    for row in source:
+        piece.append(line.writerow(row))
+        if len(piece) >= _ROWS_PER_PIECE:
+            yield "".join(piece).encode("utf-8")
+            piece.clear()
+    if piece:
+        yield "".join(piece).encode("utf-8")
+
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+    "{sheets}</Types>"
+)
+_SHEET_CONTENT_TYPE = (
+    '<Override PartName="/xl/worksheets/sheet{n}.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+    "</Relationships>"
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    "<sheets>{sheets}</sheets></workbook>"
+)
+_WORKBOOK_SHEET = '<sheet name="{name}" sheetId="{n}" r:id="rId{n}"/>'
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    "{sheets}"
+    '<Relationship Id="rId{styles}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    "</Relationships>"
+)
+_WORKBOOK_REL = (
+    '<Relationship Id="rId{n}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet{n}.xml"/>'
+)
+# Style 1: bold (header row); style 2: two decimals (precio).
+_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font>'
+    '<font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+    '<fills count="2"><fill><patternFill patternType="none"/></fill>'
+    '<fill><patternFill patternType="gray125"/></fill></fills>'
+    '<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>'
+    '<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>'
+    '<cellXfs count="3"><xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>'
+    '<xf numFmtId="0" fontId="1" fillId="0" borderId="0" xfId="0" applyFont="1"/>'
+    '<xf numFmtId="2" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/></cellXfs>'
+    "</styleSheet>"
+)
+_SHEET_START = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+    '<sheetViews><sheetView workbookViewId="0"><pane ySplit="1" topLeftCell="A2" '
+    'activePane="bottomLeft" state="frozen"/></sheetView></sheetViews><sheetData>'
+)
+_SHEET_END = "</sheetData></worksheet>"
+
+
+def _cell(value, style: int = 0) -> str:
+    attributes = f' s="{style}"' if style else ""
+    if isinstance(value, (int, Decimal)):
+        return f"<c{attributes}><v>{value}</v></c>"
+    text = escape(_INVALID_XML.sub("", str(value)))
+    return f'<c t="inlineStr"{attributes}><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _row(number: int, values: Sequence, styles: Sequence[int]) -> str:
+    cells = "".join(_cell(value, style) for value, style in zip(values, styles))
+    return f'<row r="{number}">{cells}</row>'
+
+
+_HEADER_STYLES = (1,) * len(HEADERS)
+_ROW_STYLES = tuple(2 if field == "precio" else 0 for field in FIELDS)
+
+
+def stream_xlsx(source: Iterable[Sequence], sheet_rows: int = SHEET_ROWS) -> Iterator[bytes]:
+    """Yield an XLSX workbook of ``source``, starting a sheet every ``sheet_rows`` rows."""
+
+    pending = _Pending()
+    with zipfile.ZipFile(pending, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        sheets = 0
+        sheet = None
+        rows_in_sheet = 0
+        piece: List[str] = []
+
+        def start_sheet():
+            nonlocal sheets
+            sheets += 1
+            # The size of a sheet is unknown up front; allow it to pass 2 GiB.
+            opened = archive.open(f"xl/worksheets/sheet{sheets}.xml", "w", force_zip64=True)
+            opened.write((_SHEET_START + _row(1, HEADERS, _HEADER_STYLES)).encode("utf-8"))
+            return opened
+
+        def end_sheet():
+            sheet.write(("".join(piece) + _SHEET_END).encode("utf-8"))
+            piece.clear()
+            sheet.close()
+
+        for values in source:
+            if sheet is None or rows_in_sheet >= sheet_rows:
+                if sheet is not None:
+                    end_sheet()
+                sheet = start_sheet()
+                rows_in_sheet = 0
+            rows_in_sheet += 1
+            piece.append(_row(rows_in_sheet + 1, values, _ROW_STYLES))
+            if len(piece) >= _ROWS_PER_PIECE:
+                sheet.write("".join(piece).encode("utf-8"))
+                piece.clear()
+                data = pending.drain()
+                if data:
+                    yield data
+
+        if sheet is None:
+            sheet = start_sheet()
+        end_sheet()
+
+        numbers = range(1, sheets + 1)
+        names = ["Inventario" if sheets == 1 else f"Inventario {n}" for n in numbers]
+        archive.writestr(
+            "[Content_Types].xml",
+            _CONTENT_TYPES.format(sheets="".join(_SHEET_CONTENT_TYPE.format(n=n) for n in numbers)),
+        )
+        archive.writestr("_rels/.rels", _ROOT_RELS)
+        archive.writestr(
+            "xl/workbook.xml",
+            _WORKBOOK.format(
+                sheets="".join(
+                    _WORKBOOK_SHEET.format(name=name, n=n) for name, n in zip(names, numbers)
+                )
+            ),
+        )
+        archive.writestr(
+            "xl/_rels/workbook.xml.rels",
+            _WORKBOOK_RELS.format(
+                sheets="".join(_WORKBOOK_REL.format(n=n) for n in numbers), styles=sheets + 1
+            ),
+        )
+        archive.writestr("xl/styles.xml", _STYLES)
+    yield pending.drain()
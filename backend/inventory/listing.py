@@ -0,0 +1,216 @@
+"""Filtering, ordering and keyset pagination of the resource listing.
+
+Every ordering is ``(<column>, id)`` and has a matching index, so a page is
+an index seek to the cursor followed by ``limit`` rows, however deep it
+is: there is no OFFSET to skip over. The cursor carries the ordering
+column and ``id`` of the last (or first) row of the previous page.
+"""
+
+from __future__ import annotations
+
+import base64
+import binascii
+import json
+from dataclasses import dataclass
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from django.db.models import Q, QuerySet
+
+from .models import Resource
+from .photos import photos_url, url_of
+from .text import fold
+
+# API name -> ordering column.
+ORDERINGS = {
+    "id": "id",
+    "recurso": "recurso_key",
+    "categoria": "categoria_key",
+    "cantidad": "cantidad",
+    "precio": "precio",
+}
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+
+# Columns returned for each resource, in the order exports write them.
+FIELDS = ("id", "recurso", "categoria__nombre", "cantidad", "precio", "foto", "info")
+
+# Sorts after every other character, closing a prefix range.
+_MAX_CHAR = "\U0010ffff"
+
+
+class ListingError(ValueError):
+    def __init__(self, message: str) -> None:
+        super().__init__(message)
+        self.message = message
+
+
+@dataclass(frozen=True)
+class Listing:
+    filters: Q
+    column: str
+    descending: bool
+
+    def queryset(self) -> QuerySet:
+        direction = "-" if self.descending else ""
+        order = [f"{direction}{self.column}"]
+        if self.column != "id":
+            order.append(f"{direction}id")
+        return Resource.objects.filter(self.filters).order_by(*order)
+
+
+def _int_param(params: Mapping[str, str], name: str) -> Optional[int]:
+    raw = (params.get(name) or "").strip()
+    if not raw:
+        return None
+    try:
+        return int(raw)
+    except ValueError:
+        raise ListingError(f"'{name}' must be an integer.")
+
+
+def parse_listing(params: Mapping[str, str]) -> Listing:
+    """Build the listing described by query parameters.
+
+    ``id``, ``id_min``, ``id_max``: id or inclusive id range.
+    ``recurso_prefix``: resource name prefix (index range scan).
+    ``recurso``, ``info``: substrings of the resource name / notes.
+    ``categoria``: category name.
+    ``ordering``: one of :data:`ORDERINGS`, ``-`` prefixed for descending.
+    Text filters ignore case and accents.
+    """
+
+    filters = Q()
+    exact = _int_param(params, "id")
+    if exact is not None:
+        filters &= Q(pk=exact)
+    low = _int_param(params, "id_min")
+    if low is not None:
+        filters &= Q(pk__gte=low)
+    high = _int_param(params, "id_max")
+    if high is not None:
+        filters &= Q(pk__lte=high)
+
+    prefix = fold(params.get("recurso_prefix") or "")
+    if prefix:
+        filters &= Q(recurso_key__gte=prefix, recurso_key__lt=prefix + _MAX_CHAR)
+    for name, column in (("recurso", "recurso_key"), ("info", "info_key")):
+        value = fold(params.get(name) or "")
+        if value:
+            filters &= Q(**{f"{column}__contains": value})
+    category = fold(params.get("categoria") or "")
+    if category:
+        filters &= Q(categoria_key=category)
+
+    ordering = (params.get("ordering") or "id").strip()
+    descending = ordering.startswith("-")
+    column = ORDERINGS.get(ordering.lstrip("-"))
+    if column is None:
+        raise ListingError(f"'ordering' must be one of: {', '.join(ORDERINGS)}.")
+    return Listing(filters, column, descending)
+
+
+def parse_limit(params: Mapping[str, str]) -> int:
+    limit = _int_param(params, "limit")
+    if limit is None:
+        return DEFAULT_LIMIT
+    if limit < 1:
+        raise ListingError("'limit' must be positive.")
+    return min(limit, MAX_LIMIT)
+
+
+def encode_cursor(backwards: bool, value: Any, pk: int) -> str:
+    if isinstance(value, Decimal):
+        value = str(value)
+    raw = json.dumps(["p" if backwards else "n", value, pk], separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, listing: Listing) -> Tuple[bool, Any, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        direction, value, pk = json.loads(raw)
+        if direction not in ("n", "p") or not isinstance(pk, int):
+            raise ValueError
+        if listing.column == "precio":
+            value = Decimal(value)
+            if not value.is_finite():
+                raise ValueError
+        elif listing.column in ("id", "cantidad"):
+            if not isinstance(value, int):
+                raise ValueError
+        elif not isinstance(value, str):
+            raise ValueError
+    except (ValueError, TypeError, InvalidOperation, binascii.Error, UnicodeDecodeError):
+        raise ListingError("Invalid cursor.")
+    return direction == "p", value, pk
+
+
+def _beyond(column: str, value: Any, pk: int, descending: bool) -> Q:
+    """Rows after ``(value, pk)`` in ``(column, id)`` order.
+
+    Written as ``column >= value AND (column > value OR id > pk)``: the first
+    term is a range the index can seek to, unlike a bare OR.
+    """
+
+    if column == "id":
+        return Q(pk__lt=pk) if descending else Q(pk__gt=pk)
+    op = "lt" if descending else "gt"
+    return Q(**{f"{column}__{op}e": value}) & (
+        Q(**{f"{column}__{op}": value}) | Q(**{f"pk__{op}": pk})
+    )
+
+
+def to_json(row: Dict[str, Any], photos: Optional[str] = None) -> Dict[str, Any]:
+    """The API form of a row of ``values(*FIELDS)``.
+
+    ``photos`` is :func:`inventory.photos.photos_url`, when converting many rows.
+    """
+
+    photos = photos_url() if photos is None else photos
+    return {
+        "id": row["id"],
+        "recurso": row["recurso"],
+        "categoria": row["categoria__nombre"],
+        "cantidad": row["cantidad"],
+        "precio": row["precio"],
+        "foto": url_of(row["foto"], photos),
+        "miniatura": url_of(row["foto"], photos, thumbnail=True),
+        "info": row["info"],
+    }
+
+
+@dataclass
+class Page:
+    results: List[Dict[str, Any]]
+    next: Optional[str]
+    previous: Optional[str]
+
+
+def page(listing: Listing, cursor: Optional[str], limit: int) -> Page:
+    """Fetch one page of ``limit`` rows after (or before) ``cursor``."""
+
+    backwards, value, pk = decode_cursor(cursor, listing) if cursor else (False, None, 0)
+    # Walking backwards is walking forwards in the reverse order.
+    descending = listing.descending != backwards
+    queryset = Listing(listing.filters, listing.column, descending).queryset()
+    if cursor:
+        queryset = queryset.filter(_beyond(listing.column, value, pk, descending))
+
+    columns = FIELDS if listing.column == "id" else (*FIELDS, listing.column)
+    rows = list(queryset.values(*columns)[: limit + 1])
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if backwards:
+        rows.reverse()
+
+    def cursor_for(row: Dict[str, Any], to_previous: bool) -> str:
+        return encode_cursor(to_previous, row[listing.column], row["id"])
+
+    has_next = more if not backwards else bool(cursor)
+    has_previous = bool(cursor) if not backwards else more
+    next_cursor = cursor_for(rows[-1], False) if rows and has_next else None
+    previous_cursor = cursor_for(rows[0], True) if rows and has_previous else None
+    photos = photos_url()
+    return Page([to_json(row, photos) for row in rows], next_cursor, previous_cursor)
@@ -0,0 +1,302 @@
+"""Measure resource listing and export latency as the table grows."""
+
+import random
+import tempfile
+import time
+from decimal import Decimal
+from pathlib import Path
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from inventory import scenarios, search
+from inventory.export import rows, stream_csv, stream_xlsx
+from inventory.listing import ORDERINGS, Listing, encode_cursor, page, parse_listing
+from inventory.models import Category, Resource
+
+# Bench resource names are two of these and a serial, so that prefixes and
+# substrings have realistic fan-out for the autocomplete.
+_WORDS = (
+    "taladro", "martillo", "llave", "cable", "cinta", "sierra", "broca", "tornillo",
+    "tuerca", "alicate", "pintura", "brocha", "guante", "casco", "manguera", "válvula",
+    "enchufe", "interruptor", "ampolleta", "lija", "nivel", "escalera", "carretilla",
+    "pala", "rastrillo", "tubo", "codo", "soldadura", "electrodo", "disco",
+)
+
+
+def _rss_mb():
+    """Current resident set size, where /proc is available."""
+
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def _percentile(ordered, q):
+    if not ordered:
+        return 0.0
+    return ordered[max(0, int(round(q / 100 * len(ordered))) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Insert --rows bench resources spread over --categories bench "
+        "categories, then time the first page and pages deep into the table "
+        "for every ordering, with and without a category filter, and report "
+        "p50/p99. Deep pages start from a cursor at a random row, as a client "
+        "that kept clicking 'next' would. --export csv/xlsx then streams the "
+        "whole table in that format and reports the time to the first rows, "
+        "the total time and the RSS growth. --scenarios N loads the budget "
+        "columns and evaluates N random what-if scenarios with each available "
+        "backend, next to one scenario evaluated item by item. --search N "
+        "builds the autocomplete index, writes and reloads its snapshot and "
+        "times N queries and one full removal sweep. Bench rows are deleted "
+        "afterwards unless --keep is given."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=100_000)
+        parser.add_argument("--categories", type=int, default=20)
+        parser.add_argument("--pages", type=int, default=200, help="Pages timed per case.")
+        parser.add_argument("--limit", type=int, default=50)
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--prefix", default="bench-")
+        parser.add_argument("--keep", action="store_true", help="Keep the bench rows.")
+        parser.add_argument("--export", action="append", choices=("csv", "xlsx"), default=[])
+        parser.add_argument("--scenarios", type=int, default=0)
+        parser.add_argument("--search", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = random.Random(20)
+        categories = self._seed(options, rng)
+        try:
+            self.stdout.write(
+                f"{connection.vendor} rows={Resource.objects.count()} limit={options['limit']}"
+            )
+            filters = [None, rng.choice(categories).nombre]
+            if options["pages"] > 0:
+                self.stdout.write(f"{'case':<32} {'p50 ms':>9} {'p99 ms':>9}")
+                for name in ORDERINGS:
+                    for ordering in (name, f"-{name}"):
+                        for category in filters:
+                            self._case(options, rng, ordering, category)
+            for fmt in options["export"]:
+                self._export(fmt)
+            if options["scenarios"] > 0:
+                self._scenarios(options["scenarios"], categories, rng)
+            if options["search"] > 0:
+                self._search(options["search"], rng)
+        finally:
+            if not options["keep"]:
+                Resource.objects.filter(categoria__in=categories).delete()
+                Category.objects.filter(pk__in=[category.pk for category in categories]).delete()
+
+    def _seed(self, options, rng):
+        prefix = options["prefix"]
+        categories = []
+        for index in range(max(1, options["categories"])):
+            category, _ = Category.objects.get_or_create(
+                clave=f"{prefix}{index}", defaults={"nombre": f"{prefix}{index}"}
+            )
+            categories.append(category)
+        missing = options["rows"] - Resource.objects.filter(categoria__in=categories).count()
+
+        started = time.perf_counter()
+        while missing > 0:
+            batch = []
+            for _ in range(min(missing, options["batch_size"])):
+                resource = Resource(
+                    recurso=(
+                        f"{rng.choice(_WORDS).capitalize()} {rng.choice(_WORDS)} "
+                        f"{rng.randrange(10**6):06d}"
+                    ),
+                    categoria=rng.choice(categories),
+                    cantidad=rng.randrange(1000),
+                    precio=Decimal(rng.randrange(10**7)) / 100,
+                    info=f"bodega {rng.randrange(50)}",
+                )
+                resource.fill_keys()
+                batch.append(resource)
+            with transaction.atomic():
+                Resource.objects.bulk_create(batch)
+            missing -= len(batch)
+        if connection.vendor in ("sqlite", "postgresql"):
+            with connection.cursor() as cursor:
+                cursor.execute("ANALYZE")
+        self.stdout.write(f"seeded in {time.perf_counter() - started:.1f}s")
+        return categories
+
+    def _case(self, options, rng, ordering, category):
+        params = {"ordering": ordering}
+        if category:
+            params["categoria"] = category
+        listing = parse_listing(params)
+        anchors = self._anchors(listing, options["pages"], rng)
+
+        label = ordering + (" categoria" if category else "")
+        for kind, cursors in (("first", [None] * len(anchors)), ("deep", anchors)):
+            latencies = []
+            for cursor in cursors:
+                started = time.perf_counter()
+                page(listing, cursor, options["limit"])
+                latencies.append(time.perf_counter() - started)
+            latencies.sort()
+            self.stdout.write(
+                f"{label + ' ' + kind:<32} {_percentile(latencies, 50) * 1000:>9.2f} "
+                f"{_percentile(latencies, 99) * 1000:>9.2f}"
+            )
+
+    def _anchors(self, listing: Listing, count, rng):
+        """Cursors at random rows of ``listing``, found without OFFSET."""
+
+        column = listing.column
+        bounds = Resource.objects.filter(listing.filters).order_by("id").values_list("id", flat=True)
+        low, high = bounds.first(), bounds.last()
+        if low is None:
+            return []
+        anchors = []
+        for _ in range(count):
+            row = (
+                Resource.objects.filter(listing.filters, pk__gte=rng.randint(low, high))
+                .order_by("id")
+                .values("id", column)
+                .first()
+            )
+            if row is not None:
+                anchors.append(encode_cursor(False, row[column], row["id"]))
+        return anchors
+
+    def _export(self, fmt):
+        encode = stream_csv if fmt == "csv" else stream_xlsx
+        baseline = _rss_mb()
+        peak = baseline
+        size = pieces = 0
+        first = None
+        started = time.perf_counter()
+        for piece in encode(rows(parse_listing({"ordering": "precio"}))):
+            size += len(piece)
+            pieces += 1
+            # The CSV header goes out before the query; time the first rows.
+            if first is None and (fmt == "xlsx" or pieces > 1):
+                first = time.perf_counter() - started
+            if baseline is not None and pieces % 100 == 0:
+                peak = max(peak, _rss_mb())
+        elapsed = time.perf_counter() - started
+        growth = f"{peak - baseline:.1f}MB" if baseline is not None else "n/a"
+        self.stdout.write(
+            f"export {fmt}: first_rows={(first or 0) * 1000:.1f}ms total={elapsed:.1f}s "
+            f"size={size / 2**20:.1f}MB rss_growth={growth}"
+        )
+
+    def _scenarios(self, count, categories, rng):
+        batch = [
+            scenarios.Scenario(
+                f"s{index}",
+                inflacion={category.pk: rng.uniform(-0.1, 0.3) for category in categories},
+                reposicion={category.pk: rng.randrange(1000) for category in categories},
+                tipo_cambio=rng.choice((1.0, 950.0)),
+            )
+            for index in range(count)
+        ]
+        backends = [False] + ([True] if scenarios.numpy is not None else [])
+        for use_numpy in backends:
+            name = "numpy" if use_numpy else "python"
+            started = time.perf_counter()
+            cols = scenarios.load_columns(use_numpy=use_numpy)
+            loaded = time.perf_counter() - started
+            started = time.perf_counter()
+            scenarios.evaluate(cols, batch, use_numpy=use_numpy)
+            evaluated = time.perf_counter() - started
+            self.stdout.write(
+                f"scenarios {name}: rows={cols.rows} scenarios={count} "
+                f"load={loaded:.2f}s evaluate={evaluated * 1000:.1f}ms"
+            )
+
+        # The baseline: one scenario over every item, as the page sums them.
+        first = batch[0]
+        items = list(Resource.objects.values_list("categoria_id", "cantidad", "precio"))
+        started = time.perf_counter()
+        totals = {}
+        for categoria_id, cantidad, precio in items:
+            units = max(cantidad, first.reposicion.get(categoria_id, 0))
+            factor = 1 + first.inflacion.get(categoria_id, first.inflacion_general)
+            totals[categoria_id] = (
+                totals.get(categoria_id, 0.0)
+                + units * float(precio) * factor / first.tipo_cambio
+            )
+        per_scenario = time.perf_counter() - started
+        self.stdout.write(
+            f"scenarios per-item loop: {per_scenario * 1000:.1f}ms per scenario, "
+            f"~{per_scenario * count:.1f}s for {count}"
+        )
+
+    def _search(self, count, rng):
+        started = time.perf_counter()
+        autocomplete = search.Autocomplete.from_database()
+        built = time.perf_counter() - started
+        index = autocomplete.indexes["recurso"]
+        with tempfile.TemporaryDirectory() as directory:
+            path = Path(directory) / "search-index.pickle"
+            started = time.perf_counter()
+            autocomplete.write_snapshot(path)
+            written = time.perf_counter() - started
+            size = path.stat().st_size
+            started = time.perf_counter()
+            search.Autocomplete.from_snapshot(path)
+            loaded = time.perf_counter() - started
+        self.stdout.write(
+            f"search: terms={len(index)} build={built:.1f}s snapshot_write={written:.1f}s "
+            f"snapshot_load={loaded:.1f}s size={size / 2**20:.1f}MB"
+        )
+
+        # Queries as typed, from the start of a word, and fragments from
+        # inside one (the trigram path).
+        cases = {"word-start": [], "inner": []}
+        for number in range(count):
+            key = index.keys[rng.randrange(len(index.keys))]
+            starts = [0] + [offset + 1 for offset, char in enumerate(key) if char == " "]
+            if number % 2:
+                inner = [offset for offset in range(1, len(key) - 2) if offset not in starts]
+                start, kind = (rng.choice(inner), "inner") if inner else (0, "word-start")
+            else:
+                start, kind = rng.choice(starts), "word-start"
+            cases[kind].append(key[start : start + rng.randint(2, 8)])
+        for kind, queries in cases.items():
+            latencies, found = [], 0
+            for query in queries:
+                started = time.perf_counter()
+                found += len(index.search(query, search.DEFAULT_LIMIT))
+                latencies.append(time.perf_counter() - started)
+            latencies.sort()
+            self.stdout.write(
+                f"search {kind}: queries={len(queries)} "
+                f"p50={_percentile(latencies, 50) * 1000:.3f}ms "
+                f"p99={_percentile(latencies, 99) * 1000:.3f}ms "
+                f"results/query={found / max(1, len(queries)):.1f}"
+            )
+
+        # One full pass of the removal sweep that rides along with each sync.
+        batch = search._sweep_batch()
+        if batch > 0:
+            sweeps = []
+            for _ in range(-(-len(index.ordered) // batch)):
+                started = time.perf_counter()
+                autocomplete._sweep_resources(batch)
+                sweeps.append(time.perf_counter() - started)
+            sweeps.sort()
+            self.stdout.write(
+                f"search sweep: batch={batch} batches={len(sweeps)} "
+                f"p50={_percentile(sweeps, 50) * 1000:.1f}ms "
+                f"p99={_percentile(sweeps, 99) * 1000:.1f}ms full_pass={sum(sweeps):.1f}s"
+            )
+
+        started = time.perf_counter()
+        for number in range(count):
+            index.add(f"Bench nuevo {number:06d}")
+        added = time.perf_counter() - started
+        self.stdout.write(f"search add: {added / count * 1e6:.0f}us per new name")
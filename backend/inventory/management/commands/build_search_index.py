@@ -0,0 +1,24 @@
+"""Rebuild the autocomplete index and its snapshot."""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventory.search import build, snapshot_path
+
+
+class Command(BaseCommand):
+    help = (
+        "Index every resource and category name again and write the snapshot "
+        "running processes reload. Run it after bulk loads or "
+        "QuerySet.update() on resources, and now and then to compact the "
+        "index: removed names are only marked dead until then."
+    )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        built = build()
+        terms = " ".join(f"{field}={len(index)}" for field, index in built.indexes.items())
+        self.stdout.write(
+            f"{terms} snapshot={snapshot_path()} elapsed={time.perf_counter() - started:.1f}s"
+        )
@@ -0,0 +1,26 @@
+"""Recompute the per-category budget totals from the resources."""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventory.budget import rebuild
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute each category's resource count, units and value from its "
+        "resources and fix the stored totals that differ. Run it after bulk "
+        "loads or QuerySet.update()/delete() on resources, which do not "
+        "maintain the totals, or to check them (--dry-run)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        counts = rebuild(dry_run=options["dry_run"])
+        prefix = "dry-run " if options["dry_run"] else ""
+        summary = " ".join(f"{name}={value}" for name, value in counts.items())
+        self.stdout.write(f"{prefix}{summary} elapsed={time.perf_counter() - started:.1f}s")
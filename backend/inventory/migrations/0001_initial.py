@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:30
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=100, unique=True)),
+                ('clave', models.CharField(editable=False, max_length=200, unique=True)),
+            ],
+            options={
+                'ordering': ['clave'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Resource',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recurso', models.CharField(max_length=200)),
+                ('recurso_key', models.CharField(editable=False, max_length=400)),
+                ('categoria_key', models.CharField(editable=False, max_length=200)),
+                ('cantidad', models.PositiveIntegerField(default=0)),
+                ('precio', models.DecimalField(decimal_places=2, default=0, max_digits=12, validators=[django.core.validators.MinValueValidator(0)])),
+                ('foto', models.CharField(blank=True, max_length=500)),
+                ('info', models.TextField(blank=True)),
+                ('info_key', models.TextField(blank=True, editable=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('categoria', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='recursos', to='inventory.category')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['recurso_key', 'id'], name='inv_res_recurso_idx'), models.Index(fields=['categoria_key', 'id'], name='inv_res_categoria_idx'), models.Index(fields=['cantidad', 'id'], name='inv_res_cantidad_idx'), models.Index(fields=['precio', 'id'], name='inv_res_precio_idx'), models.Index(fields=['categoria_key', 'recurso_key', 'id'], name='inv_res_cat_recurso_idx'), models.Index(fields=['categoria_key', 'cantidad', 'id'], name='inv_res_cat_cantidad_idx'), models.Index(fields=['categoria_key', 'precio', 'id'], name='inv_res_cat_precio_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, ExpressionWrapper, F, Sum
+
+
+def fill_budgets(apps, schema_editor):
+    Category = apps.get_model("inventory", "Category")
+    CategoryBudget = apps.get_model("inventory", "CategoryBudget")
+    Resource = apps.get_model("inventory", "Resource")
+    value = ExpressionWrapper(
+        F("cantidad") * F("precio"), output_field=DecimalField(max_digits=24, decimal_places=2)
+    )
+    totals = {
+        row["categoria_id"]: row
+        for row in Resource.objects.values("categoria_id").annotate(
+            recursos=Count("id"), unidades=Sum("cantidad"), valor=Sum(value)
+        )
+    }
+    CategoryBudget.objects.bulk_create(
+        [
+            CategoryBudget(
+                categoria_id=pk,
+                recursos=totals.get(pk, {}).get("recursos") or 0,
+                unidades=totals.get(pk, {}).get("unidades") or 0,
+                valor=totals.get(pk, {}).get("valor") or 0,
+            )
+            for pk in Category.objects.values_list("pk", flat=True)
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CategoryBudget',
+            fields=[
+                ('categoria', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='budget', serialize=False, to='inventory.category')),
+                ('recursos', models.PositiveIntegerField(default=0)),
+                ('unidades', models.BigIntegerField(default=0)),
+                ('valor', models.DecimalField(decimal_places=2, default=0, max_digits=24)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(fill_budgets, migrations.RunPython.noop),
+    ]
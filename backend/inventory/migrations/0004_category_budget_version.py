@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 16:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_category_budget'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='categorybudget',
+            name='version',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,209 @@
+from decimal import Decimal
+
+from django.core.validators import MinValueValidator
+from django.db import models, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .text import fold
+
+
+def _resource_changed(old, new) -> None:
+    from . import search
+
+    search.resource_changed(old, new)
+
+
+def _categories_changed() -> None:
+    from . import search
+
+    search.categories_changed()
+
+
+class Category(models.Model):
+    nombre = models.CharField(max_length=100, unique=True)
+    # Folded name: "Herramientas" and "herramientas " are the same category.
+    clave = models.CharField(max_length=200, unique=True, editable=False)
+
+    class Meta:
+        ordering = ["clave"]
+
+    def __str__(self) -> str:
+        return self.nombre
+
+    def save(self, *args, **kwargs):
+        self.nombre = " ".join(self.nombre.split())
+        self.clave = fold(self.nombre)
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                CategoryBudget.objects.create(categoria=self)
+            else:
+                # Resources carry the key for sorting; a rename rewrites them.
+                self.recursos.exclude(categoria_key=self.clave).update(
+                    categoria_key=self.clave
+                )
+            transaction.on_commit(_categories_changed)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            transaction.on_commit(_categories_changed)
+        return result
+
+
+class Resource(models.Model):
+    """One inventory line, as the ``inventario`` page shows it.
+
+    The ``*_key`` columns hold folded copies of the text fields (see
+    :func:`inventory.text.fold`). Every sortable column is indexed together
+    with ``id``, the tiebreaker of keyset pagination, both alone and behind
+    ``categoria_key`` so that filtering by category keeps index order.
+    """
+
+    recurso = models.CharField(max_length=200)
+    recurso_key = models.CharField(max_length=400, editable=False)
+    categoria = models.ForeignKey(Category, on_delete=models.PROTECT, related_name="recursos")
+    categoria_key = models.CharField(max_length=200, editable=False)
+    cantidad = models.PositiveIntegerField(default=0)
+    precio = models.DecimalField(
+        max_digits=12, decimal_places=2, default=0, validators=[MinValueValidator(0)]
+    )
+    foto = models.CharField(max_length=500, blank=True)
+    info = models.TextField(blank=True)
+    info_key = models.TextField(blank=True, editable=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["recurso_key", "id"], name="inv_res_recurso_idx"),
+            models.Index(fields=["categoria_key", "id"], name="inv_res_categoria_idx"),
+            models.Index(fields=["cantidad", "id"], name="inv_res_cantidad_idx"),
+            models.Index(fields=["precio", "id"], name="inv_res_precio_idx"),
+            models.Index(
+                fields=["categoria_key", "recurso_key", "id"], name="inv_res_cat_recurso_idx"
+            ),
+            models.Index(
+                fields=["categoria_key", "cantidad", "id"], name="inv_res_cat_cantidad_idx"
+            ),
+            models.Index(fields=["categoria_key", "precio", "id"], name="inv_res_cat_precio_idx"),
+            # Other processes' autocomplete indexes catch up from here.
+            models.Index(fields=["updated_at"], name="inv_res_updated_idx"),
+        ]
+
+    def __str__(self) -> str:
+        return self.recurso
+
+    def fill_keys(self) -> None:
+        """Set the folded columns; ``save()`` does it, bulk inserts must call it."""
+
+        self.recurso = " ".join(self.recurso.split())
+        self.recurso_key = fold(self.recurso)
+        self.categoria_key = self.categoria.clave
+        self.info_key = fold(self.info)
+
+    def _stored(self):
+        """``(categoria_id, cantidad, precio, recurso)`` as stored, locking the row."""
+
+        return (
+            Resource.objects.select_for_update()
+            .filter(pk=self.pk)
+            .values_list("categoria_id", "cantidad", "precio", "recurso")
+            .first()
+        )
+
+    def save(self, *args, **kwargs):
+        self.fill_keys()
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            kwargs["update_fields"] = {*update_fields, "recurso_key", "categoria_key", "info_key"}
+        with transaction.atomic():
+            stored = None if self._state.adding else self._stored()
+            old = None if stored is None else stored[:3]
+            super().save(*args, **kwargs)
+            new = (self.categoria_id, self.cantidad, self.precio, self.recurso)
+            if stored is not None and update_fields is not None:
+                # Fields left out of update_fields keep their stored value.
+                saved = (
+                    bool({"categoria", "categoria_id"} & set(update_fields)),
+                    "cantidad" in update_fields,
+                    "precio" in update_fields,
+                    "recurso" in update_fields,
+                )
+                new = tuple(value if keep else kept for value, kept, keep in zip(new, stored, saved))
+            CategoryBudget.move(old, new[:3])
+            if stored is None or stored[3] != new[3]:
+                old_name, new_name = stored and stored[3], new[3]
+                transaction.on_commit(lambda: _resource_changed(old_name, new_name))
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            stored = self._stored()
+            result = super().delete(*args, **kwargs)
+            if stored is not None:
+                CategoryBudget.move(stored[:3], None)
+                transaction.on_commit(lambda: _resource_changed(stored[3], None))
+        return result
+
+
+class CategoryBudget(models.Model):
+    """Running totals of one category's resources.
+
+    ``Resource.save()`` and ``delete()`` apply the difference they make in
+    the same transaction, so dashboards read one row per category instead
+    of every resource. Bulk inserts, ``QuerySet.update()`` and
+    ``QuerySet.delete()`` bypass them; ``rebuild_inventory_budget`` repairs
+    the totals afterwards.
+    """
+
+    categoria = models.OneToOneField(
+        Category, on_delete=models.CASCADE, primary_key=True, related_name="budget"
+    )
+    recursos = models.PositiveIntegerField(default=0)
+    unidades = models.BigIntegerField(default=0)
+    valor = models.DecimalField(max_digits=24, decimal_places=2, default=0)
+    # Bumped by every change to the category's resources.
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self) -> str:
+        return f"{self.categoria_id}: {self.valor}"
+
+    @classmethod
+    def add(cls, categoria_id: int, recursos: int, unidades: int, valor: Decimal) -> None:
+        changes = {
+            "recursos": F("recursos") + recursos,
+            "unidades": F("unidades") + unidades,
+            "valor": F("valor") + valor,
+            "version": F("version") + 1,
+            "updated_at": timezone.now(),
+        }
+        if not cls.objects.filter(pk=categoria_id).update(**changes):
+            # A category created before budgets existed.
+            cls.objects.get_or_create(categoria_id=categoria_id)
+            cls.objects.filter(pk=categoria_id).update(**changes)
+        from .budget import invalidate
+
+        transaction.on_commit(invalidate)
+
+    @classmethod
+    def move(cls, old, new) -> None:
+        """Apply a resource going from ``old`` to ``new`` ``(categoria_id, cantidad, precio)``.
+
+        Either may be ``None`` (created, deleted).
+        """
+
+        if old == new:
+            return
+        precio = Resource._meta.get_field("precio")
+        if old is not None and new is not None and old[0] == new[0]:
+            cantidad = new[1] - old[1]
+            valor = new[1] * precio.to_python(new[2]) - old[1] * precio.to_python(old[2])
+            cls.add(new[0], 0, cantidad, valor)
+            return
+        if old is not None:
+            cls.add(old[0], -1, -old[1], -old[1] * precio.to_python(old[2]))
+        if new is not None:
+            cls.add(new[0], 1, new[1], new[1] * precio.to_python(new[2]))
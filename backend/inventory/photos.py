@@ -0,0 +1,245 @@
+"""Content-addressed storage of resource photos and their thumbnails.
+
+A photo is stored once under the SHA-256 of its bytes, as
+``<root>/<hh>/<sha256>.<ext>``; uploading the same image again returns the
+stored one. The name ``<sha256>.<ext>`` is what ``Resource.foto`` keeps and
+what the photo URL ends with, so a URL always means the same bytes and can
+be cached forever.
+
+Thumbnails (``<root>/thumbs/<hh>/<sha256>-<size>.jpg``) are made by a
+small thread pool after the upload returns. They need Pillow; without it
+the original is served in their place.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import logging
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.urls import reverse
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover - optional dependency
+    Image = None
+
+logger = logging.getLogger(__name__)
+
+NAME = re.compile(r"^[0-9a-f]{64}\.(jpg|png|gif|webp)$")
+
+CONTENT_TYPES = {
+    "jpg": "image/jpeg",
+    "png": "image/png",
+    "gif": "image/gif",
+    "webp": "image/webp",
+}
+
+_CHUNK = 64 * 1024
+
+
+class PhotoError(ValueError):
+    def __init__(self, message: str, status: int = 400) -> None:
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+def root() -> Path:
+    return Path(settings.INVENTORY_PHOTO_ROOT)
+
+
+def thumbnail_size() -> int:
+    return int(getattr(settings, "INVENTORY_THUMBNAIL_SIZE", 256))
+
+
+def _sniff(head: bytes) -> Optional[str]:
+    """The extension for the image format ``head`` starts with."""
+
+    if head.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if head[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "webp"
+    return None
+
+
+def path_of(name: str) -> Path:
+    return root() / name[:2] / name
+
+
+def thumbnail_path(name: str) -> Path:
+    digest = name.split(".", 1)[0]
+    return root() / "thumbs" / name[:2] / f"{digest}-{thumbnail_size()}.jpg"
+
+
+def photos_url() -> str:
+    """The URL photos are served under; a photo's URL is this plus its name."""
+
+    return reverse("inventory:photos")
+
+
+def url_of(name: str, base: Optional[str] = None, thumbnail: bool = False) -> str:
+    """The URL of a stored photo; other values (external URLs, "") pass through.
+
+    Pass ``base`` (:func:`photos_url`) when building many URLs.
+    """
+
+    if not NAME.match(name):
+        return name
+    base = photos_url() if base is None else base
+    return f"{base}thumbnails/{name}" if thumbnail else f"{base}{name}"
+
+
+def name_of(value: str) -> Optional[str]:
+    """The stored photo a ``foto`` value (a name or one of its URLs) refers to."""
+
+    candidate = value.rsplit("/", 1)[-1]
+    if NAME.match(candidate) and (candidate == value or value.startswith(photos_url())):
+        return candidate
+    return None
+
+
+def store(chunks: Iterable[bytes]) -> Tuple[str, bool]:
+    """Store an uploaded image; return its name and whether it was new.
+
+    The bytes are hashed while they are written to a temporary file in the
+    same directory tree, which is then renamed into place: readers never
+    see a partial photo and concurrent uploads of the same image agree.
+    """
+
+    max_bytes = int(getattr(settings, "INVENTORY_PHOTO_MAX_BYTES", 10 * 1024 * 1024))
+    scratch = root() / "tmp"
+    scratch.mkdir(parents=True, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    extension = None
+    handle = tempfile.NamedTemporaryFile(dir=scratch, delete=False)
+    try:
+        with handle:
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                if extension is None:
+                    extension = _sniff(chunk[:16])
+                    if extension is None:
+                        raise PhotoError("Only JPEG, PNG, GIF and WebP images are accepted.", 415)
+                size += len(chunk)
+                if size > max_bytes:
+                    raise PhotoError(f"Photos are limited to {max_bytes} bytes.", 413)
+                digest.update(chunk)
+                handle.write(chunk)
+        if extension is None:
+            raise PhotoError("Empty upload.")
+
+        name = f"{digest.hexdigest()}.{extension}"
+        target = path_of(name)
+        if target.exists():
+            return name, False
+        target.parent.mkdir(parents=True, exist_ok=True)
+        os.chmod(handle.name, 0o644)
+        os.replace(handle.name, target)
+        return name, True
+    finally:
+        if os.path.exists(handle.name):
+            os.unlink(handle.name)
+
+
+def read_chunks(stream: BinaryIO) -> Iterable[bytes]:
+    while True:
+        chunk = stream.read(_CHUNK)
+        if not chunk:
+            return
+        yield chunk
+
+
+def make_thumbnail(name: str) -> Optional[Path]:
+    """Write the thumbnail of ``name`` if it is missing; ``None`` without Pillow."""
+
+    if Image is None:
+        return None
+    target = thumbnail_path(name)
+    if target.exists():
+        return target
+    size = thumbnail_size()
+    with Image.open(path_of(name)) as image:
+        # Decode at a reduced scale where the format allows it (JPEG).
+        image.draft("RGB", (size, size))
+        image.thumbnail((size, size))
+        if image.mode not in ("RGB", "L"):
+            background = Image.new("RGB", image.size, (255, 255, 255))
+            rgba = image.convert("RGBA")
+            background.paste(rgba, mask=rgba.getchannel("A"))
+            image = background
+        target.parent.mkdir(parents=True, exist_ok=True)
+        partial = target.with_name(f"{target.name}.{os.getpid()}.{threading.get_ident()}")
+        image.save(partial, "JPEG", quality=85, optimize=True)
+    os.replace(partial, target)
+    return target
+
+
+class ThumbnailPool:
+    """Generate thumbnails off the request thread, once per photo at a time."""
+
+    def __init__(self, workers: int = 2) -> None:
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, workers), thread_name_prefix="inventory-thumbnails"
+        )
+        self._pending: Dict[str, Future] = {}
+        self._lock = threading.Lock()
+        self.generated = 0
+        self.failed = 0
+
+    def submit(self, name: str) -> Optional[Future]:
+        if Image is None:
+            return None
+        with self._lock:
+            future = self._pending.get(name)
+            if future is None:
+                future = self._executor.submit(self._run, name)
+                self._pending[name] = future
+            return future
+
+    def _run(self, name: str) -> Optional[Path]:
+        try:
+            path = make_thumbnail(name)
+            self.generated += 1
+            return path
+        except Exception:
+            self.failed += 1
+            logger.exception("Thumbnail of %s failed", name)
+            return None
+        finally:
+            with self._lock:
+                self._pending.pop(name, None)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True)
+
+
+_pool: Optional[ThumbnailPool] = None
+_pool_pid: Optional[int] = None
+_pool_lock = threading.Lock()
+
+
+def get_thumbnail_pool() -> ThumbnailPool:
+    """The process-wide pool; a forked worker starts its own."""
+
+    global _pool, _pool_pid
+    pid = os.getpid()
+    if _pool is None or _pool_pid != pid:
+        with _pool_lock:
+            if _pool is None or _pool_pid != pid:
+                _pool = ThumbnailPool(getattr(settings, "INVENTORY_THUMBNAIL_WORKERS", 2))
+                _pool_pid = pid
+    return _pool
@@ -0,0 +1,494 @@
+"""In-memory autocomplete over resource names and category names.
+
+Every distinct folded text (see :func:`inventory.text.fold`) is a term with
+three lookups:
+
+* the terms sorted by key. It works as a flattened prefix trie: the keys
+  starting with the query form one contiguous run, found by binary search
+  and read in alphabetical order;
+* every later word start of every key, sorted by the text from there on,
+  so that "inal" finds "Taladro inalámbrico" the same way;
+* a trigram index mapping each 3-character window of a key to the
+  ascending term ids that contain it, for fragments starting
+  inside a word. Such a query checks the terms of its rarest trigram,
+  narrowed to those having the second rarest too when that list is short,
+  and stops once it has ``limit`` results.
+
+Prefix matches rank first, then word-start matches, then other substring
+matches; each group in alphabetical order (as of the last full build for
+the last one). Queries under two characters return nothing.
+
+Each process keeps its own index. Its own writes are applied when they
+commit. Writes from other processes are picked up every
+``INVENTORY_SEARCH_SYNC_INTERVAL`` seconds, from the resources whose
+``updated_at`` changed since. Those updates only add names; removals
+are found by a sweep that each sync advances by
+``INVENTORY_SEARCH_SWEEP_BATCH`` names in key order, checking them against
+``recurso_key`` with one indexed range read. A name deleted or renamed
+elsewhere (or before a restart) stops being suggested once the sweep
+passes it: with a million names and the defaults, a batch costs about
+8 ms and a full pass takes 200 syncs, some 7 minutes.
+Searches never query the database.
+
+Prefixes and word starts cost a binary search and ``limit`` steps. A
+fragment starting inside a word may have to check a whole posting list:
+with a million names that is a few milliseconds at p99.
+
+The built index is pickled to ``INVENTORY_SEARCH_SNAPSHOT``. A new
+process loads the snapshot and catches up from its timestamp instead of
+reading every resource. ``build_search_index`` rebuilds the index and the
+snapshot, and running processes reload a newer snapshot.
+"""
+
+from __future__ import annotations
+
+import bisect
+import logging
+import os
+import pickle
+import tempfile
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Tuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Category, Resource
+from .text import fold
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ("recurso", "categoria")
+
+DEFAULT_LIMIT = 12
+MAX_LIMIT = 50
+
+_SNAPSHOT_VERSION = 2
+
+# Trigram candidates checked one by one before intersecting posting lists.
+_SCAN_BLOCK = 512
+# Longest second posting list worth intersecting; past it, scanning is cheaper.
+_INTERSECT_MAX = 16_384
+
+# Names per ``recurso_key__in`` query when confirming sweep misses.
+_CONFIRM_CHUNK = 500
+
+# Catch-up re-reads this far back: a transaction can commit after a later
+# one that the previous sync already saw.
+_SYNC_OVERLAP = timedelta(seconds=30)
+
+
+class SearchError(ValueError):
+    def __init__(self, message: str) -> None:
+        super().__init__(message)
+        self.message = message
+
+
+def parse_query(params: Mapping[str, str]) -> Tuple[str, str, int]:
+    """``(field, query, limit)`` from ``?q=&campo=&limit=``."""
+
+    field = params.get("campo") or "recurso"
+    if field not in FIELDS:
+        raise SearchError(f"'campo' must be one of: {', '.join(FIELDS)}.")
+    raw = params.get("limit")
+    if raw in (None, ""):
+        limit = DEFAULT_LIMIT
+    else:
+        try:
+            limit = int(raw)
+        except ValueError:
+            raise SearchError("'limit' must be an integer.") from None
+        if limit < 1:
+            raise SearchError("'limit' must be positive.")
+    return field, params.get("q", ""), min(limit, MAX_LIMIT)
+
+
+# A word start is stored as ``term << 9 | offset``; folded names fit in 400
+# characters.
+_OFFSET_BITS = 9
+_OFFSET_MASK = (1 << _OFFSET_BITS) - 1
+
+
+def _word_offsets(key: str) -> List[int]:
+    """Where the words after the first start in ``key``."""
+
+    return [index + 1 for index, char in enumerate(key) if char == " "]
+
+
+def _trigrams(key: str) -> set:
+    return {key[index : index + 3] for index in range(len(key) - 2)}
+
+
+def _candidates(postings: List[array]) -> Iterator[int]:
+    """Terms that may contain a fragment, given its posting lists rarest first."""
+
+    rarest = postings[0]
+    yield from rarest[:_SCAN_BLOCK]
+    rest = rarest[_SCAN_BLOCK:]
+    if rest and len(postings) > 1 and len(postings[1]) <= _INTERSECT_MAX:
+        # Only the terms that also have the second rarest trigram.
+        rest = sorted(set(rest).intersection(postings[1]))
+    yield from rest
+
+
+class TermIndex:
+    """Prefix, word-start and trigram lookups over a growing set of texts."""
+
+    def __init__(self) -> None:
+        self.keys: List[str] = []
+        self.texts: List[str] = []
+        self.alive = bytearray()
+        self.ids: Dict[str, int] = {}
+        # Term ids by key, and word starts (term << 9 | offset) by the text
+        # from there on: sorted arrays of ints searched with bisect.
+        self.ordered = array("I")
+        self.words = array("Q")
+        self.grams: Dict[str, array] = {}
+
+    @classmethod
+    def build(cls, texts: Iterable[str]) -> "TermIndex":
+        """Index ``texts``; term ids follow the keys' alphabetical order."""
+
+        first: Dict[str, str] = {}
+        for text in texts:
+            key = fold(text)
+            if key and key not in first:
+                first[key] = " ".join(text.split())
+        index = cls()
+        words = []
+        for key in sorted(first):
+            term = index._append(key, first[key])
+            words.extend(term << _OFFSET_BITS | offset for offset in _word_offsets(key))
+        index.ordered = array("I", range(len(index.keys)))
+        words.sort(key=index._word)
+        index.words = array("Q", words)
+        return index
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _word(self, entry: int) -> str:
+        return self.keys[entry >> _OFFSET_BITS][entry & _OFFSET_MASK :]
+
+    def _append(self, key: str, text: str) -> int:
+        term = len(self.keys)
+        self.keys.append(key)
+        self.texts.append(text)
+        self.alive.append(1)
+        self.ids[key] = term
+        for gram in _trigrams(key):
+            postings = self.grams.get(gram)
+            if postings is None:
+                postings = self.grams[gram] = array("I")
+            postings.append(term)
+        return term
+
+    def add(self, text: str) -> None:
+        key = fold(text)
+        if not key:
+            return
+        term = self.ids.get(key)
+        if term is not None:
+            self.alive[term] = 1
+            return
+        term = self._append(key, " ".join(text.split()))
+        bisect.insort(self.ordered, term, key=self.keys.__getitem__)
+        for offset in _word_offsets(key):
+            bisect.insort(self.words, term << _OFFSET_BITS | offset, key=self._word)
+
+    def discard(self, text: str) -> None:
+        term = self.ids.get(fold(text))
+        if term is not None:
+            self.alive[term] = 0
+
+    def search(self, query: str, limit: int = DEFAULT_LIMIT) -> List[str]:
+        key = fold(query)
+        if len(key) < 2 or limit < 1:
+            return []
+        results: List[str] = []
+        seen = set()
+        keys, texts, alive = self.keys, self.texts, self.alive
+
+        # Prefix matches of the whole text, then of a later word: each is a
+        # run of a sorted array.
+        for entries, text_of, shift in (
+            (self.ordered, keys.__getitem__, 0),
+            (self.words, self._word, _OFFSET_BITS),
+        ):
+            position = bisect.bisect_left(entries, key, key=text_of)
+            while position < len(entries) and len(results) < limit:
+                entry = entries[position]
+                if not text_of(entry).startswith(key):
+                    break
+                term = entry >> shift
+                if alive[term] and term not in seen:
+                    results.append(texts[term])
+                    seen.add(term)
+                position += 1
+        if len(results) >= limit or len(key) < 3:
+            return results
+
+        # Fragments inside a word, through the rarest trigram.
+        postings = [self.grams.get(gram) for gram in _trigrams(key)]
+        if any(posting is None for posting in postings):
+            return results
+        postings.sort(key=len)
+        for term in _candidates(postings):
+            if term in seen or not alive[term] or key not in keys[term]:
+                continue
+            results.append(texts[term])
+            if len(results) >= limit:
+                break
+        return results
+
+
+class Autocomplete:
+    """The per-field indexes of this process and their synchronisation."""
+
+    def __init__(self, indexes: Dict[str, TermIndex], mark: datetime) -> None:
+        self.indexes = indexes
+        # Resources updated after this were not indexed yet.
+        self.mark = mark
+        self.synced_at = time.monotonic()
+        self.snapshot_mtime: Optional[float] = None
+        self.categories_stale = False
+        # Where the next removal sweep starts in the resource index's ``ordered``.
+        self.sweep_position = 0
+        self.lock = threading.RLock()
+
+    @classmethod
+    def from_database(cls) -> "Autocomplete":
+        mark = timezone.now()
+        recursos = Resource.objects.values_list("recurso", flat=True).order_by().iterator(
+            chunk_size=10_000
+        )
+        return cls(
+            {
+                "recurso": TermIndex.build(recursos),
+                "categoria": TermIndex.build(Category.objects.values_list("nombre", flat=True)),
+            },
+            mark,
+        )
+
+    def search(self, field: str, query: str, limit: int = DEFAULT_LIMIT) -> List[str]:
+        return self.indexes[field].search(query, limit)
+
+    def add(self, field: str, text: str) -> None:
+        with self.lock:
+            self.indexes[field].add(text)
+
+    def discard(self, field: str, text: str) -> None:
+        with self.lock:
+            self.indexes[field].discard(text)
+
+    def sync(self) -> None:
+        """Add what other processes wrote since the last sync, drop what they removed."""
+
+        with self.lock:
+            started = timezone.now()
+            changed = (
+                Resource.objects.filter(updated_at__gte=self.mark - _SYNC_OVERLAP)
+                .values_list("recurso", flat=True)
+                .order_by()
+            )
+            index = self.indexes["recurso"]
+            for text in changed.iterator(chunk_size=10_000):
+                index.add(text)
+            self._sweep_resources(_sweep_batch())
+            self._sync_categories()
+            self.mark = started
+            self.synced_at = time.monotonic()
+
+    def _sweep_resources(self, batch: int) -> None:
+        """Mark dead the next ``batch`` live names no resource has any more.
+
+        The names are a run of the key order, so the resources holding them
+        are one range of ``inv_res_recurso_idx``. A name the range read does
+        not return is looked up exactly before it is dropped: the database
+        may collate keys differently from Python.
+        """
+
+        index = self.indexes["recurso"]
+        ordered, keys, alive = index.ordered, index.keys, index.alive
+        if batch < 1 or not ordered:
+            return
+        start = self.sweep_position if self.sweep_position < len(ordered) else 0
+        end = min(start + batch, len(ordered))
+        # Names added later are inserted into ``ordered``, which only moves
+        # the remaining ones forward: none is skipped.
+        self.sweep_position = end if end < len(ordered) else 0
+        terms = [term for term in ordered[start:end] if alive[term]]
+        if not terms:
+            return
+        stored = set(
+            Resource.objects.filter(
+                recurso_key__gte=keys[terms[0]], recurso_key__lte=keys[terms[-1]]
+            )
+            .order_by()
+            .values_list("recurso_key", flat=True)
+            .distinct()
+        )
+        missing = [keys[term] for term in terms if keys[term] not in stored]
+        for chunk_start in range(0, len(missing), _CONFIRM_CHUNK):
+            stored.update(
+                Resource.objects.filter(
+                    recurso_key__in=missing[chunk_start : chunk_start + _CONFIRM_CHUNK]
+                )
+                .order_by()
+                .values_list("recurso_key", flat=True)
+                .distinct()
+            )
+        for term in terms:
+            if keys[term] not in stored:
+                alive[term] = 0
+
+    def _sync_categories(self) -> None:
+        index = self.indexes["categoria"]
+        names = list(Category.objects.values_list("nombre", flat=True))
+        current = {fold(name) for name in names}
+        for name in names:
+            index.add(name)
+        for term, key in enumerate(index.keys):
+            if index.alive[term] and key not in current:
+                index.alive[term] = 0
+        self.categories_stale = False
+
+    def write_snapshot(self, path: Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self.lock:
+            state = {
+                "version": _SNAPSHOT_VERSION,
+                "mark": self.mark,
+                "indexes": self.indexes,
+            }
+            handle = tempfile.NamedTemporaryFile(dir=path.parent, delete=False, suffix=".tmp")
+            try:
+                with handle:
+                    pickle.dump(state, handle, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(handle.name, path)
+            finally:
+                if os.path.exists(handle.name):
+                    os.unlink(handle.name)
+        self.snapshot_mtime = path.stat().st_mtime
+
+    @classmethod
+    def from_snapshot(cls, path: Path) -> Optional["Autocomplete"]:
+        """The index pickled at ``path``, or ``None`` if it is missing or unreadable.
+
+        The snapshot is written only by this module, next to the database
+        it describes; it is trusted like the rest of the deployment.
+        """
+
+        try:
+            mtime = path.stat().st_mtime
+            with open(path, "rb") as handle:
+                state = pickle.load(handle)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            logger.warning("Ignoring unreadable search snapshot %s", path, exc_info=True)
+            return None
+        if not isinstance(state, dict) or state.get("version") != _SNAPSHOT_VERSION:
+            return None
+        loaded = cls(state["indexes"], state["mark"])
+        loaded.snapshot_mtime = mtime
+        return loaded
+
+
+def snapshot_path() -> Path:
+    return Path(settings.INVENTORY_SEARCH_SNAPSHOT)
+
+
+def _sync_interval() -> float:
+    return float(getattr(settings, "INVENTORY_SEARCH_SYNC_INTERVAL", 2.0))
+
+
+def _sweep_batch() -> int:
+    return int(getattr(settings, "INVENTORY_SEARCH_SWEEP_BATCH", 5000))
+
+
+def build(write: bool = True) -> Autocomplete:
+    """Index every resource and category again and make it this process's index."""
+
+    global _autocomplete
+    built = Autocomplete.from_database()
+    if write:
+        built.write_snapshot(snapshot_path())
+    with _autocomplete_lock:
+        _autocomplete = built
+    return built
+
+
+def _load() -> Autocomplete:
+    path = snapshot_path()
+    loaded = Autocomplete.from_snapshot(path)
+    if loaded is None:
+        loaded = Autocomplete.from_database()
+        try:
+            loaded.write_snapshot(path)
+        except OSError:
+            logger.warning("Could not write search snapshot %s", path, exc_info=True)
+        return loaded
+    loaded.sync()
+    return loaded
+
+
+_autocomplete: Optional[Autocomplete] = None
+_autocomplete_lock = threading.Lock()
+
+
+def get_autocomplete() -> Autocomplete:
+    """This process's index: loaded on first use, kept in sync afterwards."""
+
+    global _autocomplete
+    current = _autocomplete
+    if current is None:
+        with _autocomplete_lock:
+            if _autocomplete is None:
+                _autocomplete = _load()
+            return _autocomplete
+    if time.monotonic() - current.synced_at >= _sync_interval():
+        try:
+            mtime = snapshot_path().stat().st_mtime
+        except OSError:
+            mtime = None
+        if mtime is not None and current.snapshot_mtime is not None and mtime > current.snapshot_mtime:
+            # Rebuilt by build_search_index: take the compacted index.
+            with _autocomplete_lock:
+                if _autocomplete is current:
+                    _autocomplete = _load()
+                return _autocomplete
+        current.sync()
+    elif current.categories_stale:
+        with current.lock:
+            current._sync_categories()
+    return current
+
+
+def resource_changed(old: Optional[str], new: Optional[str]) -> None:
+    """Apply a committed resource write (``None``: created / deleted)."""
+
+    current = _autocomplete
+    if current is None:
+        return
+    if new:
+        current.add("recurso", new)
+    if old and fold(old) != fold(new or ""):
+        if not Resource.objects.filter(recurso_key=fold(old)).exists():
+            current.discard("recurso", old)
+
+
+def categories_changed() -> None:
+    current = _autocomplete
+    if current is not None:
+        current.categories_stale = True
+
+
+def clear() -> None:
+    global _autocomplete
+    with _autocomplete_lock:
+        _autocomplete = None
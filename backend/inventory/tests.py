@@ -0,0 +1,658 @@
+import csv
+import io
+import json
+import shutil
+import tempfile
+import zipfile
+from decimal import Decimal
+from pathlib import Path
+from xml.etree import ElementTree
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+
+from . import photos, scenarios, search
+from .export import HEADERS, stream_xlsx
+from .listing import ORDERINGS, encode_cursor, parse_listing
+from .models import Category, CategoryBudget, Resource
+from .text import fold
+
+
+def _resource(recurso, categoria, cantidad=1, precio="1.00", info=""):
+    return Resource.objects.create(
+        recurso=recurso, categoria=categoria, cantidad=cantidad, precio=Decimal(precio), info=info
+    )
+
+
+class InventoryAPITests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="jona", password="200328")
+        self.client.force_login(self.user)
+        self.herramientas = Category.objects.create(nombre="Herramientas")
+        self.electrico = Category.objects.create(nombre="Eléctrico")
+
+    def _list(self, **params):
+        response = self.client.get("/api/inventory/resources/", params)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()
+
+    def test_requires_authentication(self):
+        self.client.logout()
+
+        response = self.client.get("/api/inventory/resources/")
+
+        self.assertEqual(response.status_code, 401)
+
+    def test_create_reuses_categories_ignoring_case_and_accents(self):
+        response = self.client.post(
+            "/api/inventory/resources/",
+            data=json.dumps(
+                {"recurso": "Cable 2mm", "categoria": "electrico", "cantidad": 4, "precio": 12.5}
+            ),
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 201)
+        body = response.json()
+        self.assertEqual(body["categoria"], "Eléctrico")
+        self.assertEqual(body["precio"], "12.50")
+        self.assertEqual(Category.objects.count(), 2)
+
+    def test_invalid_resources_are_rejected(self):
+        response = self.client.post(
+            "/api/inventory/resources/",
+            data=json.dumps({"recurso": "Taladro", "categoria": "Nueva", "cantidad": -1}),
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("cantidad", response.json()["fields"])
+        self.assertFalse(Category.objects.filter(nombre="Nueva").exists())
+
+    def test_keyset_pages_walk_forwards_and_backwards(self):
+        for index in range(25):
+            _resource(f"Recurso {index}", self.herramientas, precio=f"{index % 7}.00")
+        expected = [
+            resource.pk
+            for resource in Resource.objects.order_by("-precio", "-id")
+        ]
+
+        seen, cursor, pages = [], None, []
+        while True:
+            params = {"ordering": "-precio", "limit": 10}
+            if cursor:
+                params["cursor"] = cursor
+            body = self._list(**params)
+            pages.append(body)
+            seen.extend(item["id"] for item in body["results"])
+            cursor = body["next"]
+            if cursor is None:
+                break
+
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(pages), 3)
+        self.assertIsNone(pages[0]["previous"])
+        back = self._list(ordering="-precio", limit=10, cursor=pages[2]["previous"])
+        self.assertEqual(back["results"], pages[1]["results"])
+        first = self._list(ordering="-precio", limit=10, cursor=back["previous"])
+        self.assertEqual(first["results"], pages[0]["results"])
+        self.assertIsNone(first["previous"])
+
+    def test_filters(self):
+        canería = _resource("Cañería PVC", self.herramientas, info="Bodega Norte")
+        _resource("Cable", self.electrico, info="bodega sur")
+        _resource("Martillo", self.herramientas)
+
+        def ids(**params):
+            return [item["id"] for item in self._list(**params)["results"]]
+
+        self.assertEqual(ids(recurso_prefix="CAN"), [canería.pk])
+        self.assertEqual(ids(recurso="pvc"), [canería.pk])
+        self.assertEqual(ids(info="norte"), [canería.pk])
+        self.assertEqual(len(ids(categoria="HERRAMIENTAS")), 2)
+        self.assertEqual(ids(id_min=canería.pk, id_max=canería.pk), [canería.pk])
+
+    def test_bad_parameters_are_rejected(self):
+        for params in ({"ordering": "foto"}, {"cursor": "!!"}, {"limit": "x"}, {"id_min": "a"}):
+            response = self.client.get("/api/inventory/resources/", params)
+            self.assertEqual(response.status_code, 400, params)
+
+        for value in ("NaN", "Infinity", "-Infinity", "sNaN"):
+            params = {"ordering": "precio", "cursor": encode_cursor(False, value, 1)}
+            response = self.client.get("/api/inventory/resources/", params)
+            self.assertEqual(response.status_code, 400, value)
+
+    def test_update_and_delete(self):
+        resource = _resource("Martillo", self.herramientas)
+
+        response = self.client.patch(
+            f"/api/inventory/resources/{resource.pk}/",
+            data=json.dumps({"cantidad": 9, "categoria": "Eléctrico"}),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["cantidad"], 9)
+        resource.refresh_from_db()
+        self.assertEqual(resource.categoria_key, "electrico")
+
+        response = self.client.delete(f"/api/inventory/resources/{resource.pk}/")
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Resource.objects.exists())
+
+    def test_renaming_a_category_updates_its_resources(self):
+        resource = _resource("Martillo", self.herramientas)
+
+        self.herramientas.nombre = "Ferretería"
+        self.herramientas.save()
+
+        resource.refresh_from_db()
+        self.assertEqual(resource.categoria_key, fold("Ferretería"))
+
+
+_SHEET = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+
+
+def _sheet_rows(archive, number):
+    root = ElementTree.fromstring(archive.read(f"xl/worksheets/sheet{number}.xml"))
+    return [
+        ["".join(cell.itertext()) for cell in row.iter(f"{_SHEET}c")]
+        for row in root.iter(f"{_SHEET}row")
+    ]
+
+
+class InventoryExportTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(username="jona", password="200328")
+        self.client.force_login(self.user)
+        herramientas = Category.objects.create(nombre="Herramientas")
+        electrico = Category.objects.create(nombre="Eléctrico")
+        self.martillo = _resource("Martillo", herramientas, cantidad=3, precio="10.50")
+        self.sierra = _resource("Sierra", herramientas, cantidad=1, precio="99.90", info='dice "<b>"')
+        _resource("Cable", electrico, precio="2.00")
+
+    def _body(self, response):
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content)
+
+    async def test_asgi_streams_without_buffering_the_export(self):
+        await self.async_client.aforce_login(self.user)
+
+        response = await self.async_client.get(
+            "/api/inventory/resources/export.csv", {"ordering": "precio"}
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.is_async)
+        pieces = [piece async for piece in response.streaming_content]
+        records = list(csv.reader(io.StringIO(b"".join(pieces).decode("utf-8").lstrip("\ufeff"))))
+        self.assertEqual([record[1] for record in records[1:]], ["Cable", "Martillo", "Sierra"])
+
+    def test_csv_applies_the_listing_filters_and_ordering(self):
+        response = self.client.get(
+            "/api/inventory/resources/export.csv", {"categoria": "herramientas", "ordering": "-precio"}
+        )
+
+        body = self._body(response).decode("utf-8")
+        self.assertIn("attachment", response["Content-Disposition"])
+        records = list(csv.reader(io.StringIO(body.lstrip("\ufeff"))))
+        self.assertEqual(tuple(records[0]), HEADERS)
+        self.assertEqual(
+            records[1:],
+            [
+                [str(self.sierra.pk), "Sierra", "Herramientas", "1", "99.90", "", 'dice "<b>"'],
+                [str(self.martillo.pk), "Martillo", "Herramientas", "3", "10.50", "", ""],
+            ],
+        )
+
+    def test_xlsx_is_a_workbook_of_the_listing(self):
+        response = self.client.get("/api/inventory/resources/export.xlsx", {"recurso": "sierra"})
+
+        archive = zipfile.ZipFile(io.BytesIO(self._body(response)))
+        self.assertIsNone(archive.testzip())
+        self.assertIn("xl/workbook.xml", archive.namelist())
+        self.assertEqual(
+            _sheet_rows(archive, 1),
+            [list(HEADERS), [str(self.sierra.pk), "Sierra", "Herramientas", "1", "99.90", "", 'dice "<b>"']],
+        )
+
+    def test_xlsx_starts_a_new_sheet_when_one_is_full(self):
+        source = [(index, f"r{index}", "c", 1, Decimal("1.00"), "", "") for index in range(5)]
+
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(stream_xlsx(source, sheet_rows=2))))
+
+        self.assertEqual([len(_sheet_rows(archive, n)) for n in (1, 2, 3)], [3, 3, 2])
+        self.assertIn(b"Inventario 3", archive.read("xl/workbook.xml"))
+
+    def test_export_rejects_bad_parameters_and_anonymous_users(self):
+        response = self.client.get("/api/inventory/resources/export.csv", {"ordering": "foto"})
+        self.assertEqual(response.status_code, 400)
+
+        self.client.logout()
+        response = self.client.get("/api/inventory/resources/export.xlsx")
+        self.assertEqual(response.status_code, 401)
+
+
+@override_settings(SESSION_ENGINE="django.contrib.sessions.backends.db")
+class CategoryBudgetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(username="jona", password="200328")
+        self.client.force_login(self.user)
+        self.herramientas = Category.objects.create(nombre="Herramientas")
+        self.electrico = Category.objects.create(nombre="Eléctrico")
+
+    def _totals(self, category):
+        budget = CategoryBudget.objects.get(pk=category.pk)
+        return budget.recursos, budget.unidades, budget.valor
+
+    def test_writes_keep_the_totals_current(self):
+        martillo = _resource("Martillo", self.herramientas, cantidad=3, precio="10.50")
+        _resource("Sierra", self.herramientas, cantidad=2, precio="5.00")
+        self.assertEqual(self._totals(self.herramientas), (2, 5, Decimal("41.50")))
+
+        martillo.cantidad = 1
+        martillo.save(update_fields=["cantidad"])
+        self.assertEqual(self._totals(self.herramientas), (2, 3, Decimal("20.50")))
+
+        martillo.categoria = self.electrico
+        martillo.precio = Decimal("7.00")
+        martillo.save()
+        self.assertEqual(self._totals(self.herramientas), (1, 2, Decimal("10.00")))
+        self.assertEqual(self._totals(self.electrico), (1, 1, Decimal("7.00")))
+
+        martillo.delete()
+        self.assertEqual(self._totals(self.electrico), (0, 0, Decimal("0.00")))
+
+    def test_rebuild_repairs_totals_changed_behind_the_models_back(self):
+        _resource("Martillo", self.herramientas, cantidad=3, precio="10.50")
+        Resource.objects.update(cantidad=4)
+        CategoryBudget.objects.filter(pk=self.electrico.pk).delete()
+
+        out = io.StringIO()
+        call_command("rebuild_inventory_budget", stdout=out)
+
+        self.assertIn("checked=2 fixed=1 created=1", out.getvalue())
+        self.assertEqual(self._totals(self.herramientas), (1, 4, Decimal("42.00")))
+        self.assertEqual(self._totals(self.electrico), (0, 0, Decimal("0.00")))
+
+    def test_summary_reads_one_row_per_category_and_revalidates_with_etag(self):
+        for index in range(20):
+            _resource(f"Recurso {index}", self.herramientas, cantidad=1, precio="2.00")
+        _resource("Cable", self.electrico, cantidad=10, precio="1.00")
+
+        with self.assertNumQueries(3):  # session, user, budgets
+            response = self.client.get("/api/inventory/budget/")
+        body = response.json()
+        self.assertEqual(
+            (body["recursos"], body["unidades"], body["valor"], body["promedio"]),
+            (21, 30, "50.00", "2.38"),
+        )
+        self.assertEqual(
+            [(item["nombre"], item["valor"]) for item in body["categorias"]],
+            [("Herramientas", "40.00"), ("Eléctrico", "10.00")],
+        )
+
+        with self.assertNumQueries(2):  # session, user
+            response = self.client.get(
+                "/api/inventory/budget/", HTTP_IF_NONE_MATCH=response["ETag"]
+            )
+        self.assertEqual(response.status_code, 304)
+
+        etag = response["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            _resource("Taladro", self.electrico, cantidad=1, precio="90.00")
+        response = self.client.get("/api/inventory/budget/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["categorias"][0]["nombre"], "Eléctrico")
+
+
+class ScenarioTests(TestCase):
+    def setUp(self):
+        scenarios.clear_cache()
+        self.user = get_user_model().objects.create_user(username="jona", password="200328")
+        self.client.force_login(self.user)
+        self.herramientas = Category.objects.create(nombre="Herramientas")
+        self.electrico = Category.objects.create(nombre="Eléctrico")
+        for index in range(30):
+            categoria = self.herramientas if index % 3 else self.electrico
+            _resource(f"R{index}", categoria, cantidad=index % 11, precio=f"{index * 7 % 13}.25")
+        self.scenarios = [
+            scenarios.Scenario("Base"),
+            scenarios.Scenario(
+                "Inflación",
+                inflacion={self.electrico.pk: 0.1},
+                inflacion_general=0.05,
+                reposicion={self.herramientas.pk: 6, self.electrico.pk: 50},
+                tipo_cambio=2.0,
+            ),
+        ]
+
+    def _expected(self, scenario):
+        """The same totals, one resource at a time."""
+
+        totals = {}
+        for resource in Resource.objects.all():
+            level = scenario.reposicion.get(resource.categoria_id, 0)
+            factor = 1 + scenario.inflacion.get(resource.categoria_id, scenario.inflacion_general)
+            units = max(resource.cantidad, level)
+            value = units * float(resource.precio) * factor / scenario.tipo_cambio
+            entry = totals.setdefault(resource.categoria_id, [0, 0.0])
+            entry[0] += units
+            entry[1] += value
+        return totals
+
+    def _check(self, use_numpy):
+        cols = scenarios.load_columns(use_numpy=use_numpy)
+        totals = scenarios.evaluate(cols, self.scenarios)
+        for index, scenario in enumerate(self.scenarios):
+            expected = self._expected(scenario)
+            for c, pk in enumerate(cols.category_ids):
+                self.assertEqual(totals.unidades[index][c], expected[pk][0])
+                self.assertAlmostEqual(totals.valor[index][c], expected[pk][1], places=6)
+
+    def test_python_columns_match_a_per_item_evaluation(self):
+        self._check(use_numpy=False)
+
+    @skipUnless(scenarios.numpy is not None, "NumPy is not installed.")
+    def test_numpy_columns_match_a_per_item_evaluation(self):
+        self._check(use_numpy=True)
+
+    def test_columns_are_reused_until_the_inventory_changes(self):
+        loaded = scenarios.columns()
+        self.assertIs(scenarios.columns(), loaded)
+
+        resource = Resource.objects.first()
+        resource.cantidad += 1
+        resource.save()
+
+        self.assertIsNot(scenarios.columns(), loaded)
+
+    def test_endpoint_runs_every_scenario(self):
+        response = self.client.post(
+            "/api/inventory/scenarios/",
+            data=json.dumps(
+                {
+                    "scenarios": [
+                        {"nombre": "Base"},
+                        {"inflacion": {"*": 0.5}, "reposicion": {"electrico": 20}, "tipo_cambio": 1},
+                    ]
+                }
+            ),
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 200)
+        base, other = response.json()["results"]
+        self.assertEqual(base["valor"], float(CategoryBudget.objects.aggregate(v=Sum("valor"))["v"]))
+        self.assertEqual(other["nombre"], "Escenario 2")
+        self.assertGreater(other["reposicion_valor"], 0)
+        self.assertGreater(other["valor"], base["valor"] * 1.5)
+
+    def test_endpoint_rejects_unknown_categories(self):
+        response = self.client.post(
+            "/api/inventory/scenarios/",
+            data=json.dumps({"scenarios": [{"reposicion": {"Jardín": 3}}]}),
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 400)
+
+
+_PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(200))
+
+
+class PhotoTests(TestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        overrides = override_settings(INVENTORY_PHOTO_ROOT=self.root)
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.user = get_user_model().objects.create_user(username="jona", password="200328")
+        self.client.force_login(self.user)
+
+    def _upload(self, data=_PNG, content_type="image/png"):
+        return self.client.post("/api/inventory/photos/", data=data, content_type=content_type)
+
+    def test_uploads_are_stored_once_by_content(self):
+        first = self._upload()
+        second = self._upload()
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(first.json(), second.json())
+        url = first.json()["foto"]
+        self.assertRegex(url, r"^/api/inventory/photos/[0-9a-f]{64}\.png$")
+        stored = [path for path in Path(self.root).rglob("*.png")]
+        self.assertEqual(len(stored), 1)
+        self.assertEqual(stored[0].read_bytes(), _PNG)
+
+    def test_non_images_are_rejected(self):
+        response = self._upload(b"<svg/>", "image/svg+xml")
+
+        self.assertEqual(response.status_code, 415)
+        self.assertEqual(list(Path(self.root).rglob("*.*")), [])
+
+    def test_photos_are_served_immutable_with_etag_and_ranges(self):
+        url = self._upload().json()["foto"]
+        self.client.logout()
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), _PNG)
+        self.assertEqual(response["Content-Type"], "image/png")
+        self.assertIn("immutable", response["Cache-Control"])
+        etag = response["ETag"]
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        response = self.client.get(url, HTTP_RANGE="bytes=2-9")
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], f"bytes 2-9/{len(_PNG)}")
+        self.assertEqual(b"".join(response.streaming_content), _PNG[2:10])
+
+        response = self.client.get(url, HTTP_RANGE="bytes=-4")
+        self.assertEqual(b"".join(response.streaming_content), _PNG[-4:])
+
+        response = self.client.get(url, HTTP_RANGE="bytes=2-9", HTTP_IF_RANGE='"other"')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(url, HTTP_RANGE=f"bytes={len(_PNG)}-")
+        self.assertEqual(response.status_code, 416)
+
+    @override_settings(INVENTORY_PHOTO_ACCEL_PREFIX="/protected-photos/")
+    def test_accel_redirect_hands_the_file_to_the_front_server(self):
+        url = self._upload().json()["foto"]
+        name = url.rsplit("/", 1)[1]
+
+        response = self.client.get(url)
+
+        self.assertEqual(response["X-Accel-Redirect"], f"/protected-photos/{name[:2]}/{name}")
+        self.assertEqual(response.content, b"")
+
+    def test_thumbnail_falls_back_to_the_original_until_it_exists(self):
+        # Not a decodable image: no thumbnail is ever made for it.
+        body = self._upload().json()
+
+        response = self.client.get(body["miniatura"])
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), _PNG)
+        self.assertEqual(response["Cache-Control"], "no-cache")
+
+    @skipUnless(photos.Image is not None, "Pillow is not installed.")
+    def test_thumbnails_are_made_and_served(self):
+        image = io.BytesIO()
+        photos.Image.new("RGBA", (800, 400), (200, 10, 10, 128)).save(image, "PNG")
+        body = self._upload(image.getvalue()).json()
+        name = body["foto"].rsplit("/", 1)[1]
+
+        photos.make_thumbnail(name)
+        response = self.client.get(body["miniatura"])
+
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertIn("immutable", response["Cache-Control"])
+        with photos.Image.open(io.BytesIO(b"".join(response.streaming_content))) as thumbnail:
+            self.assertEqual(thumbnail.size, (256, 128))
+
+    def test_resources_keep_short_photo_urls(self):
+        url = self._upload().json()["foto"]
+        categoria = Category.objects.create(nombre="Herramientas")
+
+        response = self.client.post(
+            "/api/inventory/resources/",
+            data=json.dumps({"recurso": "Martillo", "categoria": "Herramientas", "foto": url}),
+            content_type="application/json",
+        )
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["foto"], url)
+        self.assertEqual(Resource.objects.get().foto, url.rsplit("/", 1)[1])
+        listed = self.client.get("/api/inventory/resources/").json()["results"][0]
+        self.assertEqual(listed["miniatura"], url.replace("/photos/", "/photos/thumbnails/"))
+
+        response = self.client.post(
+            "/api/inventory/resources/",
+            data=json.dumps(
+                {"recurso": "Sierra", "categoria": categoria.nombre, "foto": "data:image/png;base64,AAAA"}
+            ),
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("foto", response.json()["fields"])
+
+
+class AutocompleteTests(TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.snapshot = Path(directory) / "search-index.pickle"
+        overrides = override_settings(INVENTORY_SEARCH_SNAPSHOT=str(self.snapshot))
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        search.clear()
+        self.addCleanup(search.clear)
+        self.user = get_user_model().objects.create_user(username="jona", password="200328")
+        self.client.force_login(self.user)
+        self.herramientas = Category.objects.create(nombre="Herramientas")
+        self.electrico = Category.objects.create(nombre="Eléctrico")
+        for recurso in ("Taladro percutor", "Taladro inalámbrico", "Cable eléctrico 2mm", "Llave inglesa"):
+            _resource(recurso, self.herramientas)
+        _resource("Cinta aislante", self.electrico)
+
+    def _suggest(self, q, **params):
+        response = self.client.get("/api/inventory/autocomplete/", {"q": q, **params})
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()["results"]
+
+    def test_prefix_matches_come_first_ignoring_case_and_accents(self):
+        self.assertEqual(self._suggest("TALA"), ["Taladro inalámbrico", "Taladro percutor"])
+        self.assertEqual(self._suggest("electr"), ["Cable eléctrico 2mm"])
+        self.assertEqual(self._suggest("inalam"), ["Taladro inalámbrico"])
+        self.assertEqual(self._suggest("ADRO"), ["Taladro inalámbrico", "Taladro percutor"])
+        self.assertEqual(self._suggest("ELEC", campo="categoria"), ["Eléctrico"])
+        self.assertEqual(self._suggest("ta", limit=1), ["Taladro inalámbrico"])
+        self.assertEqual(self._suggest("t"), [])
+
+    def test_two_characters_match_the_start_of_words(self):
+        self.assertEqual(self._suggest("in"), ["Taladro inalámbrico", "Llave inglesa"])
+
+    def test_writes_update_the_index_when_they_commit(self):
+        self.assertEqual(self._suggest("sierra"), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            sierra = _resource("Sierra circular", self.herramientas)
+        self.assertEqual(self._suggest("sierra"), ["Sierra circular"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            sierra.recurso = "Serrucho"
+            sierra.save()
+        self.assertEqual(self._suggest("sierra"), [])
+        self.assertEqual(self._suggest("serr"), ["Serrucho"])
+
+        # The name stays while another resource has it.
+        _resource("Llave inglesa", self.electrico)
+        with self.captureOnCommitCallbacks(execute=True):
+            Resource.objects.filter(recurso="Llave inglesa").first().delete()
+        self.assertEqual(self._suggest("llave"), ["Llave inglesa"])
+        with self.captureOnCommitCallbacks(execute=True):
+            Resource.objects.get(recurso="Llave inglesa").delete()
+        self.assertEqual(self._suggest("llave"), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Category.objects.create(nombre="Pintura")
+        self.assertEqual(self._suggest("pin", campo="categoria"), ["Pintura"])
+
+    def test_other_processes_writes_are_picked_up_on_sync(self):
+        autocomplete = search.get_autocomplete()
+        # Not through the on-commit hook, as if written by another process.
+        _resource("Martillo", self.herramientas)
+        self.assertEqual(autocomplete.search("recurso", "mart"), [])
+
+        with override_settings(INVENTORY_SEARCH_SYNC_INTERVAL=0):
+            self.assertEqual(search.get_autocomplete().search("recurso", "mart"), ["Martillo"])
+
+    def test_names_gone_from_the_table_are_swept_on_sync(self):
+        search.build()
+        # Deleted and renamed without the on-commit hook: another process,
+        # or this one before a restart that reloads the snapshot.
+        Resource.objects.filter(recurso="Taladro percutor").delete()
+        Resource.objects.filter(recurso="Llave inglesa").update(
+            recurso="Llave de tubo", recurso_key=fold("Llave de tubo")
+        )
+        search.clear()
+        with override_settings(INVENTORY_SEARCH_SWEEP_BATCH=0):
+            autocomplete = search.get_autocomplete()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                autocomplete.search("recurso", "tal"), ["Taladro inalámbrico", "Taladro percutor"]
+            )
+
+        index = autocomplete.indexes["recurso"]
+        with override_settings(INVENTORY_SEARCH_SWEEP_BATCH=2):
+            for _ in range((len(index) + 1) // 2):
+                autocomplete.sync()
+        self.assertEqual(autocomplete.search("recurso", "tal"), ["Taladro inalámbrico"])
+        self.assertEqual(autocomplete.search("recurso", "llave"), ["Llave de tubo"])
+        self.assertEqual(autocomplete.sweep_position, 0)
+
+    def test_snapshot_round_trip(self):
+        built = search.build()
+        self.assertTrue(self.snapshot.exists())
+
+        loaded = search.Autocomplete.from_snapshot(self.snapshot)
+
+        for field in search.FIELDS:
+            self.assertEqual(loaded.indexes[field].texts, built.indexes[field].texts)
+        self.assertEqual(loaded.search("recurso", "tal"), ["Taladro inalámbrico", "Taladro percutor"])
+        self.snapshot.write_bytes(b"not a pickle")
+        with self.assertLogs("inventory.search", "WARNING"):
+            self.assertIsNone(search.Autocomplete.from_snapshot(self.snapshot))
+
+    def test_rejects_bad_parameters_and_anonymous_requests(self):
+        for params in ({"campo": "info"}, {"limit": "0"}, {"limit": "x"}):
+            response = self.client.get("/api/inventory/autocomplete/", {"q": "ta", **params})
+            self.assertEqual(response.status_code, 400)
+            self.assertIn("error", response.json())
+
+        self.client.logout()
+        self.assertEqual(self.client.get("/api/inventory/autocomplete/").status_code, 401)
+
+
+@skipUnless(connection.vendor == "sqlite", "Checks SQLite query plans.")
+class InventoryQueryPlanTests(TestCase):
+    def test_every_ordering_is_served_by_an_index(self):
+        for name in ORDERINGS:
+            for ordering in (name, f"-{name}"):
+                for params in ({}, {"categoria": "x"}):
+                    listing = parse_listing({"ordering": ordering, **params})
+                    plan = listing.queryset().values("id")[:50].explain()
+                    self.assertNotIn("TEMP B-TREE", plan, (ordering, params, plan))
@@ -0,0 +1,15 @@
+"""Text normalisation shared by inventory filters, sorting and search."""
+
+import unicodedata
+
+
+def fold(text: str) -> str:
+    """Lower-case ``text`` and strip accents: ``"  Cañería  Ñ"`` -> ``"caneria n"``.
+
+    Stored next to the original in ``*_key`` columns, so filters and ordering
+    ignore case and accents and still run on plain B-tree indexes.
+    """
+
+    decomposed = unicodedata.normalize("NFKD", text)
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return " ".join(stripped.casefold().split())
@@ -0,0 +1,30 @@
+from django.urls import path
+
+from .views import (
+    autocomplete_view,
+    budget_view,
+    categories_view,
+    export_view,
+    photo_thumbnail_view,
+    photo_view,
+    photos_view,
+    resource_view,
+    resources_view,
+    scenarios_view,
+)
+
+app_name = "inventory"
+
+urlpatterns = [
+    path("resources/", resources_view, name="resources"),
+    path("resources/<int:pk>/", resource_view, name="resource"),
+    path("resources/export.csv", export_view, {"fmt": "csv"}, name="export-csv"),
+    path("resources/export.xlsx", export_view, {"fmt": "xlsx"}, name="export-xlsx"),
+    path("categories/", categories_view, name="categories"),
+    path("budget/", budget_view, name="budget"),
+    path("scenarios/", scenarios_view, name="scenarios"),
+    path("autocomplete/", autocomplete_view, name="autocomplete"),
+    path("photos/", photos_view, name="photos"),
+    path("photos/<str:name>", photo_view, name="photo"),
+    path("photos/thumbnails/<str:name>", photo_thumbnail_view, name="photo-thumbnail"),
+]
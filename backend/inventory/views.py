@@ -0,0 +1,410 @@
+import json
+import re
+from functools import wraps
+from typing import Any, Dict, Optional, Tuple
+
+from django.core.exceptions import ValidationError
+from django.core.handlers.asgi import ASGIRequest
+from django.db import IntegrityError, transaction
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.http import parse_etags, quote_etag
+from django.views.decorators.http import require_http_methods
+
+from . import budget, photos, scenarios, search
+from .export import aiter_chunks, rows, stream_csv, stream_xlsx
+from .listing import FIELDS, ListingError, page, parse_limit, parse_listing, to_json
+from .models import Category, Resource
+from .text import fold
+
+_EXPORTS = {
+    "csv": (stream_csv, "text/csv; charset=utf-8"),
+    "xlsx": (
+        stream_xlsx,
+        "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ),
+}
+
+# Fields a client may set on a resource; categoria is given by name.
+_WRITABLE = ("recurso", "cantidad", "precio", "foto", "info")
+
+
+def _parse_payload(request):
+    try:
+        payload = json.loads(request.body.decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        return None
+    return payload if isinstance(payload, dict) else None
+
+
+def _login_required(view):
+    """Answer 401 for anonymous requests (session cookie or bearer token)."""
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({"error": "Authentication required."}, status=401)
+        return view(request, *args, **kwargs)
+
+    return wrapper
+
+
+def _invalid(exc: ValidationError) -> JsonResponse:
+    return JsonResponse({"error": "Invalid data.", "fields": exc.message_dict}, status=400)
+
+
+def _category_named(name: str) -> Tuple[Category, bool]:
+    """Return the category called ``name`` (ignoring case and accents), creating it."""
+
+    category = Category.objects.filter(clave=fold(name)).first()
+    if category is not None:
+        return category, False
+    try:
+        with transaction.atomic():
+            category = Category(nombre=" ".join(name.split()), clave=fold(name))
+            category.full_clean(validate_unique=False)
+            category.save()
+            return category, True
+    except IntegrityError:
+        # Created concurrently under another spelling.
+        return Category.objects.get(clave=fold(name)), False
+
+
+def _apply(resource: Resource, payload: Dict[str, Any]) -> None:
+    for field in _WRITABLE:
+        if field in payload:
+            value = payload[field]
+            setattr(resource, field, "" if value is None and field in ("foto", "info") else value)
+    if "categoria" in payload:
+        name = payload["categoria"]
+        if not isinstance(name, str) or not name.strip():
+            raise ValidationError({"categoria": ["This field cannot be blank."]})
+        resource.categoria, _ = _category_named(name)
+    elif resource.categoria_id is None:
+        raise ValidationError({"categoria": ["This field is required."]})
+    if not isinstance(resource.recurso, str):
+        raise ValidationError({"recurso": ["Expected a string."]})
+    for field in ("foto", "info"):
+        if not isinstance(getattr(resource, field), str):
+            raise ValidationError({field: ["Expected a string."]})
+    if "foto" in payload and resource.foto:
+        resource.foto = _photo_reference(resource.foto)
+    resource.fill_keys()
+    resource.full_clean()
+
+
+def _photo_reference(value: str) -> str:
+    """What ``foto`` stores: an uploaded photo's name, or an external URL."""
+
+    name = photos.name_of(value)
+    if name is not None:
+        if not photos.path_of(name).exists():
+            raise ValidationError({"foto": ["Unknown photo; upload it first."]})
+        return name
+    if value.startswith(("http://", "https://")):
+        return value
+    raise ValidationError(
+        {"foto": ["Upload the image to /api/inventory/photos/ and use the returned URL."]}
+    )
+
+
+def _resource_json(pk: int) -> Optional[Dict[str, Any]]:
+    row = Resource.objects.filter(pk=pk).values(*FIELDS).first()
+    return to_json(row) if row is not None else None
+
+
+@require_http_methods(["GET", "POST"])
+@_login_required
+def resources_view(request):
+    """List resources (filters, ordering and cursor in the query) or create one."""
+
+    if request.method == "POST":
+        return _create_resource(request)
+
+    try:
+        listing = parse_listing(request.GET)
+        result = page(listing, request.GET.get("cursor") or None, parse_limit(request.GET))
+    except ListingError as exc:
+        return JsonResponse({"error": exc.message}, status=400)
+    return JsonResponse(
+        {"results": result.results, "next": result.next, "previous": result.previous}
+    )
+
+
+def _create_resource(request):
+    payload = _parse_payload(request)
+    if payload is None:
+        return JsonResponse({"error": "Invalid JSON payload."}, status=400)
+
+    resource = Resource()
+    try:
+        with transaction.atomic():
+            _apply(resource, payload)
+            resource.save()
+    except ValidationError as exc:
+        return _invalid(exc)
+    return JsonResponse(_resource_json(resource.pk), status=201)
+
+
+@require_http_methods(["GET"])
+@_login_required
+def budget_view(request):
+    """Totals per category for the dashboards; answers 304 to a matching If-None-Match."""
+
+    etag, body = budget.cached_summary()
+    etag = quote_etag(etag)
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        response = HttpResponse(status=304)
+    else:
+        response = HttpResponse(body, content_type="application/json")
+    response["ETag"] = etag
+    # Revalidate every time: a 304 costs a cache lookup, not a query.
+    response["Cache-Control"] = "private, no-cache"
+    return response
+
+
+@require_http_methods(["POST"])
+@_login_required
+def scenarios_view(request):
+    """Per-category totals of each what-if scenario in the payload."""
+
+    payload = _parse_payload(request)
+    if payload is None:
+        return JsonResponse({"error": "Invalid JSON payload."}, status=400)
+    categories = list(Category.objects.values_list("pk", "clave", "nombre"))
+    try:
+        parsed = scenarios.parse_scenarios(payload, {clave: pk for pk, clave, _ in categories})
+    except scenarios.ScenarioError as exc:
+        return JsonResponse({"error": exc.message}, status=400)
+    results = scenarios.run(parsed, {pk: nombre for pk, _, nombre in categories})
+    return JsonResponse({"results": results})
+
+
+@require_http_methods(["GET"])
+@_login_required
+def autocomplete_view(request):
+    """Suggestions for a resource or category name as it is typed."""
+
+    try:
+        field, query, limit = search.parse_query(request.GET)
+    except search.SearchError as exc:
+        return JsonResponse({"error": exc.message}, status=400)
+    results = search.get_autocomplete().search(field, query, limit)
+    return JsonResponse({"results": results})
+
+
+@require_http_methods(["GET"])
+@_login_required
+def export_view(request, fmt: str):
+    """Stream every resource matching the listing's filters, in its order."""
+
+    try:
+        listing = parse_listing(request.GET)
+    except ListingError as exc:
+        return JsonResponse({"error": exc.message}, status=400)
+    encode, content_type = _EXPORTS[fmt]
+    chunks = encode(rows(listing))
+    if isinstance(request, ASGIRequest):
+        chunks = aiter_chunks(chunks)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="inventario.{fmt}"'
+    response["Cache-Control"] = "no-store"
+    return response
+
+
+@require_http_methods(["GET", "PATCH", "DELETE"])
+@_login_required
+def resource_view(request, pk: int):
+    if request.method == "GET":
+        data = _resource_json(pk)
+        if data is None:
+            return JsonResponse({"error": "Not found."}, status=404)
+        return JsonResponse(data)
+
+    with transaction.atomic():
+        resource = (
+            Resource.objects.select_for_update().select_related("categoria").filter(pk=pk).first()
+        )
+        if resource is None:
+            return JsonResponse({"error": "Not found."}, status=404)
+        if request.method == "DELETE":
+            resource.delete()
+            return HttpResponse(status=204)
+
+        payload = _parse_payload(request)
+        if payload is None:
+            return JsonResponse({"error": "Invalid JSON payload."}, status=400)
+        try:
+            with transaction.atomic():
+                _apply(resource, payload)
+                resource.save()
+        except ValidationError as exc:
+            return _invalid(exc)
+    return JsonResponse(_resource_json(pk))
+
+
+@require_http_methods(["GET", "POST"])
+@_login_required
+def categories_view(request):
+    if request.method == "GET":
+        return JsonResponse({"results": list(Category.objects.values("id", "nombre"))})
+
+    payload = _parse_payload(request)
+    name = payload.get("nombre") if payload is not None else None
+    if not isinstance(name, str) or not name.strip():
+        return JsonResponse({"error": "'nombre' is required."}, status=400)
+    try:
+        category, created = _category_named(name)
+    except ValidationError as exc:
+        return _invalid(exc)
+    return JsonResponse(
+        {"id": category.pk, "nombre": category.nombre}, status=201 if created else 200
+    )
+
+
+@require_http_methods(["POST"])
+@_login_required
+def photos_view(request):
+    """Store an image (the raw body, or a multipart ``foto`` file) and return its URLs."""
+
+    upload = request.FILES.get("foto") if request.content_type == "multipart/form-data" else None
+    chunks = upload.chunks() if upload is not None else photos.read_chunks(request)
+    try:
+        name, created = photos.store(chunks)
+    except photos.PhotoError as exc:
+        return JsonResponse({"error": exc.message}, status=exc.status)
+    photos.get_thumbnail_pool().submit(name)
+    return JsonResponse(
+        {
+            "foto": photos.url_of(name),
+            "miniatura": photos.url_of(name, thumbnail=True),
+        },
+        status=201 if created else 200,
+    )
+
+
+_RANGE = re.compile(r"bytes=(\d*)-(\d*)")
+
+# Content-addressed: the bytes behind a URL never change.
+_IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+class _Unsatisfiable(Exception):
+    pass
+
+
+def _byte_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """The inclusive ``(first, last)`` of a single-range ``Range`` header.
+
+    Anything else (several ranges, bad syntax) is ignored, as RFC 9110
+    allows, and the whole file is sent.
+    """
+
+    match = _RANGE.fullmatch(header.strip())
+    if match is None or not any(match.groups()):
+        return None
+    first, last = match.groups()
+    if first:
+        first = int(first)
+        last = min(int(last), size - 1) if last else size - 1
+        if first >= size:
+            raise _Unsatisfiable
+        return (first, last) if first <= last else None
+    suffix = int(last)
+    if suffix == 0 or size == 0:
+        raise _Unsatisfiable
+    return max(0, size - suffix), size - 1
+
+
+def _file_part(path, first: int, length: int):
+    with open(path, "rb") as handle:
+        handle.seek(first)
+        while length > 0:
+            chunk = handle.read(min(64 * 1024, length))
+            if not chunk:
+                return
+            length -= len(chunk)
+            yield chunk
+
+
+def _serve_file(request, path, content_type: str, etag: str, cache_control: str):
+    """Send ``path`` with validators, ``Range`` support and sendfile where possible.
+
+    A full response is a ``FileResponse``: servers that provide
+    ``wsgi.file_wrapper`` (gunicorn) send it with ``sendfile()``. With
+    ``INVENTORY_PHOTO_ACCEL_PREFIX`` set, nginx is told to send the file
+    itself (``X-Accel-Redirect``), ranges included.
+    """
+
+    etag = quote_etag(etag)
+    headers = {"ETag": etag, "Cache-Control": cache_control, "Accept-Ranges": "bytes"}
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        response = HttpResponse(status=304)
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    prefix = getattr(settings, "INVENTORY_PHOTO_ACCEL_PREFIX", "")
+    if prefix:
+        response = HttpResponse(content_type=content_type)
+        response["X-Accel-Redirect"] = prefix.rstrip("/") + "/" + path.relative_to(
+            photos.root()
+        ).as_posix()
+        for header, value in headers.items():
+            response[header] = value
+        return response
+
+    size = path.stat().st_size
+    byte_range = None
+    if_range = request.headers.get("If-Range")
+    if "Range" in request.headers and (if_range is None or if_range == etag):
+        try:
+            byte_range = _byte_range(request.headers["Range"], size)
+        except _Unsatisfiable:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            return response
+
+    if byte_range is None:
+        response = FileResponse(open(path, "rb"), content_type=content_type)
+    else:
+        first, last = byte_range
+        response = StreamingHttpResponse(
+            _file_part(path, first, last - first + 1), status=206, content_type=content_type
+        )
+        response["Content-Range"] = f"bytes {first}-{last}/{size}"
+        response["Content-Length"] = str(last - first + 1)
+    for header, value in headers.items():
+        response[header] = value
+    return response
+
+
+def _stored_photo(name: str):
+    if not photos.NAME.match(name):
+        return None
+    path = photos.path_of(name)
+    return path if path.exists() else None
+
+
+@require_http_methods(["GET", "HEAD"])
+def photo_view(request, name: str):
+    path = _stored_photo(name)
+    if path is None:
+        return JsonResponse({"error": "Not found."}, status=404)
+    content_type = photos.CONTENT_TYPES[name.rsplit(".", 1)[1]]
+    return _serve_file(request, path, content_type, name.split(".", 1)[0], _IMMUTABLE)
+
+
+@require_http_methods(["GET", "HEAD"])
+def photo_thumbnail_view(request, name: str):
+    path = _stored_photo(name)
+    if path is None:
+        return JsonResponse({"error": "Not found."}, status=404)
+    thumbnail = photos.thumbnail_path(name)
+    if thumbnail.exists():
+        etag = thumbnail.stem
+        return _serve_file(request, thumbnail, "image/jpeg", etag, _IMMUTABLE)
+    # Not generated yet (or no Pillow): the original, revalidated next time.
+    photos.get_thumbnail_pool().submit(name)
+    content_type = photos.CONTENT_TYPES[name.rsplit(".", 1)[1]]
+    return _serve_file(request, path, content_type, name.split(".", 1)[0], "no-cache")